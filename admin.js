@@ -5,6 +5,7 @@ let adminDocuments = [];
 
 // Get users from auth system
 let adminUsers = [];
+let usersCursor = null;  // Next page of /admin/users (null when exhausted or offline)
 
 // Charts instances
 let downloadsChart = null;
@@ -109,6 +110,7 @@ function initializeAdminPanel() {
     loadDocuments();
     loadUsers();
     loadSubjects();
+    loadUsersFromApi();
     
     // Log admin login
     logActivity('auth', 'Admin logged in', 'success');
@@ -202,6 +204,13 @@ function setupEventListeners() {
     if (selectAllCheckbox) {
         selectAllCheckbox.addEventListener('change', handleSelectAll);
     }
+    
+    const documentsTableBody = document.getElementById('documentsTableBody');
+    if (documentsTableBody) {
+        documentsTableBody.addEventListener('change', e => {
+            if (e.target.classList.contains('document-checkbox')) updateBulkSelection();
+        });
+    }
 }
 
 // Handle tag input
@@ -548,6 +557,41 @@ function loadDocuments() {
     `).join('');
 }
 
+// Map an API user row onto the shape the user cards render
+function userFromApi(user) {
+    return {
+        id: user.id,
+        firstName: user.first_name,
+        lastName: user.last_name,
+        email: user.email,
+        university: user.university || '',
+        status: user.status,
+        role: user.role,
+        registrationDate: user.created_at,
+        downloads: 0,
+        uploads: 0
+    };
+}
+
+// Load users from the API one page at a time; keeps the local list when offline
+async function loadUsersFromApi(append = false) {
+    if (!localStorage.getItem('access_token')) return;
+    
+    try {
+        const data = await apiFetchPage(CONFIG.ADMIN.USERS, {
+            cursor: append ? usersCursor : null,
+            fields: ['first_name', 'last_name', 'email', 'university', 'role', 'status']
+        });
+        
+        const users = data.users.map(userFromApi);
+        adminUsers = append ? [...adminUsers, ...users] : users;
+        usersCursor = data.next_cursor;
+        loadUsers();
+    } catch (error) {
+        console.error('Error loading users from API:', error);
+    }
+}
+
 // Load users
 function loadUsers() {
     const usersGrid = document.getElementById('usersGrid');
@@ -595,7 +639,13 @@ function loadUsers() {
                 </button>
             </div>
         </div>
-    `).join('');
+    `).join('') + (usersCursor ? `
+        <div style="grid-column: 1 / -1; text-align: center; margin-top: 1rem;">
+            <button class="btn btn-outline" onclick="loadUsersFromApi(true)">
+                <i class="fas fa-chevron-down"></i> Ko'proq yuklash
+            </button>
+        </div>
+    ` : '');
 }
 
 // Load subjects
@@ -839,107 +889,61 @@ async function handleUpload(e) {
     submitBtn.disabled = true;
     
     try {
-        // Create unique filename
-        const timestamp = new Date().getTime();
         const fileExtension = allowedTypes[fileType];
-        const sanitizedTitle = title.toLowerCase().replace(/[^a-z0-9]+/g, '-');
-        const filename = `${sanitizedTitle}-${timestamp}.${fileExtension}`;
-        
-        // Create FormData
-        const formData = new FormData();
-        formData.append('file', file);
-        formData.append('title', title);
-        formData.append('subject', subject);
-        formData.append('author', author);
-        formData.append('description', description);
-        formData.append('tags', tags);
-        
-        // Upload file with progress tracking
-        const xhr = new XMLHttpRequest();
         
-        xhr.upload.onprogress = (event) => {
-            if (event.lengthComputable) {
-                const percentComplete = (event.loaded / event.total) * 100;
+        // The file goes straight to storage; the API only signs and checks it
+        const response = await uploadDocumentDirect(file, {
+            title: title,
+            subject_id: subject,
+            author: author,
+            description: description,
+            tags: tags
+        }, {
+            fallbackEndpoint: CONFIG.ADMIN.UPLOAD,
+            onProgress: (percentComplete) => {
                 progressBar.style.width = percentComplete + '%';
                 progressText.textContent = Math.round(percentComplete) + '%';
             }
-        };
+        });
         
-        xhr.onload = () => {
-            if (xhr.status >= 200 && xhr.status < 300) {
-                let response;
-                try {
-                    response = JSON.parse(xhr.responseText);
-                } catch (e) {
-                    // If API doesn't return JSON, create a mock response
-                    response = { id: Date.now(), success: true };
-                }
-                
-                // Add new document to admin documents
-                const newDoc = {
-                    id: response.id || Date.now(),
-                    title: title,
-                    subject: subject,
-                    format: fileExtension,
-                    size: formatFileSize(file.size),
-                    downloads: 0,
-                    uploadDate: new Date().toISOString().split('T')[0],
-                    author: author || 'Admin',
-                    description: description || '',
-                    tags: tags ? tags.split(',').map(tag => tag.trim()) : [],
-                    status: 'active',
-                    filePath: response.file_path || `uploads/${file.name}`,
-                    mimeType: fileType
-                };
-                
-                adminDocuments.unshift(newDoc);
-                
-                // Log activity
-                logActivity('fas fa-upload', 'Admin yangi hujjat yukladi', `${newDoc.title} - ${newDoc.format.toUpperCase()}`);
-                
-                // Add notification for document upload
-                addNotification('document', 'Yangi hujjat yuklandi', `${newDoc.title} - ${getSubjectName(newDoc.subject)}`);
-                
-                showNotification('Hujjat muvaffaqiyatli yuklandi!', 'success');
-                clearUploadForm();
-                
-                // Update UI
-                loadDocuments();
-                updateStats();
-                
-                // Update main website documents
-                if (typeof documentsData !== 'undefined') {
-                    documentsData.unshift(newDoc);
-                }
-                
-                // Save to localStorage
-                localStorage.setItem('documents', JSON.stringify(adminDocuments));
-                
-            } else {
-                let errorMessage = `Server xatosi: ${xhr.status}`;
-                try {
-                    const errorResponse = JSON.parse(xhr.responseText);
-                    errorMessage = errorResponse.detail || errorResponse.message || errorMessage;
-                } catch (e) {
-                    // Use default error message
-                }
-                throw new Error(errorMessage);
-            }
+        // Add new document to admin documents
+        const newDoc = {
+            id: response.document_id || Date.now(),
+            title: title,
+            subject: subject,
+            format: fileExtension,
+            size: formatFileSize(file.size),
+            downloads: 0,
+            uploadDate: new Date().toISOString().split('T')[0],
+            author: author || 'Admin',
+            description: description || '',
+            tags: tags ? tags.split(',').map(tag => tag.trim()) : [],
+            status: 'active',
+            mimeType: fileType
         };
         
-        xhr.onerror = () => {
-            throw new Error('Tarmoq xatosi yuz berdi');
-        };
+        adminDocuments.unshift(newDoc);
+        
+        // Log activity
+        logActivity('fas fa-upload', 'Admin yangi hujjat yukladi', `${newDoc.title} - ${newDoc.format.toUpperCase()}`);
+        
+        // Add notification for document upload
+        addNotification('document', 'Yangi hujjat yuklandi', `${newDoc.title} - ${getSubjectName(newDoc.subject)}`);
         
-        // Get auth token
-        const token = localStorage.getItem('access_token');
+        showNotification('Hujjat muvaffaqiyatli yuklandi!', 'success');
+        clearUploadForm();
         
-        // Send the upload request to the API
-        xhr.open('POST', CONFIG.API_BASE + CONFIG.ADMIN.UPLOAD, true);
-        if (token) {
-            xhr.setRequestHeader('Authorization', `Bearer ${token}`);
+        // Update UI
+        loadDocuments();
+        updateStats();
+        
+        // Update main website documents
+        if (typeof documentsData !== 'undefined') {
+            documentsData.unshift(newDoc);
         }
-        xhr.send(formData);
+        
+        // Save to localStorage
+        localStorage.setItem('documents', JSON.stringify(adminDocuments));
         
     } catch (error) {
         console.error('Upload error:', error);
@@ -1124,6 +1128,64 @@ function handleSelectAll(e) {
     checkboxes.forEach(checkbox => {
         checkbox.checked = e.target.checked;
     });
+    updateBulkSelection();
+}
+
+function getSelectedDocumentIds() {
+    return [...document.querySelectorAll('.document-checkbox:checked')].map(checkbox => checkbox.value);
+}
+
+function updateBulkSelection() {
+    const counter = document.getElementById('bulkSelectedCount');
+    if (counter) counter.textContent = `${getSelectedDocumentIds().length} ta tanlandi`;
+}
+
+// Approve, reject or delete every selected document with a single API request
+async function bulkDocumentAction(action) {
+    const ids = getSelectedDocumentIds();
+    if (ids.length === 0) {
+        showNotification('Avval hujjatlarni tanlang', 'warning');
+        return;
+    }
+    if (action === 'delete' && !confirm(`${ids.length} ta hujjatni o'chirishni xohlaysizmi?`)) return;
+    
+    const doneStatus = { approve: 'approved', reject: 'rejected', delete: 'deleted' }[action];
+    let done = new Set(ids);
+    let failed = 0;
+    
+    if (localStorage.getItem('access_token')) {
+        try {
+            const result = await apiCall(CONFIG.ADMIN.BULK.replace('{action}', action), {
+                method: 'POST',
+                body: JSON.stringify({ document_ids: ids })
+            });
+            done = new Set(result.results.filter(item => item.status === doneStatus).map(item => item.id));
+            failed = result.failed;
+        } catch (error) {
+            showNotification(`Amal bajarilmadi: ${error.message}`, 'error');
+            return;
+        }
+    }
+    
+    const isDone = doc => done.has(String(doc.id));
+    if (action === 'delete') {
+        adminDocuments = adminDocuments.filter(doc => !isDone(doc));
+    } else {
+        adminDocuments.forEach(doc => {
+            if (isDone(doc)) doc.status = doneStatus;
+        });
+    }
+    localStorage.setItem('documents', JSON.stringify(adminDocuments));
+    
+    logActivity('document', `Bulk ${action}: ${done.size} documents`, action === 'delete' ? 'warning' : 'info', { documentIds: [...done] });
+    
+    loadDocuments();
+    updateStats();
+    updateBulkSelection();
+    showNotification(
+        failed ? `${done.size} ta bajarildi, ${failed} ta xato` : `${done.size} ta hujjat yangilandi`,
+        failed ? 'warning' : 'success'
+    );
 }
 
 // Document actions
@@ -1469,7 +1531,9 @@ function logout() {
     if (confirm('Chiqishni xohlaysizmi?')) {
         localStorage.removeItem('currentUser');
         sessionStorage.removeItem('currentUser');
-        window.location.href = 'index.html';
+        endSession().finally(() => {
+            window.location.href = 'index.html';
+        });
     }
 }
 
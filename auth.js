@@ -75,8 +75,8 @@ async function handleLogin(e) {
             if (response.ok) {
                 const data = await response.json();
                 
-                // Store token
-                localStorage.setItem('access_token', data.access_token);
+                // Store tokens
+                storeTokens(data);
                 
                 // Get user info
                 const userResponse = await apiCall(CONFIG.AUTH.ME);
@@ -633,7 +633,9 @@ function logout() {
     currentUser = null;
     localStorage.removeItem('currentUser');
     sessionStorage.removeItem('currentUser');
-    window.location.href = 'index.html';
+    endSession().finally(() => {
+        window.location.href = 'index.html';
+    });
 }
 
 // Check authentication status
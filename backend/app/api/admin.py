@@ -1,13 +1,35 @@
-from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, Form
-from typing import List, Optional
+import asyncio
+from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, Form, Query
+from typing import Dict, List, Optional
 import uuid
-from datetime import datetime
-from app.api.auth import get_current_user
-from app.database import get_supabase
+from datetime import datetime, timedelta
+from app.api.auth import get_current_user, invalidate_user, user_cache
+from app.core import tokens
+from app.core.passwords import password_hasher
+from app.api.documents import catalog_cache, invalidate_catalog, insert_document
+from app.database import get_supabase, execute
+from app.direct_db import direct_db
+from app.core.cache import create_cache
+from app.core.config import settings
+from app.core.metrics import upload_bytes
 from app.core.storage import storage
+from app.core.events import download_events
+from app.core import ratelimit
+from app.core.health import readiness
+from app.core.previews import previews
+from app.core.indexing import text_indexer
+from app.core.jobs import jobs, job_worker
+from app.core.tasks import log_activity, release_file, release_files
+from app.core.pagination import PageParams, DOCUMENT_FIELDS, USER_FIELDS, select_fields, keyset, page
+from app.core.imports import ImportSource, plan_import, run_import, spool_upload, schedule_processing
+from app.schemas.document import BulkDocumentIds
 
 router = APIRouter()
 
+# Dashboard analytics read precomputed counters and rollups; a short TTL keeps
+# repeated dashboard loads off the database entirely
+analytics_cache = create_cache("analytics", 64, settings.analytics_cache_ttl_seconds)
+
 def require_admin(current_user: dict = Depends(get_current_user)):
     """Dependency to require admin role"""
     if current_user.get("role") != "admin":
@@ -15,13 +37,15 @@ def require_admin(current_user: dict = Depends(get_current_user)):
     return current_user
 
 @router.get("/users")
-async def get_all_users(admin_user: dict = Depends(require_admin)):
-    """Get all users (admin only)"""
+async def get_all_users(paging: PageParams = Depends(), admin_user: dict = Depends(require_admin)):
+    """Get users, newest first, one page at a time (admin only)"""
     supabase = get_supabase()
     
-    response = supabase.table("users").select("id, email, first_name, last_name, university, role, status, created_at").execute()
+    columns = select_fields(paging.fields, USER_FIELDS)
+    response = await execute(keyset(supabase.table("users").select(columns), paging))
+    users, next_cursor = page(response.data, paging)
     
-    return {"users": response.data}
+    return {"users": users, "next_cursor": next_cursor}
 
 @router.put("/users/{user_id}/status")
 async def update_user_status(
@@ -35,24 +59,30 @@ async def update_user_status(
     
     supabase = get_supabase()
     
-    response = supabase.table("users").update({"status": status}).eq("id", user_id).execute()
+    response = await execute(supabase.table("users").update({"status": status}).eq("id", user_id))
     
     if not response.data:
         raise HTTPException(status_code=404, detail="User not found")
     
+    await invalidate_user(user_id)
+    
     return {"message": f"User status updated to {status}"}
 
 @router.get("/documents/pending")
-async def get_pending_documents(admin_user: dict = Depends(require_admin)):
-    """Get pending documents for approval"""
+async def get_pending_documents(paging: PageParams = Depends(), admin_user: dict = Depends(require_admin)):
+    """Get pending documents for approval, newest first"""
     supabase = get_supabase()
     
-    response = supabase.table("documents")\
-        .select("*, users(first_name, last_name, email)")\
-        .eq("status", "pending")\
-        .execute()
+    columns = select_fields(paging.fields, DOCUMENT_FIELDS)
+    response = await execute(keyset(
+        supabase.table("documents")
+        .select(f"{columns}, users(first_name, last_name, email)")
+        .eq("status", "pending"),
+        paging
+    ))
+    documents, next_cursor = page(response.data, paging)
     
-    return {"documents": response.data}
+    return {"documents": documents, "next_cursor": next_cursor}
 
 @router.put("/documents/{document_id}/approve")
 async def approve_document(
@@ -62,11 +92,13 @@ async def approve_document(
     """Approve a pending document"""
     supabase = get_supabase()
     
-    response = supabase.table("documents").update({"status": "approved"}).eq("id", document_id).execute()
+    response = await execute(supabase.table("documents").update({"status": "approved"}).eq("id", document_id))
     
     if not response.data:
         raise HTTPException(status_code=404, detail="Document not found")
     
+    await invalidate_catalog()
+    
     return {"message": "Document approved"}
 
 @router.put("/documents/{document_id}/reject")
@@ -77,27 +109,278 @@ async def reject_document(
     """Reject a pending document"""
     supabase = get_supabase()
     
-    response = supabase.table("documents").update({"status": "rejected"}).eq("id", document_id).execute()
+    response = await execute(supabase.table("documents").update({"status": "rejected"}).eq("id", document_id))
     
     if not response.data:
         raise HTTPException(status_code=404, detail="Document not found")
     
+    await invalidate_catalog()
+    
     return {"message": "Document rejected"}
 
+def _bulk_results(document_ids: List[str]) -> Dict[str, str]:
+    """Per-item results keyed by requested ID, with malformed IDs already settled"""
+    results = {}
+    for document_id in document_ids:
+        try:
+            results[document_id] = str(uuid.UUID(document_id))
+        except ValueError:
+            results[document_id] = "invalid_id"
+    return results
+
+def _bulk_batches(results: Dict[str, str]) -> List[List[str]]:
+    ids = list(dict.fromkeys(value for value in results.values() if value != "invalid_id"))
+    return [ids[i:i + settings.bulk_batch_size] for i in range(0, len(ids), settings.bulk_batch_size)]
+
+def _returning_ids(query):
+    """Have a write return only the affected IDs instead of whole rows"""
+    query.params = query.params.add("select", "id")
+    return query
+
+def _bulk_response(results: Dict[str, str], outcomes: Dict[str, str], success: str) -> dict:
+    items = [
+        {"id": document_id, "status": value if value == "invalid_id" else outcomes.get(value, "not_found")}
+        for document_id, value in results.items()
+    ]
+    succeeded = sum(1 for item in items if item["status"] == success)
+    return {"results": items, "succeeded": succeeded, "failed": len(items) - succeeded}
+
+async def _bulk_set_status(request: BulkDocumentIds, status: str, admin_user: dict) -> dict:
+    """Set the status of many documents with one update per batch"""
+    supabase = get_supabase()
+    results = _bulk_results(request.document_ids)
+    outcomes = {}
+    
+    async def update(batch: List[str]):
+        try:
+            response = await execute(_returning_ids(
+                supabase.table("documents").update({"status": status}).in_("id", batch)
+            ))
+            outcomes.update({row["id"]: status for row in response.data})
+        except Exception as e:
+            print(f"Bulk {status} failed for {len(batch)} documents: {e}")
+            outcomes.update({document_id: "failed" for document_id in batch})
+    
+    await asyncio.gather(*(update(batch) for batch in _bulk_batches(results)))
+    
+    changed = [document_id for document_id, outcome in outcomes.items() if outcome == status]
+    if changed:
+        await invalidate_catalog()
+        await log_activity({
+            "user_id": admin_user["id"],
+            "action": f"bulk_{status}_documents",
+            "details": {"document_ids": changed, "count": len(changed)}
+        })
+    
+    return _bulk_response(results, outcomes, status)
+
+@router.post("/documents/bulk/approve")
+async def bulk_approve_documents(request: BulkDocumentIds, admin_user: dict = Depends(require_admin)):
+    """Approve many documents at once, reporting the result for each ID"""
+    return await _bulk_set_status(request, "approved", admin_user)
+
+@router.post("/documents/bulk/reject")
+async def bulk_reject_documents(request: BulkDocumentIds, admin_user: dict = Depends(require_admin)):
+    """Reject many documents at once, reporting the result for each ID"""
+    return await _bulk_set_status(request, "rejected", admin_user)
+
+@router.post("/documents/bulk/delete")
+async def bulk_delete_documents(request: BulkDocumentIds, admin_user: dict = Depends(require_admin)):
+    """Delete many documents at once, reporting the result for each ID
+    
+    Rows go in one delete per batch; their files are released together and
+    removed from storage by a single background job.
+    """
+    supabase = get_supabase()
+    results = _bulk_results(request.document_ids)
+    outcomes = {}
+    deleted = []
+    
+    async def delete(batch: List[str]):
+        try:
+            found = await execute(
+                supabase.table("documents").select("id, title, file_path, content_hash").in_("id", batch)
+            )
+            if not found.data:
+                return
+            
+            response = await execute(_returning_ids(
+                supabase.table("documents").delete().in_("id", [row["id"] for row in found.data])
+            ))
+            removed = {row["id"] for row in response.data}
+            outcomes.update({document_id: "deleted" for document_id in removed})
+            deleted.extend(row for row in found.data if row["id"] in removed)
+        except Exception as e:
+            print(f"Bulk delete failed for {len(batch)} documents: {e}")
+            outcomes.update({document_id: "failed" for document_id in batch})
+    
+    await asyncio.gather(*(delete(batch) for batch in _bulk_batches(results)))
+    
+    if deleted:
+        await invalidate_catalog()
+        
+        files = [(row["file_path"], row.get("content_hash")) for row in deleted if row.get("file_path")]
+        try:
+            await release_files(files)
+        except Exception as e:
+            # The rows are gone either way; report it rather than fail the whole request
+            print(f"Failed to release files of {len(files)} deleted documents: {e}")
+        
+        await log_activity({
+            "user_id": admin_user["id"],
+            "action": "bulk_deleted_documents",
+            "details": {
+                "document_ids": [row["id"] for row in deleted],
+                "titles": [row["title"] for row in deleted],
+                "count": len(deleted)
+            }
+        })
+    
+    return _bulk_response(results, outcomes, "deleted")
+
 @router.get("/analytics/overview")
 async def get_analytics_overview(admin_user: dict = Depends(require_admin)):
-    """Get analytics overview"""
+    """Get analytics overview from the trigger-maintained counters"""
+    overview = await analytics_cache.get("overview")
+    if overview is not None:
+        return overview
+    
+    supabase = get_supabase()
+    
+    response = await execute(supabase.table("stat_counters").select("name, value"))
+    counters = {row["name"]: row["value"] for row in response.data}
+    
+    overview = {
+        "total_users": counters.get("users", 0),
+        "total_documents": counters.get("documents", 0),
+        "total_downloads": counters.get("downloads", 0)
+    }
+    await analytics_cache.set("overview", overview)
+    
+    return overview
+
+@router.get("/analytics/timeseries")
+async def get_analytics_timeseries(
+    days: int = Query(30, ge=1, le=365),
+    top: int = Query(10, ge=1, le=50),
+    admin_user: dict = Depends(require_admin)
+):
+    """Get daily activity, top documents and per-subject activity from the rollups"""
+    cache_key = f"timeseries:{days}:{top}"
+    result = await analytics_cache.get(cache_key)
+    if result is not None:
+        return result
+    
+    supabase = get_supabase()
+    
+    today = datetime.utcnow().date()
+    since = today - timedelta(days=days - 1)
+    daily, top_documents, subjects = await asyncio.gather(
+        execute(
+            supabase.table("daily_stats")
+            .select("day, downloads, uploads, new_users")
+            .gte("day", since.isoformat())
+            .order("day")
+        ),
+        execute(supabase.rpc("top_documents", {"p_since": since.isoformat(), "p_limit": top})),
+        execute(supabase.rpc("subject_activity", {"p_since": since.isoformat()}))
+    )
+    
+    # Fill days without activity so charts get a continuous series
+    by_day = {row["day"]: row for row in daily.data}
+    series = []
+    for offset in range(days):
+        day = (since + timedelta(days=offset)).isoformat()
+        series.append(by_day.get(day, {"day": day, "downloads": 0, "uploads": 0, "new_users": 0}))
+    
+    result = {
+        "since": since.isoformat(),
+        "daily": series,
+        "top_documents": top_documents.data,
+        "subjects": subjects.data
+    }
+    await analytics_cache.set(cache_key, result)
+    
+    return result
+
+@router.post("/analytics/refresh")
+async def refresh_analytics(admin_user: dict = Depends(require_admin)):
+    """Rebuild counters and rollups from the base tables"""
     supabase = get_supabase()
     
-    # Get counts
-    users_count = supabase.table("users").select("id", count="exact").execute()
-    documents_count = supabase.table("documents").select("id", count="exact").execute()
-    downloads_count = supabase.table("downloads").select("id", count="exact").execute()
+    await execute(supabase.rpc("refresh_statistics", {}), timeout=max(settings.db_timeout_seconds, 300))
+    await analytics_cache.delete("overview")
+    
+    return {"message": "Statistics rebuilt; time series refresh within the cache TTL"}
+
+@router.get("/system/health")
+async def get_health_stats(admin_user: dict = Depends(require_admin)):
+    """Get readiness state, warm-up time and the latest dependency probes"""
+    ok, checks = await readiness.probe()
+    return {**readiness.stats(), "dependencies_ok": ok, "checks": checks}
+
+@router.get("/system/direct-db")
+async def get_direct_db_stats(admin_user: dict = Depends(require_admin)):
+    """Get direct Postgres pool size and query counts"""
+    return direct_db.stats()
+
+@router.get("/system/rate-limits")
+async def get_rate_limit_stats(admin_user: dict = Depends(require_admin)):
+    """Get allowed and refused requests per rate limit"""
+    return ratelimit.stats()
+
+@router.get("/system/download-events")
+async def get_download_event_stats(admin_user: dict = Depends(require_admin)):
+    """Get download event buffer depth and flush latency"""
+    return download_events.stats()
+
+@router.get("/system/previews")
+async def get_preview_stats(admin_user: dict = Depends(require_admin)):
+    """Get preview generation progress"""
+    return previews.stats()
+
+@router.get("/system/passwords")
+async def get_password_hashing_stats(admin_user: dict = Depends(require_admin)):
+    """Get password hashing pool load and rejections"""
+    return password_hasher.stats()
+
+@router.get("/system/indexing")
+async def get_indexing_stats(admin_user: dict = Depends(require_admin)):
+    """Get text extraction queue depth and progress"""
+    return await text_indexer.stats()
+
+@router.post("/search/reindex", status_code=202)
+async def reindex_documents(
+    all_documents: bool = Query(False, alias="all", description="Re-extract every document, not just unindexed ones"),
+    admin_user: dict = Depends(require_admin)
+):
+    """Queue stored documents for text extraction (admin only)"""
+    if not await text_indexer.reindex(only_missing=not all_documents):
+        raise HTTPException(status_code=409, detail="A reindex is already running")
+    
+    return {"message": "Reindex started; follow progress at /api/admin/system/indexing"}
+
+@router.get("/system/jobs")
+async def get_job_stats(admin_user: dict = Depends(require_admin)):
+    """Get background job queue depth and the latest dead letters"""
+    return {**await jobs.stats(), "worker": job_worker.stats()}
+
+@router.post("/jobs/{job_id}/retry")
+async def retry_job(job_id: int, admin_user: dict = Depends(require_admin)):
+    """Requeue a dead-lettered job (admin only)"""
+    if not await jobs.retry(job_id):
+        raise HTTPException(status_code=404, detail="Dead-lettered job not found")
     
+    return {"message": "Job requeued"}
+
+@router.get("/system/cache")
+async def get_cache_stats(admin_user: dict = Depends(require_admin)):
+    """Get hit ratios for the response and lookup caches"""
     return {
-        "total_users": users_count.count,
-        "total_documents": documents_count.count,
-        "total_downloads": downloads_count.count
+        "catalog": catalog_cache.stats(),
+        "users": user_cache.stats(),
+        "tokens": tokens.stats(),
+        "analytics": analytics_cache.stats()
     }
 
 @router.get("/activity-logs")
@@ -105,11 +388,12 @@ async def get_activity_logs(admin_user: dict = Depends(require_admin)):
     """Get recent activity logs"""
     supabase = get_supabase()
     
-    response = supabase.table("activity_logs")\
-        .select("*, users(first_name, last_name)")\
-        .order("created_at", desc=True)\
-        .limit(50)\
-        .execute()
+    response = await execute(
+        supabase.table("activity_logs")
+        .select("*, users(first_name, last_name)")
+        .order("created_at", desc=True)
+        .limit(50)
+    )
     
     return {"activities": response.data}
 
@@ -136,25 +420,17 @@ async def admin_upload_document(
         raise HTTPException(status_code=400, detail="Title and subject are required")
     
     # Check if subject exists
-    subject_check = supabase.table("subjects").select("id").eq("id", subject).execute()
+    subject_check = await execute(supabase.table("subjects").select("id").eq("id", subject))
     if not subject_check.data:
         raise HTTPException(status_code=400, detail="Invalid subject ID")
     
     try:
-        # Generate unique filename
-        filename = storage.generate_filename(file.filename, title)
-        
-        # Save file
-        file_path = await storage.save_file(file, filename, supabase)
-        
-        # Get file size
-        file_size = getattr(file, 'size', 0)
-        if file_size == 0:
-            # Try to get size from content
-            content = await file.read()
-            file_size = len(content)
-            # Reset file pointer for re-reading
-            await file.seek(0)
+        # Stream file to storage (size and hash are computed on the way,
+        # and content that is already stored is not written again)
+        stored = await storage.save_file(file, file_ext, supabase)
+        upload_bytes.inc(stored.size, method="multipart")
+        file_path = stored.path
+        file_size = stored.size
         
         # Prepare document data
         document_data = {
@@ -165,6 +441,7 @@ async def admin_upload_document(
             "format": file_ext,
             "file_path": file_path,
             "file_size": file_size,
+            "content_hash": stored.sha256,
             "author": author or "Admin",
             "tags": [tag.strip() for tag in tags.split(',')] if tags else [],
             "status": "approved",  # Admin uploads are auto-approved
@@ -174,12 +451,11 @@ async def admin_upload_document(
         }
         
         # Insert document record
-        response = supabase.table("documents").insert(document_data).execute()
+        await insert_document(document_data)
         
-        if not response.data:
-            # Clean up uploaded file if database insert failed
-            await storage.delete_file(file_path, supabase)
-            raise HTTPException(status_code=500, detail="Failed to save document record")
+        await invalidate_catalog()
+        previews.schedule(document_data["id"], file_path, stored.sha256, file_ext)
+        await text_indexer.schedule(document_data["id"], file_path, stored.sha256, file_ext)
         
         # Log admin activity
         activity_log = {
@@ -194,10 +470,7 @@ async def admin_upload_document(
             }
         }
         
-        try:
-            supabase.table("activity_logs").insert(activity_log).execute()
-        except Exception as e:
-            print(f"Failed to log activity: {e}")
+        await log_activity(activity_log)
         
         return {
             "message": "Document uploaded successfully",
@@ -209,12 +482,61 @@ async def admin_upload_document(
             "format": file_ext,
             "file_size": file_size
         }
-        
+    
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
 
+@router.post("/documents/import")
+async def import_documents(
+    archive: UploadFile = File(...),
+    manifest: UploadFile = File(None),
+    subject: str = Form(None),
+    admin_user: dict = Depends(require_admin)
+):
+    """Import many documents from a ZIP archive (admin only)
+    
+    Metadata comes from ``manifest`` (CSV or JSON), else from a manifest.csv
+    or manifest.json inside the archive, else from the file names with
+    ``subject`` as the subject. Imported documents are approved.
+    """
+    supabase = get_supabase()
+    
+    manifest_text = manifest_format = None
+    if manifest is not None and manifest.filename:
+        manifest_format = "json" if manifest.filename.lower().endswith(".json") else "csv"
+        raw = await manifest.read(settings.import_max_manifest_size + 1)
+        if len(raw) > settings.import_max_manifest_size:
+            raise HTTPException(status_code=413, detail="Manifest is too large")
+        try:
+            manifest_text = raw.decode("utf-8-sig")
+        except UnicodeDecodeError:
+            raise HTTPException(status_code=400, detail="Manifest must be UTF-8 text")
+    
+    archive_path = await spool_upload(archive)
+    try:
+        source = ImportSource(archive_path)
+        try:
+            items = plan_import(source, manifest_text, manifest_format, subject)
+            result = await run_import(source, items, admin_user, supabase)
+        finally:
+            source.close()
+    finally:
+        archive_path.unlink(missing_ok=True)
+    
+    documents = result.pop("documents")
+    if documents:
+        await invalidate_catalog()
+        await schedule_processing(documents)
+        await log_activity({
+            "user_id": admin_user["id"],
+            "action": "imported_documents",
+            "details": {"document_ids": [doc["id"] for doc in documents], "count": len(documents)}
+        })
+    
+    return result
+
 @router.delete("/documents/{document_id}")
 async def admin_delete_document(
     document_id: str,
@@ -224,7 +546,7 @@ async def admin_delete_document(
     supabase = get_supabase()
     
     # Get document info first
-    doc_response = supabase.table("documents").select("*").eq("id", document_id).execute()
+    doc_response = await execute(supabase.table("documents").select(", ".join(DOCUMENT_FIELDS)).eq("id", document_id))
     
     if not doc_response.data:
         raise HTTPException(status_code=404, detail="Document not found")
@@ -232,16 +554,18 @@ async def admin_delete_document(
     document = doc_response.data[0]
     
     try:
-        # Delete file from storage
-        if document.get("file_path"):
-            await storage.delete_file(document["file_path"], supabase)
-        
         # Delete document record
-        delete_response = supabase.table("documents").delete().eq("id", document_id).execute()
+        delete_response = await execute(supabase.table("documents").delete().eq("id", document_id))
         
         if not delete_response.data:
             raise HTTPException(status_code=500, detail="Failed to delete document record")
         
+        await invalidate_catalog()
+        
+        # Release the file; shared blobs are deleted (in the background) with their last reference
+        if document.get("file_path"):
+            await release_file(document["file_path"], document.get("content_hash"), idempotency_key=f"delete-document:{document_id}")
+        
         # Log admin activity
         activity_log = {
             "user_id": admin_user["id"],
@@ -253,13 +577,10 @@ async def admin_delete_document(
             }
         }
         
-        try:
-            supabase.table("activity_logs").insert(activity_log).execute()
-        except Exception as e:
-            print(f"Failed to log activity: {e}")
+        await log_activity(activity_log)
         
         return {"message": "Document deleted successfully"}
-        
+    
     except HTTPException:
         raise
     except Exception as e:
@@ -280,7 +601,7 @@ async def admin_update_document(
     supabase = get_supabase()
     
     # Get current document
-    doc_response = supabase.table("documents").select("*").eq("id", document_id).execute()
+    doc_response = await execute(supabase.table("documents").select("id").eq("id", document_id))
     
     if not doc_response.data:
         raise HTTPException(status_code=404, detail="Document not found")
@@ -292,7 +613,7 @@ async def admin_update_document(
         update_data["title"] = title
     if subject_id:
         # Validate subject exists
-        subject_check = supabase.table("subjects").select("id").eq("id", subject_id).execute()
+        subject_check = await execute(supabase.table("subjects").select("id").eq("id", subject_id))
         if not subject_check.data:
             raise HTTPException(status_code=400, detail="Invalid subject ID")
         update_data["subject_id"] = subject_id
@@ -307,11 +628,13 @@ async def admin_update_document(
     
     try:
         # Update document
-        response = supabase.table("documents").update(update_data).eq("id", document_id).execute()
+        response = await execute(supabase.table("documents").update(update_data).eq("id", document_id))
         
         if not response.data:
             raise HTTPException(status_code=500, detail="Failed to update document")
         
+        await invalidate_catalog()
+        
         # Log admin activity
         activity_log = {
             "user_id": admin_user["id"],
@@ -322,16 +645,13 @@ async def admin_update_document(
             }
         }
         
-        try:
-            supabase.table("activity_logs").insert(activity_log).execute()
-        except Exception as e:
-            print(f"Failed to log activity: {e}")
+        await log_activity(activity_log)
         
         return {
             "message": "Document updated successfully",
             "document": response.data[0]
         }
-        
+    
     except HTTPException:
         raise
     except Exception as e:
@@ -1,68 +1,83 @@
-from fastapi import APIRouter, HTTPException, Depends, status
+from fastapi import APIRouter, HTTPException, Depends, Request, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from datetime import datetime, timedelta
-from jose import JWTError, jwt
-from passlib.context import CryptContext
+from typing import Optional
 
 from app.schemas.user import UserCreate, UserLogin, UserResponse
-from app.schemas.auth import LoginResponse, Token
-from app.database import get_supabase
+from app.schemas.auth import LoginResponse, TokenPair, RefreshRequest, LogoutRequest
+from app.database import get_supabase, execute
+from app.direct_db import direct_db
 from app.core.config import settings
+from app.core.cache import create_cache
+from app.core.passwords import password_hasher
+from app.core.ratelimit import RateLimiter, login_limit
+from app.core import tokens
+from app.core.tokens import TokenError, issue_tokens, verify_access_token
 
 router = APIRouter()
 security = HTTPBearer()
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+optional_security = HTTPBearer(auto_error=False)
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Verify a password against its hash"""
-    return pwd_context.verify(plain_password, hashed_password)
-
-def get_password_hash(password: str) -> str:
-    """Hash a password"""
-    return pwd_context.hash(password)
-
-def create_access_token(data: dict, expires_delta: timedelta = None):
-    """Create JWT access token"""
-    to_encode = data.copy()
-    if expires_delta:
-        expire = datetime.utcnow() + expires_delta
-    else:
-        expire = datetime.utcnow() + timedelta(hours=settings.jwt_expiration_hours)
-    
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, settings.jwt_secret, algorithm=settings.jwt_algorithm)
-    return encoded_jwt
+# Authenticated users keyed by the token's "sub" claim
+user_cache = create_cache("users", settings.user_cache_max_size, settings.user_cache_ttl_seconds)
 
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     """Get current authenticated user"""
     try:
-        payload = jwt.decode(credentials.credentials, settings.jwt_secret, algorithms=[settings.jwt_algorithm])
-        user_id: str = payload.get("sub")
-        if user_id is None:
-            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
-    except JWTError:
+        claims = await verify_access_token(credentials.credentials)
+    except TokenError:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
+    user_id: str = claims["sub"]
+    
+    user = await user_cache.get(user_id)
+    if user is None:
+        user = await fetch_user(user_id)
+        if user is None:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
+        
+        user.pop("password_hash", None)
+        await user_cache.set(user_id, user)
+    
+    # Deactivated users are locked out once their cache entry is invalidated or expires
+    if user.get("status") != "active":
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Account is inactive")
+    
+    return user
+
+async def fetch_user(user_id: str) -> Optional[dict]:
+    """A user's row, over the direct Postgres pool when it is enabled"""
+    if direct_db.enabled:
+        return await direct_db.get_user(user_id)
     
-    supabase = get_supabase()
-    response = supabase.table("users").select("*").eq("id", user_id).execute()
-    
-    if not response.data:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
-    
-    return response.data[0]
+    response = await execute(get_supabase().table("users").select("*").eq("id", user_id))
+    return response.data[0] if response.data else None
+
+def rate_limited(limiter: RateLimiter):
+    """Dependency returning the current user once their request is within ``limiter``
+    
+    Admins are not limited.
+    """
+    async def dependency(request: Request, current_user: dict = Depends(get_current_user)) -> dict:
+        if current_user.get("role") != "admin":
+            await limiter.check(request, current_user["id"])
+        return current_user
+    return dependency
 
-@router.post("/register", response_model=LoginResponse)
+async def invalidate_user(user_id: str):
+    """Drop a user from the authentication cache after their row changes"""
+    await user_cache.delete(user_id)
+
+@router.post("/register", response_model=LoginResponse, dependencies=[Depends(login_limit)])
 async def register(user_data: UserCreate):
     """Register a new user"""
     supabase = get_supabase()
     
     # Check if user already exists
-    existing_user = supabase.table("users").select("id").eq("email", user_data.email).execute()
+    existing_user = await execute(supabase.table("users").select("id").eq("email", user_data.email))
     if existing_user.data:
         raise HTTPException(status_code=400, detail="Email already registered")
     
     # Hash password
-    hashed_password = get_password_hash(user_data.password)
+    hashed_password = await password_hasher.hash(user_data.password)
     
     # Create user
     user_dict = user_data.dict()
@@ -71,30 +86,26 @@ async def register(user_data: UserCreate):
     user_dict["role"] = "user"
     user_dict["status"] = "active"
     
-    result = supabase.table("users").insert(user_dict).execute()
+    result = await execute(supabase.table("users").insert(user_dict))
     
     if not result.data:
         raise HTTPException(status_code=400, detail="Failed to create user")
     
     user = result.data[0]
     
-    # Create access token
-    access_token = create_access_token(data={"sub": user["id"], "email": user["email"]})
-    
     return LoginResponse(
-        access_token=access_token,
-        token_type="bearer",
+        **issue_tokens(user),
         user=UserResponse(**user).dict(),
         message="Registration successful"
     )
 
-@router.post("/login", response_model=LoginResponse)
+@router.post("/login", response_model=LoginResponse, dependencies=[Depends(login_limit)])
 async def login(user_credentials: UserLogin):
     """Authenticate user and return token"""
     supabase = get_supabase()
     
     # Get user from database
-    response = supabase.table("users").select("*").eq("email", user_credentials.email).execute()
+    response = await execute(supabase.table("users").select("*").eq("email", user_credentials.email))
     
     if not response.data:
         raise HTTPException(status_code=400, detail="Invalid email or password")
@@ -102,29 +113,73 @@ async def login(user_credentials: UserLogin):
     user = response.data[0]
     
     # Check password
-    if not verify_password(user_credentials.password, user["password_hash"]):
+    valid, new_hash = await password_hasher.verify_and_update(user_credentials.password, user["password_hash"])
+    if not valid:
         raise HTTPException(status_code=400, detail="Invalid email or password")
     
+    # Upgrade hashes made with an older work factor while the password is at hand
+    if new_hash:
+        try:
+            await execute(supabase.table("users").update({"password_hash": new_hash}).eq("id", user["id"]))
+        except Exception as e:
+            print(f"Failed to rehash password for user {user['id']}: {e}")
+    
     # Check if user is active
     if user["status"] != "active":
         raise HTTPException(status_code=400, detail="Account is inactive")
     
-    # Create access token
-    access_token = create_access_token(data={"sub": user["id"], "email": user["email"]})
-    
     return LoginResponse(
-        access_token=access_token,
-        token_type="bearer",
+        **issue_tokens(user),
         user=UserResponse(**user).dict(),
         message="Login successful"
     )
 
+@router.post("/refresh", response_model=TokenPair)
+async def refresh(request: RefreshRequest):
+    """Exchange a refresh token for a new token pair (the old refresh token stops working)"""
+    supabase = get_supabase()
+    
+    try:
+        claims = await tokens.consume_refresh_token(request.refresh_token, supabase)
+    except TokenError:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid refresh token")
+    
+    response = await execute(supabase.table("users").select("id, email, status").eq("id", claims["sub"]))
+    if not response.data or response.data[0]["status"] != "active":
+        await tokens.revoke_session(supabase, claims["sid"])
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Account is inactive")
+    
+    return TokenPair(**issue_tokens(response.data[0], session_id=claims["sid"]))
+
 @router.get("/me", response_model=UserResponse)
 async def get_current_user_info(current_user: dict = Depends(get_current_user)):
     """Get current user information"""
     return UserResponse(**current_user)
 
 @router.post("/logout")
-async def logout():
-    """Logout user (client should remove token)"""
+async def logout(
+    request: Optional[LogoutRequest] = None,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security)
+):
+    """Logout user, revoking the session's access and refresh tokens"""
+    session_id = None
+    
+    if credentials:
+        try:
+            session_id = (await verify_access_token(credentials.credentials))["sid"]
+            tokens.forget_token(credentials.credentials)
+        except TokenError:
+            pass
+    
+    if session_id is None and request and request.refresh_token:
+        try:
+            claims = tokens.decode(request.refresh_token)
+            if claims.get("typ") == tokens.REFRESH:
+                session_id = claims["sid"]
+        except TokenError:
+            pass
+    
+    if session_id:
+        await tokens.revoke_session(get_supabase(), session_id)
+    
     return {"message": "Logout successful"}
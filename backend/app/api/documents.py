@@ -1,34 +1,162 @@
-from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, Form
+from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, Form, Request, Query
+from fastapi.responses import RedirectResponse
 from typing import List, Optional
+import asyncio
 import uuid
 from datetime import datetime
-from app.api.auth import get_current_user
-from app.database import get_supabase
-from app.core.storage import storage
+from postgrest.exceptions import APIError
+from app.api.auth import get_current_user, rate_limited
+from app.database import get_supabase, execute
+from app.direct_db import direct_db
+from app.core.storage import storage, ALLOWED_EXTENSIONS
+from app.core.serving import serve_file
+from app.core.events import download_events
+from app.core.previews import previews
+from app.core.indexing import text_indexer
+from app.core.tasks import release_file
+from app.core.thumbnails import PREVIEW_SIZES
+from app.core.pagination import PageParams, DOCUMENT_FIELDS, select_fields, keyset, page, decode_cursor
+from app.core.cache import ResponseCache, create_cache
+from app.core.config import settings
+from app.core.metrics import upload_bytes
+from app.core.ratelimit import upload_limit, download_limit
 
 router = APIRouter()
 
+# Approved-catalog reads look the same to every user, so responses are shared
+catalog_cache = ResponseCache(
+    create_cache("catalog", settings.catalog_cache_max_size, settings.catalog_cache_ttl_seconds),
+    max_age=settings.catalog_cache_max_age
+)
+
+async def invalidate_catalog():
+    """Drop cached catalog responses after a write that changes what they show"""
+    await catalog_cache.invalidate()
+
+# Postgres error codes PostgREST passes through
+FOREIGN_KEY_VIOLATION = "23503"
+UNIQUE_VIOLATION = "23505"
+
+async def insert_document(document_data: dict):
+    """Insert the row for a stored file, releasing the file if that fails
+    
+    PostgREST raises on a rejected insert rather than returning no rows, so
+    the file's blob reference is released on any error before it is
+    re-raised. Files without a content hash are staged direct uploads: they
+    hold no reference and are left for a retry (or the discard_upload job).
+    A subject that doesn't exist is a 400 and an id already taken a 409.
+    """
+    supabase = get_supabase()
+    try:
+        response = await execute(supabase.table("documents").insert(document_data))
+        if not response.data:
+            raise HTTPException(status_code=500, detail="Failed to save document record")
+    except Exception as e:
+        if document_data.get("content_hash"):
+            await release_file(document_data["file_path"], document_data["content_hash"])
+        if isinstance(e, APIError) and e.code == FOREIGN_KEY_VIOLATION:
+            raise HTTPException(status_code=400, detail="Invalid subject ID")
+        if isinstance(e, APIError) and e.code == UNIQUE_VIOLATION:
+            raise HTTPException(status_code=409, detail="Document already exists")
+        raise
+
 @router.get("/")
 async def get_documents(
+    request: Request,
     subject: Optional[str] = None,
     format: Optional[str] = None,
     search: Optional[str] = None,
+    paging: PageParams = Depends(),
+    current_user: dict = Depends(get_current_user)
+):
+    """Get approved documents, newest first, one page at a time"""
+    # Normalize so equivalent requests share a cache entry (title search is case-insensitive)
+    subject = subject.strip() if subject else None
+    format = format.strip().lower() if format else None
+    search = " ".join(search.split()).lower() if search else None
+    columns = select_fields(paging.fields, DOCUMENT_FIELDS)
+    
+    key = catalog_key(subject, format, search, columns, paging)
+    return await catalog_cache.respond(request, key, lambda: catalog_page(subject, format, search, columns, paging))
+
+def catalog_key(subject: Optional[str], format: Optional[str], search: Optional[str], columns: str, paging: PageParams) -> str:
+    return catalog_cache.key("list", {
+        "subject": subject,
+        "format": format,
+        "search": search,
+        "fields": columns,
+        "cursor": paging.cursor,
+        "limit": paging.limit
+    })
+
+async def catalog_page(subject: Optional[str], format: Optional[str], search: Optional[str], columns: str, paging: PageParams) -> dict:
+    """One page of the approved catalog, uncached"""
+    if direct_db.enabled:
+        cursor = decode_cursor(paging.cursor) if paging.cursor else None
+        rows = await direct_db.catalog_rows(columns.split(", "), subject, format, search, cursor, paging.limit + 1)
+    else:
+        supabase = get_supabase()
+        query = supabase.table("documents").select(columns).eq("status", "approved")
+        
+        if subject:
+            query = query.eq("subject_id", subject)
+        if format:
+            query = query.eq("format", format)
+        if search:
+            query = query.ilike("title", f"%{search}%")
+        
+        rows = (await execute(keyset(query, paging))).data
+    
+    documents, next_cursor = page(rows, paging)
+    return {"documents": documents, "next_cursor": next_cursor}
+
+async def warm_catalog():
+    """Cache the catalog's first page, the request nearly every visit starts with"""
+    paging = PageParams(cursor=None, limit=settings.default_page_size, fields=None)
+    columns = select_fields(None, DOCUMENT_FIELDS)
+    await catalog_cache.entry(
+        catalog_key(None, None, None, columns, paging),
+        lambda: catalog_page(None, None, None, columns, paging)
+    )
+
+@router.get("/search")
+async def search_documents(
+    q: str,
+    subject: Optional[str] = None,
+    format: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
     current_user: dict = Depends(get_current_user)
 ):
-    """Get list of approved documents"""
+    """Full-text search over approved documents, ranked by relevance
+    
+    Matches title, tags, author, description and the text extracted from
+    the file (Latin and Cyrillic Uzbek alike) with typo tolerance on titles.
+    Highlights are wrapped in <mark>.
+    """
     supabase = get_supabase()
     
-    query = supabase.table("documents").select("*").eq("status", "approved")
+    query = q.strip()
+    if not query:
+        raise HTTPException(status_code=400, detail="Search query is required")
+    if len(query) > 200:
+        raise HTTPException(status_code=400, detail="Search query is too long")
     
-    if subject:
-        query = query.eq("subject_id", subject)
-    if format:
-        query = query.eq("format", format)
-    if search:
-        query = query.ilike("title", f"%{search}%")
+    filters = {"p_query": query, "p_subject": subject, "p_format": format}
+    results, facet_rows = await asyncio.gather(
+        execute(supabase.rpc("search_documents", {**filters, "p_limit": limit, "p_offset": offset})),
+        execute(supabase.rpc("search_document_facets", filters))
+    )
     
-    response = query.execute()
-    return {"documents": response.data}
+    facets = {"subject": {}, "format": {}}
+    for row in facet_rows.data:
+        facets[row["facet"]][row["value"]] = row["count"]
+    
+    return {
+        "documents": results.data,
+        "facets": facets,
+        "total": sum(facets["format"].values())
+    }
 
 @router.post("/")
 async def upload_document(
@@ -38,7 +166,7 @@ async def upload_document(
     description: str = Form(None),
     author: str = Form(None),
     tags: str = Form(None),
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(rate_limited(upload_limit))
 ):
     """Upload a new document (regular users - goes to pending)"""
     supabase = get_supabase()
@@ -53,16 +181,16 @@ async def upload_document(
         raise HTTPException(status_code=400, detail="Title and subject are required")
     
     # Check if subject exists
-    subject_check = supabase.table("subjects").select("id").eq("id", subject_id).execute()
+    subject_check = await execute(supabase.table("subjects").select("id").eq("id", subject_id))
     if not subject_check.data:
         raise HTTPException(status_code=400, detail="Invalid subject ID")
     
     try:
-        # Generate unique filename
-        filename = storage.generate_filename(file.filename, title)
-        
-        # Save file
-        file_path = await storage.save_file(file, filename, supabase)
+        # Stream file to storage (size and hash are computed on the way,
+        # and content that is already stored is not written again)
+        stored = await storage.save_file(file, file_ext, supabase)
+        upload_bytes.inc(stored.size, method="multipart")
+        file_path = stored.path
         
         # Prepare document data
         document_data = {
@@ -72,7 +200,8 @@ async def upload_document(
             "subject_id": subject_id,
             "format": file_ext,
             "file_path": file_path,
-            "file_size": getattr(file, 'size', 0),
+            "file_size": stored.size,
+            "content_hash": stored.sha256,
             "author": author or f"{current_user.get('first_name', '')} {current_user.get('last_name', '')}".strip(),
             "tags": [tag.strip() for tag in tags.split(',')] if tags else [],
             "status": "pending",  # Regular users upload to pending
@@ -82,19 +211,18 @@ async def upload_document(
         }
         
         # Insert document record
-        response = supabase.table("documents").insert(document_data).execute()
+        await insert_document(document_data)
         
-        if not response.data:
-            # Clean up uploaded file if database insert failed
-            await storage.delete_file(file_path, supabase)
-            raise HTTPException(status_code=500, detail="Failed to save document record")
+        await invalidate_catalog()
+        previews.schedule(document_data["id"], file_path, stored.sha256, file_ext)
+        await text_indexer.schedule(document_data["id"], file_path, stored.sha256, file_ext)
         
         return {
             "message": "Document uploaded successfully and pending approval",
             "document_id": document_data["id"],
             "status": "pending"
         }
-        
+    
     except HTTPException:
         raise
     except Exception as e:
@@ -103,12 +231,25 @@ async def upload_document(
 @router.get("/{document_id}")
 async def get_document(
     document_id: str,
+    request: Request,
     current_user: dict = Depends(get_current_user)
 ):
     """Get specific document details"""
+    try:
+        document_id = str(uuid.UUID(document_id))
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Document not found")
+    
+    return await catalog_cache.respond(request, document_key(document_id), lambda: fetch_document(document_id))
+
+def document_key(document_id: str) -> str:
+    return catalog_cache.key("document", {"id": document_id})
+
+async def fetch_document(document_id: str) -> dict:
+    """An approved document's details, uncached; 404 if there is none"""
     supabase = get_supabase()
     
-    response = supabase.table("documents").select("*").eq("id", document_id).eq("status", "approved").execute()
+    response = await execute(supabase.table("documents").select(", ".join(DOCUMENT_FIELDS)).eq("id", document_id).eq("status", "approved"))
     
     if not response.data:
         raise HTTPException(status_code=404, detail="Document not found")
@@ -118,22 +259,124 @@ async def get_document(
 @router.post("/{document_id}/download")
 async def download_document(
     document_id: str,
-    current_user: dict = Depends(get_current_user)
+    request: Request,
+    current_user: dict = Depends(rate_limited(download_limit))
 ):
     """Record document download and return download URL"""
-    supabase = get_supabase()
+    try:
+        document_id = str(uuid.UUID(document_id))
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Document not found")
     
-    # Record download
+    # Only approved documents are counted; the details are usually cached
+    # already, and an unknown id would otherwise fail the whole batch insert
+    await catalog_cache.entry(document_key(document_id), lambda: fetch_document(document_id))
+    
+    # Record download (written in batches with the download count)
     download_record = {
         "user_id": current_user["id"],
         "document_id": document_id,
-        "ip_address": "127.0.0.1",  # Would get real IP in production
-        "user_agent": "API Request"
+        "downloaded_at": datetime.utcnow().isoformat(),
+        "ip_address": request.client.host if request.client else None,
+        "user_agent": request.headers.get("user-agent", "API Request")
     }
     
-    supabase.table("downloads").insert(download_record).execute()
+    await download_events.record(download_record)
+    
+    return {"message": "Download recorded", "download_url": f"/api/documents/{document_id}/file"}
+
+@router.api_route("/{document_id}/file", methods=["GET", "HEAD"])
+async def get_document_file(
+    document_id: str,
+    request: Request,
+    current_user: dict = Depends(get_current_user)
+):
+    """Serve the stored file with Range, ETag and conditional request support"""
+    try:
+        document_id = str(uuid.UUID(document_id))
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Document not found")
+    
+    supabase = get_supabase()
+    
+    response = await execute(
+        supabase.table("documents")
+        .select("id, title, format, file_path, file_size, content_hash, status, uploaded_by")
+        .eq("id", document_id)
+    )
+    
+    if not response.data:
+        raise HTTPException(status_code=404, detail="Document not found")
+    
+    document = response.data[0]
+    
+    # Unapproved documents are only visible to their uploader and admins
+    if document["status"] != "approved" and current_user.get("role") != "admin" \
+            and document.get("uploaded_by") != current_user["id"]:
+        raise HTTPException(status_code=404, detail="Document not found")
+    
+    download_name = f"{document['title']}.{document['format']}"
+    
+    # Remote storage serves ranges itself; hand out a short-lived signed URL
+    signed_url = await storage.presign(document["file_path"], download_name)
+    if signed_url:
+        return RedirectResponse(signed_url, status_code=307)
+    
+    path = storage.local_path(document["file_path"])
+    
+    # Content hash gives a strong validator; older files fall back to size and mtime
+    if document.get("content_hash"):
+        etag = f'"{document["content_hash"]}"'
+    else:
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            raise HTTPException(status_code=404, detail="File not found")
+        etag = f'"{stat.st_size:x}-{int(stat.st_mtime):x}"'
+    
+    media_type = ALLOWED_EXTENSIONS.get(document["format"], "application/octet-stream")
+    return serve_file(request, path, etag, media_type, download_name)
+
+@router.get("/{document_id}/preview/{size}")
+async def get_document_preview(document_id: str, size: str, request: Request):
+    """Serve a WebP preview of an approved document's first page or slide
+    
+    Public, so catalog cards can use it as a plain <img> source. Previews are
+    keyed by file content, so they can be cached for a long time.
+    """
+    if size not in PREVIEW_SIZES:
+        raise HTTPException(status_code=404, detail="Unknown preview size")
+    
+    try:
+        document_id = str(uuid.UUID(document_id))
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Document not found")
+    
+    supabase = get_supabase()
+    
+    response = await execute(
+        supabase.table("documents")
+        .select("file_path, content_hash, status, preview_status")
+        .eq("id", document_id)
+    )
+    
+    if not response.data or response.data[0]["status"] != "approved":
+        raise HTTPException(status_code=404, detail="Document not found")
+    
+    document = response.data[0]
+    if document.get("preview_status") != "ready":
+        raise HTTPException(status_code=404, detail="Preview not available")
+    
+    preview_path = storage.preview_path(document["file_path"], document["content_hash"], size)
+    max_age = settings.preview_max_age_seconds
     
-    # Increment download count
-    supabase.rpc("increment_download_count", {"document_id": document_id}).execute()
+    signed_url = await storage.presign(preview_path, expires_in=max_age)
+    if signed_url:
+        # Cache the redirect for well under the signature's lifetime
+        return RedirectResponse(signed_url, status_code=307, headers={"Cache-Control": f"public, max-age={max_age // 2}"})
     
-    return {"message": "Download recorded", "download_url": f"/files/{document_id}"}
+    path = storage.local_path(preview_path)
+    return serve_file(
+        request, path, f'"{document["content_hash"]}-{size}"', "image/webp", f"{document_id}-{size}.webp",
+        cache_control=f"public, max-age={max_age}", inline=True
+    )
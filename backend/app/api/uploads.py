@@ -0,0 +1,318 @@
+from fastapi import APIRouter, HTTPException, Depends, Request
+import uuid
+from datetime import datetime, timedelta
+from typing import Optional
+from app.api.auth import get_current_user, rate_limited
+from app.database import get_supabase, execute
+from app.core.config import settings
+from app.core.metrics import upload_bytes
+from app.core.ratelimit import upload_limit
+from app.core.storage import storage, ALLOWED_EXTENSIONS, MAX_FILE_SIZE
+from app.core.uploads import upload_sessions
+from app.api.documents import invalidate_catalog, insert_document
+from app.core.previews import previews
+from app.core.indexing import text_indexer
+from app.core.jobs import jobs
+from app.core.tokens import TokenError, encode as encode_token, decode as decode_token
+from app.core.tasks import adopt_upload, log_activity
+from app.schemas.upload import UploadSessionCreate, DirectUploadCreate, DirectUploadComplete
+
+router = APIRouter()
+
+# Upload tickets are signed like access tokens but carry this audience, so
+# neither can be used in place of the other
+DIRECT_UPLOAD_AUDIENCE = "direct-upload"
+
+async def _validate_upload(upload: UploadSessionCreate, supabase) -> str:
+    """Check a declared upload before accepting any bytes; returns the file extension"""
+    # Validate file
+    file_ext = upload.filename.lower().split('.')[-1]
+    if file_ext not in ALLOWED_EXTENSIONS:
+        allowed_exts = ', '.join(ALLOWED_EXTENSIONS.keys())
+        raise HTTPException(status_code=400, detail=f"File type '{file_ext}' not allowed. Allowed types: {allowed_exts}")
+    if upload.file_size <= 0:
+        raise HTTPException(status_code=400, detail="File size must be positive")
+    if upload.file_size > MAX_FILE_SIZE:
+        raise HTTPException(status_code=413, detail=f"File size ({upload.file_size} bytes) exceeds maximum allowed size ({MAX_FILE_SIZE} bytes)")
+    
+    # Validate required fields
+    if not upload.title or not upload.subject_id:
+        raise HTTPException(status_code=400, detail="Title and subject are required")
+    
+    # Check if subject exists
+    subject_check = await execute(supabase.table("subjects").select("id").eq("id", upload.subject_id))
+    if not subject_check.data:
+        raise HTTPException(status_code=400, detail="Invalid subject ID")
+    
+    return file_ext
+
+async def _create_document(
+    current_user: dict,
+    document_id: str,
+    metadata: dict,
+    file_ext: str,
+    file_path: str,
+    file_size: int,
+    content_hash: Optional[str]
+) -> dict:
+    """Insert the document row for a finished upload and start processing it"""
+    is_admin = current_user.get("role") == "admin"
+    
+    tags = metadata.get("tags")
+    default_author = "Admin" if is_admin else f"{current_user.get('first_name', '')} {current_user.get('last_name', '')}".strip()
+    document_status = "approved" if is_admin else "pending"  # Admin uploads are auto-approved
+    
+    try:
+        # Prepare document data
+        document_data = {
+            "id": document_id,
+            "title": metadata["title"],
+            "description": metadata.get("description"),
+            "subject_id": metadata["subject_id"],
+            "format": file_ext,
+            "file_path": file_path,
+            "file_size": file_size,
+            "content_hash": content_hash,
+            "author": metadata.get("author") or default_author,
+            "tags": [tag.strip() for tag in tags.split(',')] if tags else [],
+            "status": document_status,
+            "uploaded_by": current_user["id"],
+            "created_at": datetime.utcnow().isoformat(),
+            "updated_at": datetime.utcnow().isoformat()
+        }
+        
+        # Insert document record
+        await insert_document(document_data)
+        
+        # Without a hash the file is still being verified; processing starts after that
+        if content_hash:
+            previews.schedule(document_id, file_path, content_hash, file_ext)
+            await text_indexer.schedule(document_id, file_path, content_hash, file_ext)
+        
+        if is_admin:
+            await invalidate_catalog()
+            
+            # Log admin activity
+            activity_log = {
+                "user_id": current_user["id"],
+                "action": "uploaded_document",
+                "details": {
+                    "document_id": document_id,
+                    "title": metadata["title"],
+                    "subject": metadata["subject_id"],
+                    "file_size": file_size,
+                    "format": file_ext
+                }
+            }
+            
+            await log_activity(activity_log)
+        
+        return {
+            "message": "Document uploaded successfully" if is_admin else "Document uploaded successfully and pending approval",
+            "document_id": document_id,
+            "status": document_status,
+            "file_size": file_size
+        }
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
+
+def _issue_ticket(claims: dict, expires_in: int) -> str:
+    claims = {**claims, "aud": DIRECT_UPLOAD_AUDIENCE, "exp": datetime.utcnow() + timedelta(seconds=expires_in)}
+    return encode_token(claims)
+
+def _read_ticket(ticket: str, current_user: dict) -> dict:
+    try:
+        claims = decode_token(ticket, audience=DIRECT_UPLOAD_AUDIENCE)
+    except TokenError:
+        raise HTTPException(status_code=400, detail="Invalid or expired upload ticket")
+    
+    if claims.get("sub") != current_user["id"]:
+        raise HTTPException(status_code=403, detail="Upload belongs to another user")
+    return claims
+
+@router.post("/direct")
+async def create_direct_upload(
+    upload: DirectUploadCreate,
+    current_user: dict = Depends(rate_limited(upload_limit))
+):
+    """Start an upload that goes straight to storage instead of through the API
+    
+    Returns a presigned URL to send the file to and a ticket for finishing
+    the upload afterwards.
+    """
+    supabase = get_supabase()
+    file_ext = await _validate_upload(upload, supabase)
+    
+    upload_id = str(uuid.uuid4())
+    key = storage.staging_key(upload_id, file_ext)
+    sha256 = upload.sha256.lower()
+    expires_in = settings.direct_upload_expiry_seconds
+    
+    target = await storage.presign_upload(key, upload.file_size, sha256, expires_in)
+    
+    # Removed again later if the upload is never finished
+    await jobs.enqueue(
+        "discard_upload", {"file_path": storage.driver.path_for(key)},
+        idempotency_key=f"discard-upload:{upload_id}", delay=settings.direct_upload_cleanup_seconds
+    )
+    
+    ticket = _issue_ticket({
+        "sub": current_user["id"],
+        "upload_id": upload_id,
+        "key": key,
+        "format": file_ext,
+        "file_size": upload.file_size,
+        "sha256": sha256,
+        "metadata": upload.dict(exclude={"sha256"})
+    }, expires_in)
+    
+    return {
+        "upload_id": upload_id,
+        "ticket": ticket,
+        "expires_in": expires_in,
+        "upload": target._asdict()
+    }
+
+@router.post("/direct/complete")
+async def complete_direct_upload(
+    body: DirectUploadComplete,
+    current_user: dict = Depends(get_current_user)
+):
+    """Check a direct upload in storage and create the document
+    
+    Size and format are checked in place. The document row is inserted
+    first, pointing at the staged object; the upload id doubles as the
+    document id, so the primary key lets a ticket complete only once and a
+    failed insert leaves the upload in place for a retry. Backends that
+    verified the SHA-256 on upload (S3) are then deduplicated right away;
+    otherwise a verify_upload job hashes the file before it is deduplicated.
+    """
+    supabase = get_supabase()
+    ticket = _read_ticket(body.ticket, current_user)
+    document_id = ticket["upload_id"]
+    file_ext = ticket["format"]
+    file_size = ticket["file_size"]
+    
+    try:
+        verified = await storage.check_direct_upload(ticket["key"], file_size, ticket["sha256"], file_ext)
+    except HTTPException as e:
+        # A verified upload leaves staging once it completes, so a repeat finds nothing there
+        if e.status_code == 409:
+            existing = await execute(supabase.table("documents").select("id").eq("id", document_id))
+            if existing.data:
+                raise HTTPException(status_code=409, detail="Upload already completed")
+        raise
+    
+    file_path = storage.driver.path_for(ticket["key"])
+    result = await _create_document(current_user, document_id, ticket["metadata"], file_ext, file_path, file_size, None)
+    upload_bytes.inc(file_size, method="direct")
+    
+    if verified:
+        try:
+            await adopt_upload(document_id, file_path, ticket["sha256"], file_size, file_ext)
+            if result["status"] == "approved":
+                await invalidate_catalog()  # Cached rows still show the staged path
+            return result
+        except Exception as e:
+            print(f"Adopting direct upload {document_id} failed, leaving it to a job: {e}")
+    
+    await jobs.enqueue("verify_upload", {
+        "document_id": document_id,
+        "file_path": file_path,
+        "sha256": ticket["sha256"],
+        "file_size": file_size,
+        "format": file_ext
+    }, idempotency_key=f"verify-upload:{document_id}")
+    return result
+
+@router.post("/")
+async def create_upload_session(
+    upload: UploadSessionCreate,
+    current_user: dict = Depends(rate_limited(upload_limit))
+):
+    """Start a resumable upload"""
+    supabase = get_supabase()
+    file_ext = await _validate_upload(upload, supabase)
+    
+    session = upload_sessions.create(current_user, file_ext, upload.file_size, upload.dict())
+    
+    return upload_sessions.status(session)
+
+@router.get("/{upload_id}")
+async def get_upload_status(
+    upload_id: str,
+    current_user: dict = Depends(get_current_user)
+):
+    """Get received byte ranges and missing chunks of an upload"""
+    session = upload_sessions.get(upload_id, current_user)
+    return upload_sessions.status(session)
+
+@router.put("/{upload_id}/chunks/{index}")
+async def upload_chunk(
+    upload_id: str,
+    index: int,
+    offset: int,
+    request: Request,
+    current_user: dict = Depends(get_current_user)
+):
+    """Upload one numbered chunk; the request body is the raw chunk bytes"""
+    session = upload_sessions.get(upload_id, current_user)
+    received = await upload_sessions.write_chunk(session, index, offset, request.stream())
+    upload_bytes.inc(received, method="resumable")
+    
+    return {"index": index, "offset": offset, "size": received}
+
+@router.post("/{upload_id}/complete")
+async def complete_upload(
+    upload_id: str,
+    current_user: dict = Depends(get_current_user)
+):
+    """Assemble the received chunks and create the document"""
+    supabase = get_supabase()
+    session = upload_sessions.get(upload_id, current_user)
+    
+    upload_status = upload_sessions.status(session)
+    if not upload_status["complete"]:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Upload incomplete, missing chunks: {upload_status['missing_chunks']}"
+        )
+    
+    metadata = session["metadata"]
+    file_ext = session["format"]
+    
+    # Stream the chunks through the regular upload pipeline
+    parts = upload_sessions.open_parts(session)
+    try:
+        incoming = await storage.receive_file(parts, file_ext)
+    finally:
+        await parts.close()
+    
+    try:
+        if incoming.size != session["file_size"]:
+            raise HTTPException(status_code=400, detail="Assembled file size does not match the declared size")
+        
+        stored = await storage.store_blob(incoming, supabase)
+    finally:
+        incoming.temp_path.unlink(missing_ok=True)
+    
+    result = await _create_document(
+        current_user, str(uuid.uuid4()), metadata, file_ext, stored.path, stored.size, stored.sha256
+    )
+    upload_sessions.delete(upload_id)
+    
+    return result
+
+@router.delete("/{upload_id}")
+async def cancel_upload(
+    upload_id: str,
+    current_user: dict = Depends(get_current_user)
+):
+    """Abort an upload and discard its chunks"""
+    upload_sessions.get(upload_id, current_user)
+    upload_sessions.delete(upload_id)
+    
+    return {"message": "Upload cancelled"}
@@ -1,7 +1,8 @@
 from fastapi import APIRouter, HTTPException, Depends
-from app.api.auth import get_current_user
-from app.database import get_supabase
+from app.api.auth import get_current_user, invalidate_user
+from app.database import get_supabase, execute
 from app.schemas.user import UserUpdate, UserResponse
+from app.core.pagination import PageParams, DOCUMENT_FIELDS, select_fields, keyset, page
 
 router = APIRouter()
 
@@ -22,39 +23,55 @@ async def update_current_user_profile(
     update_data = {k: v for k, v in user_update.dict().items() if v is not None}
     
     if update_data:
-        response = supabase.table("users").update(update_data).eq("id", current_user["id"]).execute()
+        response = await execute(supabase.table("users").update(update_data).eq("id", current_user["id"]))
         
         if not response.data:
             raise HTTPException(status_code=400, detail="Failed to update profile")
         
+        await invalidate_user(current_user["id"])
+        
         return UserResponse(**response.data[0])
     
     return UserResponse(**current_user)
 
 @router.get("/downloads")
-async def get_user_downloads(current_user: dict = Depends(get_current_user)):
-    """Get user's download history"""
+async def get_user_downloads(paging: PageParams = Depends(), current_user: dict = Depends(get_current_user)):
+    """Get user's download history, most recent first
+    
+    ``fields`` selects the columns of the nested document.
+    """
     supabase = get_supabase()
     
-    response = supabase.table("downloads")\
-        .select("*, documents(*)")\
-        .eq("user_id", current_user["id"])\
-        .order("downloaded_at", desc=True)\
-        .execute()
+    columns = select_fields(paging.fields, DOCUMENT_FIELDS, required=("id",))
+    response = await execute(keyset(
+        supabase.table("downloads")
+        .select(f"id, document_id, downloaded_at, documents({columns})")
+        .eq("user_id", current_user["id"]),
+        paging,
+        sort_column="downloaded_at"
+    ))
+    downloads, next_cursor = page(response.data, paging, sort_column="downloaded_at")
     
-    return {"downloads": response.data}
+    return {"downloads": downloads, "next_cursor": next_cursor}
 
 @router.get("/favorites")
-async def get_user_favorites(current_user: dict = Depends(get_current_user)):
-    """Get user's favorite documents"""
+async def get_user_favorites(paging: PageParams = Depends(), current_user: dict = Depends(get_current_user)):
+    """Get user's favorite documents, most recently added first
+    
+    ``fields`` selects the columns of the nested document.
+    """
     supabase = get_supabase()
     
-    response = supabase.table("favorites")\
-        .select("*, documents(*)")\
-        .eq("user_id", current_user["id"])\
-        .execute()
+    columns = select_fields(paging.fields, DOCUMENT_FIELDS, required=("id",))
+    response = await execute(keyset(
+        supabase.table("favorites")
+        .select(f"id, document_id, created_at, documents({columns})")
+        .eq("user_id", current_user["id"]),
+        paging
+    ))
+    favorites, next_cursor = page(response.data, paging)
     
-    return {"favorites": response.data}
+    return {"favorites": favorites, "next_cursor": next_cursor}
 
 @router.post("/favorites/{document_id}")
 async def add_to_favorites(
@@ -69,7 +86,7 @@ async def add_to_favorites(
         "document_id": document_id
     }
     
-    response = supabase.table("favorites").insert(favorite_data).execute()
+    response = await execute(supabase.table("favorites").insert(favorite_data))
     
     if not response.data:
         raise HTTPException(status_code=400, detail="Failed to add to favorites")
@@ -84,10 +101,11 @@ async def remove_from_favorites(
     """Remove document from favorites"""
     supabase = get_supabase()
     
-    response = supabase.table("favorites")\
-        .delete()\
-        .eq("user_id", current_user["id"])\
-        .eq("document_id", document_id)\
-        .execute()
+    response = await execute(
+        supabase.table("favorites")
+        .delete()
+        .eq("user_id", current_user["id"])
+        .eq("document_id", document_id)
+    )
     
     return {"message": "Removed from favorites"}
@@ -0,0 +1,114 @@
+# Bulk document import for Sukun Slide
+#
+# Loads a ZIP archive or a directory of files without going through HTTP:
+#
+#     python -m app.bulk_import SOURCE --uploader admin@example.com [--manifest FILE] [--subject ID]
+#
+# Metadata comes from --manifest, else a manifest.csv or manifest.json at the
+# root of SOURCE, else the file names with --subject as the subject. Previews
+# and search text are generated before the command exits unless
+# --skip-processing is given (a later reindex picks those documents up).
+import argparse
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+from fastapi import HTTPException
+
+import app.core.tasks  # noqa: F401  (registers job handlers)
+from app.api.documents import invalidate_catalog
+from app.core.config import settings
+from app.core.imports import ImportSource, plan_import, run_import
+from app.core.indexing import text_indexer
+from app.core.jobs import jobs
+from app.core.previews import previews
+from app.core.storage import storage
+from app.core.tasks import log_activity
+from app.database import get_supabase, execute, shutdown_executor
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.bulk_import", description="Import documents in bulk")
+    parser.add_argument("source", type=Path, help="ZIP archive or directory of files")
+    parser.add_argument("--uploader", required=True, help="Email of the user the documents are attributed to")
+    parser.add_argument("--manifest", type=Path, help="CSV or JSON manifest (default: manifest.csv/.json in SOURCE)")
+    parser.add_argument("--subject", help="Subject id for files the manifest doesn't assign one")
+    parser.add_argument("--status", choices=["approved", "pending"], default="approved")
+    parser.add_argument("--report", type=Path, help="Write the per-file report here as JSON")
+    parser.add_argument("--skip-processing", action="store_true", help="Don't generate previews and search text")
+    return parser.parse_args(argv)
+
+async def main(args) -> int:
+    supabase = get_supabase()
+    
+    users = await execute(supabase.table("users").select("id, email").eq("email", args.uploader).limit(1))
+    if not users.data:
+        print(f"No user with email {args.uploader}")
+        return 1
+    uploader = users.data[0]
+    
+    await storage.setup()
+    
+    manifest_text = manifest_format = None
+    if args.manifest:
+        manifest_text = args.manifest.read_text(encoding="utf-8-sig")
+        manifest_format = "json" if args.manifest.suffix.lower() == ".json" else "csv"
+    
+    source = ImportSource(args.source)
+    try:
+        items = plan_import(source, manifest_text, manifest_format, args.subject)
+        print(f"Importing {len(items)} files from {args.source}")
+        result = await run_import(source, items, uploader, supabase, status=args.status)
+    finally:
+        source.close()
+    
+    documents = result.pop("documents")
+    if documents:
+        await invalidate_catalog()
+        await log_activity({
+            "user_id": uploader["id"],
+            "action": "imported_documents",
+            "details": {"document_ids": [doc["id"] for doc in documents], "count": len(documents)}
+        })
+    
+    for entry in result["results"]:
+        if entry["status"] == "failed":
+            print(f"  failed   {entry['file']}: {entry['error']}")
+    print(f"Imported {result['imported']} documents, {result['failed']} failed")
+    
+    if args.report:
+        args.report.write_text(json.dumps(result, indent=2))
+        print(f"Report written to {args.report}")
+    
+    if documents and not args.skip_processing:
+        print(f"Generating previews and search text for {len(documents)} documents")
+        slots = asyncio.Semaphore(settings.extraction_workers)
+        
+        async def index(doc: dict):
+            async with slots:
+                try:
+                    await text_indexer.process(doc["id"], doc["file_path"], doc["content_hash"], doc["format"])
+                except Exception:
+                    pass  # Already reported; the document stays 'failed' for a later reindex
+        
+        for doc in documents:
+            previews.schedule(doc["id"], doc["file_path"], doc["content_hash"], doc["format"])
+        await asyncio.gather(*(index(doc) for doc in documents))
+        await previews.shutdown()
+    
+    return 0 if result["failed"] == 0 else 2
+
+def run(argv=None) -> int:
+    args = parse_args(argv)
+    try:
+        return asyncio.run(main(args))
+    except HTTPException as e:
+        print(f"Import failed: {e.detail}")
+        return 1
+    finally:
+        jobs.close()
+        storage.close()
+        shutdown_executor()
+
+if __name__ == "__main__":
+    sys.exit(run())
@@ -0,0 +1,240 @@
+# Cache backends for Sukun Slide
+import hashlib
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from fastapi import Request
+from fastapi.encoders import jsonable_encoder
+from starlette.responses import JSONResponse, Response
+
+from app.core.config import settings
+from app.core.serving import etag_matches
+
+redis_asyncio = None
+if settings.redis_url:  # Only imported when used; it adds to every cold start
+    try:
+        import redis.asyncio as redis_asyncio
+    except ImportError:  # redis is optional
+        pass
+
+class TTLCache:
+    """Thread-safe LRU cache with a size bound and per-entry expiry"""
+    
+    def __init__(self, max_size: int = 1024, ttl_seconds: float = 60.0):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key: str) -> Optional[Any]:
+        """Return a cached value, or None if missing or expired"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return None
+            
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+    
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        """Store a value, evicting the least recently used entry when full"""
+        expires_at = time.monotonic() + (ttl if ttl is not None else self.ttl_seconds)
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+    
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+    
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+    
+    def __len__(self) -> int:
+        return len(self._data)
+    
+    def stats(self) -> Dict[str, Any]:
+        """Get size and hit/miss counters"""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0
+        }
+
+class MemoryCacheBackend:
+    """Async cache interface over an in-process TTLCache"""
+    
+    def __init__(self, namespace: str, max_size: int, ttl_seconds: float):
+        self.namespace = namespace
+        self.cache = TTLCache(max_size=max_size, ttl_seconds=ttl_seconds)
+    
+    async def get(self, key: str) -> Optional[Any]:
+        return self.cache.get(key)
+    
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        self.cache.set(key, value, ttl)
+    
+    async def delete(self, key: str) -> None:
+        self.cache.delete(key)
+    
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": "memory", "namespace": self.namespace, **self.cache.stats()}
+
+class RedisCacheBackend:
+    """Async cache interface over a Redis-compatible client shared by all workers
+    
+    The client only needs async ``get``, ``set(key, value, ex=...)`` and
+    ``delete``, so a local stand-in can replace Redis in tests.
+    """
+    
+    def __init__(self, client: Any, namespace: str, ttl_seconds: float):
+        self.client = client
+        self.namespace = namespace
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+    
+    def _key(self, key: str) -> str:
+        return f"sukun:{self.namespace}:{key}"
+    
+    async def get(self, key: str) -> Optional[Any]:
+        raw = await self.client.get(self._key(key))
+        if raw is None:
+            self.misses += 1
+            return None
+        
+        self.hits += 1
+        return json.loads(raw)
+    
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        expires_in = max(1, int(ttl if ttl is not None else self.ttl_seconds))
+        await self.client.set(self._key(key), json.dumps(value, default=str), ex=expires_in)
+    
+    async def delete(self, key: str) -> None:
+        await self.client.delete(self._key(key))
+    
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "backend": "redis",
+            "namespace": self.namespace,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0
+        }
+
+_redis_client = None
+
+def get_redis_client() -> Optional[Any]:
+    """Get the shared Redis client, or None when Redis is not configured"""
+    global _redis_client
+    if not settings.redis_url or redis_asyncio is None:
+        return None
+    if _redis_client is None:
+        _redis_client = redis_asyncio.from_url(settings.redis_url)
+    return _redis_client
+
+def create_cache(namespace: str, max_size: int, ttl_seconds: float):
+    """Create a Redis-backed cache when REDIS_URL is set, otherwise an in-process one"""
+    client = get_redis_client()
+    if client is not None:
+        return RedisCacheBackend(client, namespace, ttl_seconds)
+    return MemoryCacheBackend(namespace, max_size, ttl_seconds)
+
+class ResponseCache:
+    """HTTP response cache for read endpoints
+    
+    Bodies are stored with a weak ETag under a key built from the
+    normalized request. Write paths call ``invalidate()``, which starts a new
+    generation: older entries become unreachable and expire on their own.
+    With the Redis backend this applies to every worker at once; in-process
+    caches on other workers go stale for at most their TTL.
+    """
+    
+    GENERATION_KEY = "generation"
+    GENERATION_TTL_SECONDS = 24 * 3600
+    
+    def __init__(self, backend: Any, max_age: int):
+        self.backend = backend
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+    
+    @staticmethod
+    def key(kind: str, params: Dict[str, Any]) -> str:
+        """Stable key for a request; parameters left unset don't change it"""
+        present = {name: value for name, value in params.items() if value not in (None, "")}
+        digest = hashlib.sha1(json.dumps(present, sort_keys=True, default=str).encode()).hexdigest()
+        return f"{kind}:{digest}"
+    
+    async def _generation(self) -> str:
+        generation = await self.backend.get(self.GENERATION_KEY)
+        if generation is None:
+            generation = uuid.uuid4().hex
+            await self.backend.set(self.GENERATION_KEY, generation, ttl=self.GENERATION_TTL_SECONDS)
+        return generation
+    
+    async def invalidate(self) -> None:
+        """Drop every cached response (by moving to a new generation)"""
+        await self.backend.set(self.GENERATION_KEY, uuid.uuid4().hex, ttl=self.GENERATION_TTL_SECONDS)
+    
+    async def entry(self, key: str, produce: Callable[[], Awaitable[Any]]) -> Dict[str, Any]:
+        """The cached ``{"etag", "body"}`` for ``key``, calling ``produce`` on a miss"""
+        cache_key = f"{await self._generation()}:{key}"
+        entry = await self.backend.get(cache_key)
+        
+        if entry is None:
+            self.misses += 1
+            body = jsonable_encoder(await produce())
+            digest = hashlib.sha1(json.dumps(body, sort_keys=True).encode()).hexdigest()
+            entry = {"etag": f'W/"{digest[:32]}"', "body": body}
+            await self.backend.set(cache_key, entry)
+        else:
+            self.hits += 1
+        return entry
+    
+    async def respond(self, request: Request, key: str, produce: Callable[[], Awaitable[Any]]) -> Response:
+        """Serve ``key`` from the cache, calling ``produce`` on a miss
+        
+        Answers 304 when the client's If-None-Match still matches.
+        """
+        entry = await self.entry(key, produce)
+        
+        headers = {"ETag": entry["etag"], "Cache-Control": f"private, max-age={self.max_age}"}
+        if etag_matches(request.headers.get("if-none-match"), entry["etag"]):
+            self.not_modified += 1
+            return Response(status_code=304, headers=headers)
+        
+        return JSONResponse(entry["body"], headers=headers)
+    
+    def stats(self) -> Dict[str, Any]:
+        """Response-level hit ratio plus the backend's own counters"""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "not_modified": self.not_modified,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "backend": self.backend.stats()
+        }
@@ -11,7 +11,23 @@ class Settings(BaseSettings):
     # JWT Configuration
     jwt_secret: str = os.getenv("JWT_SECRET", "your-secret-key-here")
     jwt_algorithm: str = "HS256"
-    jwt_expiration_hours: int = 24
+    access_token_minutes: int = int(os.getenv("ACCESS_TOKEN_MINUTES", "15"))
+    refresh_token_days: int = int(os.getenv("REFRESH_TOKEN_DAYS", "30"))
+    token_cache_max_size: int = int(os.getenv("TOKEN_CACHE_MAX_SIZE", "10000"))  # Verified access tokens kept per process
+    
+    # Password Hashing Configuration
+    bcrypt_rounds: int = int(os.getenv("BCRYPT_ROUNDS", "12"))  # Hashes with other rounds are upgraded at login
+    password_hash_workers: int = int(os.getenv("PASSWORD_HASH_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))
+    password_hash_max_pending: int = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "16"))  # Running + queued before 503
+    
+    # Cache Configuration
+    redis_url: str = os.getenv("REDIS_URL", "")  # Optional shared cache backend
+    user_cache_ttl_seconds: float = float(os.getenv("USER_CACHE_TTL_SECONDS", "60"))
+    user_cache_max_size: int = int(os.getenv("USER_CACHE_MAX_SIZE", "10000"))
+    analytics_cache_ttl_seconds: float = float(os.getenv("ANALYTICS_CACHE_TTL_SECONDS", "30"))
+    catalog_cache_ttl_seconds: float = float(os.getenv("CATALOG_CACHE_TTL_SECONDS", "60"))
+    catalog_cache_max_size: int = int(os.getenv("CATALOG_CACHE_MAX_SIZE", "2048"))
+    catalog_cache_max_age: int = int(os.getenv("CATALOG_CACHE_MAX_AGE", "30"))  # Client-side Cache-Control max-age
     
     # Application Configuration
     environment: str = os.getenv("ENVIRONMENT", "development")
@@ -36,8 +52,91 @@ class Settings(BaseSettings):
         "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
     ]
     
+    # Resumable Upload Configuration
+    upload_chunk_size: int = 5 * 1024 * 1024  # 5MB
+    upload_session_ttl_hours: int = 24
+    upload_session_dir: str = os.getenv("UPLOAD_SESSION_DIR", "")  # Defaults to the system temp dir
+    
+    # Direct Upload Configuration
+    direct_upload_expiry_seconds: int = 3600  # Lifetime of presigned upload URLs and tickets
+    direct_upload_cleanup_seconds: int = 6 * 3600  # Unfinished direct uploads are deleted after this long
+    
+    # Pagination Configuration
+    default_page_size: int = int(os.getenv("DEFAULT_PAGE_SIZE", "20"))
+    max_page_size: int = int(os.getenv("MAX_PAGE_SIZE", "100"))
+    
+    # Bulk Moderation Configuration
+    bulk_max_items: int = 1000  # Document IDs per bulk request
+    bulk_batch_size: int = 100  # IDs per in_() query, keeping request URLs short
+    
+    # Bulk Import Configuration
+    import_concurrency: int = int(os.getenv("IMPORT_CONCURRENCY", "4"))  # Files stored in parallel
+    import_insert_batch_size: int = 100
+    import_max_files: int = 2000
+    import_max_archive_size: int = 2 * 1024 * 1024 * 1024  # 2GB
+    import_max_manifest_size: int = 5 * 1024 * 1024  # 5MB
+    
+    # Preview Configuration
+    preview_workers: int = int(os.getenv("PREVIEW_WORKERS", "2"))  # Rendering processes
+    preview_max_age_seconds: int = 7 * 24 * 3600  # Previews are content-addressed
+    
+    # Text Extraction Configuration
+    extraction_workers: int = int(os.getenv("EXTRACTION_WORKERS", "2"))  # Parser processes per job worker
+    extraction_max_attempts: int = 3  # Retried with the job queue's backoff
+    extraction_time_budget_seconds: float = float(os.getenv("EXTRACTION_TIME_BUDGET_SECONDS", "30"))  # Per file
+    extraction_max_chars: int = 100_000  # Text kept per document for the search index
+    
+    # Background Job Configuration
+    job_db_path: str = os.getenv("JOB_DB_PATH", "jobs.sqlite3")  # Shared by the API and worker processes
+    job_worker_in_app: bool = os.getenv("JOB_WORKER_IN_APP", "true").lower() == "true"  # false when running `python -m app.worker`
+    job_concurrency: int = int(os.getenv("JOB_CONCURRENCY", "4"))
+    job_poll_interval_seconds: float = 1.0
+    job_timeout_seconds: float = 120.0
+    job_lease_seconds: float = 300.0  # A job whose worker died is retried after this long
+    job_max_attempts: int = 5
+    job_retry_base_seconds: float = 5.0  # Doubles on every retry
+    job_retry_max_seconds: float = 600.0
+    job_retention_hours: float = 24.0  # Finished jobs (and their idempotency keys) are kept this long
+    
+    # Download Event Buffer Configuration
+    download_buffer_size: int = 10000  # Max queued events before back-pressure
+    download_batch_size: int = 500
+    download_flush_interval_seconds: float = 2.0
+    download_buffer_put_timeout_seconds: float = 1.0
+    
+    # Metrics Configuration
+    metrics_token: str = os.getenv("METRICS_TOKEN", "")  # When set, /metrics requires "Authorization: Bearer <token>"
+    
+    # Rate Limit Configuration
+    # Comma-separated "<user|ip>:<requests>/<second|minute|hour|day>" token buckets; empty disables
+    rate_limit_login: str = os.getenv("RATE_LIMIT_LOGIN", "ip:10/minute")  # Also covers registration
+    rate_limit_upload: str = os.getenv("RATE_LIMIT_UPLOAD", "user:30/hour,ip:60/hour")
+    rate_limit_download: str = os.getenv("RATE_LIMIT_DOWNLOAD", "user:60/minute,ip:120/minute")
+    rate_limit_max_keys: int = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))  # In-process buckets before the least recent are dropped
+    
+    # Startup and Health Check Configuration
+    warm_connections: int = int(os.getenv("WARM_CONNECTIONS", "4"))  # Database connections opened before reporting ready
+    warm_up_timeout_seconds: float = float(os.getenv("WARM_UP_TIMEOUT_SECONDS", "20"))  # Ready (or failing probes) after this long regardless
+    readiness_timeout_seconds: float = float(os.getenv("READINESS_TIMEOUT_SECONDS", "2"))  # Per dependency probe
+    readiness_cache_seconds: float = float(os.getenv("READINESS_CACHE_SECONDS", "2"))  # Probe results are reused this long
+    
     # Database Configuration
-    database_url: str = os.getenv("DATABASE_URL", "")
+    database_url: str = os.getenv("DATABASE_URL", "")  # Postgres connection string for the direct pool
+    direct_db_enabled: bool = os.getenv("DIRECT_DB_ENABLED", "false").lower() == "true"  # Hot queries over asyncpg instead of PostgREST
+    direct_db_pool_size: int = int(os.getenv("DIRECT_DB_POOL_SIZE", "10"))
+    direct_db_statement_cache_size: int = int(os.getenv("DIRECT_DB_STATEMENT_CACHE_SIZE", "100"))  # 0 behind a transaction-mode pooler
+    db_pool_size: int = int(os.getenv("DB_POOL_SIZE", "16"))  # Worker threads / pooled connections
+    db_timeout_seconds: float = float(os.getenv("DB_TIMEOUT_SECONDS", "10"))
+    storage_timeout_seconds: float = float(os.getenv("STORAGE_TIMEOUT_SECONDS", "60"))
+    
+    # Storage Configuration
+    storage_backend: str = os.getenv("STORAGE_BACKEND", "supabase")  # local, supabase or s3
+    storage_bucket: str = os.getenv("STORAGE_BUCKET", "documents")
+    storage_pool_size: int = int(os.getenv("STORAGE_POOL_SIZE", "16"))  # Pooled connections per backend
+    s3_endpoint_url: str = os.getenv("S3_ENDPOINT_URL", "")  # Empty for AWS; set for MinIO and other S3-compatible services
+    s3_region: str = os.getenv("S3_REGION", "us-east-1")
+    s3_access_key_id: str = os.getenv("S3_ACCESS_KEY_ID", "")
+    s3_secret_access_key: str = os.getenv("S3_SECRET_ACCESS_KEY", "")
     
     class Config:
         env_file = ".env"
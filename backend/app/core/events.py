@@ -0,0 +1,246 @@
+# Buffered download-event ingestion for Sukun Slide
+import asyncio
+import time
+from collections import Counter
+from typing import List, Optional
+
+from fastapi import HTTPException
+from postgrest.exceptions import APIError
+
+from app.core.config import settings
+from app.database import get_supabase, execute
+from app.direct_db import direct_db
+
+# Backoff while the database is unreachable; the batch is held and retried
+FLUSH_RETRY_SECONDS = 1.0
+FLUSH_RETRY_MAX_SECONDS = 30.0
+SHUTDOWN_FLUSH_ATTEMPTS = 3
+
+def _is_data_error(error: Exception) -> bool:
+    """True for errors caused by the rows themselves (SQLSTATE class 22/23)
+    
+    Covers PostgREST's APIError and asyncpg's PostgresError; timeouts and
+    connection failures carry no SQLSTATE and are retried instead.
+    """
+    code = getattr(error, "code", None) if isinstance(error, APIError) else getattr(error, "sqlstate", None)
+    return isinstance(code, str) and code[:2] in ("22", "23")
+
+class DownloadEventBuffer:
+    """Bounded in-process buffer that records downloads in batches
+    
+    Requests are acknowledged as soon as their event is queued. A background
+    task flushes when ``batch_size`` events are waiting or ``flush_interval``
+    seconds after the first one arrived: one bulk insert into ``downloads``
+    plus one aggregated counter update per document. If the database is
+    unreachable the batch is held and retried with backoff; counter updates
+    that fail are carried into the next flush.
+    """
+    
+    def __init__(self, max_size: int, batch_size: int, flush_interval: float, put_timeout: float):
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self._unsaved_counts: Counter = Counter()
+        
+        # Metrics
+        self.recorded = 0
+        self.flushed = 0
+        self.dropped = 0
+        self.flushes = 0
+        self.failed_flushes = 0
+        self.last_flush_seconds = 0.0
+        self.total_flush_seconds = 0.0
+    
+    @property
+    def queue(self) -> asyncio.Queue:
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.max_size)
+        return self._queue
+    
+    async def record(self, event: dict):
+        """Queue a download event, applying back-pressure when the buffer is full"""
+        if self._stopping:
+            raise HTTPException(status_code=503, detail="Server is shutting down", headers={"Retry-After": "5"})
+        
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            try:
+                await asyncio.wait_for(self.queue.put(event), self.put_timeout)
+            except asyncio.TimeoutError:
+                raise HTTPException(
+                    status_code=503,
+                    detail="Download recording is overloaded, please retry",
+                    headers={"Retry-After": "1"}
+                )
+        
+        self.recorded += 1
+    
+    def start(self):
+        """Start the background flush task"""
+        if self._task is None:
+            self._stopping = False
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        """Stop accepting events and drain everything still buffered"""
+        self._stopping = True
+        if self._task is not None:
+            await self._task
+            self._task = None
+        else:
+            # Never started: flush directly
+            while not self.queue.empty() or self._unsaved_counts:
+                await self._flush_with_retry(await self._collect())
+    
+    async def _collect(self) -> List[dict]:
+        """Wait for the first event, then give the batch time to fill up"""
+        batch = []
+        deadline = None
+        
+        while len(batch) < self.batch_size:
+            if self._stopping and self.queue.empty():
+                break
+            
+            if deadline is None:
+                timeout = self.flush_interval  # Idle poll, so a shutdown is noticed
+            else:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+            
+            try:
+                event = await asyncio.wait_for(self.queue.get(), timeout)
+            except asyncio.TimeoutError:
+                if batch:
+                    break
+                continue
+            
+            batch.append(event)
+            if deadline is None:
+                deadline = time.monotonic() + self.flush_interval
+        
+        return batch
+    
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            if batch or self._unsaved_counts:
+                await self._flush_with_retry(batch)
+            elif self._stopping:
+                return
+    
+    async def _flush_with_retry(self, batch: List[dict]):
+        """Flush a batch, backing off and retrying whatever could not be written"""
+        delay = FLUSH_RETRY_SECONDS
+        attempts = 0
+        
+        while True:
+            attempts += 1
+            try:
+                batch = await self._flush(batch)
+            except Exception as e:
+                self.failed_flushes += 1
+                print(f"Failed to flush {len(batch)} download events: {e}")
+            
+            if not batch and not self._unsaved_counts:
+                return
+            
+            if self._stopping and attempts >= SHUTDOWN_FLUSH_ATTEMPTS:
+                self.dropped += len(batch)
+                print(
+                    f"Giving up on {len(batch)} download events and "
+                    f"{sum(self._unsaved_counts.values())} counter updates at shutdown"
+                )
+                self._unsaved_counts.clear()
+                return
+            
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, FLUSH_RETRY_MAX_SECONDS)
+    
+    async def _insert(self, events: List[dict]):
+        if direct_db.enabled:
+            await direct_db.insert_downloads(events)
+        else:
+            await execute(get_supabase().table("downloads").insert(events))
+    
+    async def _increment(self, document_ids: List[str], counts: List[int]):
+        if direct_db.enabled:
+            await direct_db.increment_download_counts(document_ids, counts)
+        else:
+            await execute(get_supabase().rpc("increment_download_counts", {
+                "document_ids": document_ids,
+                "counts": counts
+            }))
+    
+    async def _flush(self, batch: List[dict]) -> List[dict]:
+        """Write a batch and apply its counts, returning the events still unwritten"""
+        started = time.perf_counter()
+        remaining: List[dict] = []
+        
+        if batch:
+            try:
+                await self._insert(batch)
+                written = batch
+            except Exception as e:
+                if not _is_data_error(e):
+                    raise
+                
+                # One bad row (e.g. a deleted document) fails the bulk insert; fall back to row by row
+                print(f"Bulk download insert failed, retrying individually: {e}")
+                written = []
+                for index, event in enumerate(batch):
+                    try:
+                        await self._insert([event])
+                        written.append(event)
+                    except Exception as row_error:
+                        if not _is_data_error(row_error):
+                            print(f"Download insert failed, holding {len(batch) - index} events: {row_error}")
+                            remaining = batch[index:]
+                            break
+                        self.dropped += 1
+                        print(f"Dropped download event for {event.get('document_id')}: {row_error}")
+            
+            self._unsaved_counts.update(event["document_id"] for event in written)
+            self.flushed += len(written)
+        
+        if self._unsaved_counts:
+            counts = dict(self._unsaved_counts)
+            try:
+                await self._increment(list(counts.keys()), list(counts.values()))
+                self._unsaved_counts.subtract(counts)
+                self._unsaved_counts = +self._unsaved_counts
+            except Exception as e:
+                print(f"Failed to update download counts, will retry: {e}")
+        
+        self.flushes += 1
+        self.last_flush_seconds = time.perf_counter() - started
+        self.total_flush_seconds += self.last_flush_seconds
+        return remaining
+    
+    def stats(self) -> dict:
+        """Queue depth and flush metrics"""
+        return {
+            "queue_depth": self.queue.qsize(),
+            "max_size": self.max_size,
+            "recorded": self.recorded,
+            "flushed": self.flushed,
+            "dropped": self.dropped,
+            "flushes": self.flushes,
+            "failed_flushes": self.failed_flushes,
+            "unsaved_counts": sum(self._unsaved_counts.values()),
+            "last_flush_seconds": self.last_flush_seconds,
+            "avg_flush_seconds": self.total_flush_seconds / self.flushes if self.flushes else 0.0
+        }
+
+# Global download event buffer
+download_events = DownloadEventBuffer(
+    max_size=settings.download_buffer_size,
+    batch_size=settings.download_batch_size,
+    flush_interval=settings.download_flush_interval_seconds,
+    put_timeout=settings.download_buffer_put_timeout_seconds
+)
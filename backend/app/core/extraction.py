@@ -0,0 +1,132 @@
+# Plain-text extraction for the search index
+#
+# Runs inside extraction worker processes, so it deliberately imports nothing
+# from the rest of the app. Every format is read incrementally (page by page,
+# or as an XML event stream) and reading stops once the character limit or the
+# time budget is reached, so large files are never held in memory.
+import re
+import time
+import zipfile
+import xml.etree.ElementTree as ET
+from typing import IO, Iterator, Tuple
+
+try:
+    import pypdfium2 as pdfium
+except ImportError:  # pypdfium2 is optional; without it PDFs are not indexed
+    pdfium = None
+
+DRAWINGML = "{http://schemas.openxmlformats.org/drawingml/2006/main}"
+WORDML = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+SPREADSHEETML = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+
+# Errors that mean the file itself is damaged; retrying will not help
+CORRUPT_FILE_ERRORS = (zipfile.BadZipFile, ET.ParseError) + ((pdfium.PdfiumError,) if pdfium else ())
+
+class ExtractionUnsupported(Exception):
+    """The file format has no text extractor here"""
+
+def _numbered(names, prefix: str):
+    """Package parts like ppt/slides/slide10.xml, in natural order"""
+    pattern = re.compile(re.escape(prefix) + r"(\d+)\.xml$")
+    matches = [(int(m.group(1)), name) for name in names if (m := pattern.match(name))]
+    return [name for _, name in sorted(matches)]
+
+def _xml_text(stream: IO[bytes], text_tag: str, block_tag: str) -> Iterator[str]:
+    """Yield the text of an XML part one block (paragraph, cell) at a time"""
+    runs = []
+    for event, element in ET.iterparse(stream, events=("end",)):
+        if element.tag == text_tag and element.text:
+            runs.append(element.text)  # Runs split words mid-way, so join without spaces
+        elif element.tag == block_tag:
+            yield "".join(runs)
+            runs = []
+            element.clear()  # Keep memory flat on long parts
+    if runs:
+        yield "".join(runs)
+
+def _pdf_text(path: str) -> Iterator[str]:
+    if pdfium is None:
+        raise ExtractionUnsupported("pypdfium2 is not installed")
+    
+    pdf = pdfium.PdfDocument(path)
+    try:
+        for index in range(len(pdf)):
+            page = pdf[index]
+            textpage = page.get_textpage()
+            try:
+                yield textpage.get_text_range()
+            finally:
+                textpage.close()
+                page.close()
+    finally:
+        pdf.close()
+
+def _ooxml_text(path: str, file_ext: str) -> Iterator[str]:
+    with zipfile.ZipFile(path) as package:
+        names = package.namelist()
+        
+        if file_ext == "docx":
+            parts = [("word/document.xml", WORDML + "t", WORDML + "p")]
+        elif file_ext == "pptx":
+            parts = [(name, DRAWINGML + "t", DRAWINGML + "p") for name in _numbered(names, "ppt/slides/slide")]
+        else:
+            # Text cells live in the shared string table; inline strings in the sheets
+            parts = [("xl/sharedStrings.xml", SPREADSHEETML + "t", SPREADSHEETML + "si")]
+            parts += [(name, SPREADSHEETML + "t", SPREADSHEETML + "c") for name in _numbered(names, "xl/worksheets/sheet")]
+        
+        for name, text_tag, block_tag in parts:
+            if name not in names:
+                continue
+            with package.open(name) as stream:
+                yield from _xml_text(stream, text_tag, block_tag)
+
+def extract_text(path: str, file_ext: str, max_chars: int, time_budget: float) -> Tuple[str, bool]:
+    """Extract up to ``max_chars`` of whitespace-normalised text
+    
+    Returns the text and whether the whole file was read; reading stops early
+    at the character limit or when ``time_budget`` seconds have passed.
+    """
+    if file_ext == "pdf":
+        chunks = _pdf_text(path)
+    elif file_ext in ("docx", "pptx", "xlsx"):
+        chunks = _ooxml_text(path, file_ext)
+    else:
+        raise ExtractionUnsupported(f"No text extractor for .{file_ext} files")
+    
+    deadline = time.monotonic() + time_budget
+    parts = []
+    size = 0
+    complete = True
+    
+    try:
+        for chunk in chunks:
+            text = " ".join(chunk.split())
+            if not text:
+                continue
+            
+            parts.append(text)
+            size += len(text) + 1
+            if size >= max_chars or time.monotonic() >= deadline:
+                complete = False
+                break
+    except CORRUPT_FILE_ERRORS as e:
+        raise ExtractionUnsupported(f"Unreadable {file_ext} file: {e}")
+    finally:
+        chunks.close()
+    
+    return " ".join(parts)[:max_chars], complete
+
+def run_extraction(connection, path: str, file_ext: str, max_chars: int, time_budget: float):
+    """Process entry point: send extract_text's result, or the error it raised, down ``connection``"""
+    try:
+        result = extract_text(path, file_ext, max_chars, time_budget)
+    except Exception as e:
+        result = e
+    
+    try:
+        connection.send(result)
+    except Exception:
+        # Some parser errors cannot be pickled
+        connection.send(RuntimeError(f"{type(result).__name__}: {result}"))
+    finally:
+        connection.close()
@@ -0,0 +1,98 @@
+# Liveness and readiness for Sukun Slide
+#
+# Liveness only says the process is serving requests. Readiness says it
+# should get traffic: warm-up has finished, it isn't shutting down, and the
+# database and storage answered within a timeout. Probe results are shared
+# for a couple of seconds so frequent health checks don't load either one.
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from app.core.config import settings
+from app.core.storage import storage
+from app.database import ping as ping_database
+from app.direct_db import direct_db
+
+STARTING = "starting"
+READY = "ready"
+STOPPING = "stopping"
+
+class Readiness:
+    """Lifecycle state plus cached dependency probes"""
+    
+    def __init__(self, timeout: float, cache_seconds: float):
+        self.timeout = timeout
+        self.cache_seconds = cache_seconds
+        self.state = STARTING
+        self.checks: Dict[str, Callable[[], Awaitable[Any]]] = {
+            "database": lambda: ping_database(timeout),
+            "storage": storage.ping,
+        }
+        if direct_db.enabled:
+            self.checks["direct_db"] = direct_db.ping
+        self._result: Optional[Tuple[float, bool, Dict[str, dict]]] = None
+        self._probing: Optional[asyncio.Task] = None
+        
+        # Metrics
+        self.started_at = time.monotonic()
+        self.ready_after_seconds: Optional[float] = None
+    
+    def mark_ready(self):
+        if self.state == STARTING:
+            self.state = READY
+            self.ready_after_seconds = time.monotonic() - self.started_at
+    
+    def mark_stopping(self):
+        self.state = STOPPING
+    
+    async def _check(self, name: str) -> dict:
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(self.checks[name](), self.timeout)
+            return {"ok": True, "latency_ms": round((time.perf_counter() - started) * 1000, 1)}
+        except asyncio.TimeoutError:
+            return {"ok": False, "error": f"timed out after {self.timeout:g}s"}
+        except Exception as e:
+            return {"ok": False, "error": getattr(e, "detail", None) or str(e) or type(e).__name__}
+    
+    async def _probe(self) -> Tuple[float, bool, Dict[str, dict]]:
+        names = list(self.checks)
+        results = dict(zip(names, await asyncio.gather(*(self._check(name) for name in names))))
+        return time.monotonic(), all(result["ok"] for result in results.values()), results
+    
+    async def probe(self) -> Tuple[bool, Dict[str, dict]]:
+        """Whether every dependency answered, and each one's result
+        
+        Concurrent callers share one probe, and its result is reused for
+        ``cache_seconds``.
+        """
+        if self._result is None or time.monotonic() - self._result[0] > self.cache_seconds:
+            if self._probing is None:
+                self._probing = asyncio.create_task(self._probe())
+            try:
+                self._result = await asyncio.shield(self._probing)
+            finally:
+                if self._probing is not None and self._probing.done():
+                    self._probing = None
+        _, ok, results = self._result
+        return ok, results
+    
+    async def status(self) -> Tuple[bool, dict]:
+        """Readiness and the body to report it with"""
+        if self.state != READY:
+            return False, {"status": self.state}
+        ok, checks = await self.probe()
+        return ok, {"status": READY if ok else "unavailable", "checks": checks}
+    
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "ready_after_seconds": self.ready_after_seconds,
+            "uptime_seconds": round(time.monotonic() - self.started_at, 1)
+        }
+
+# Global readiness instance
+readiness = Readiness(
+    timeout=settings.readiness_timeout_seconds,
+    cache_seconds=settings.readiness_cache_seconds
+)
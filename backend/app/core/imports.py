@@ -0,0 +1,316 @@
+# Bulk document import for Sukun Slide
+import asyncio
+import csv
+import io
+import json
+import mimetypes
+import uuid
+import zipfile
+from datetime import datetime
+from pathlib import Path, PurePosixPath
+from typing import IO, Callable, Dict, List, NamedTuple, Optional
+
+import aiofiles
+from fastapi import HTTPException
+
+from app.core.config import settings
+from app.core.metrics import upload_bytes
+from app.core.storage import storage, CHUNK_SIZE
+from app.core.previews import previews
+from app.core.indexing import text_indexer
+from app.core.tasks import release_files
+from app.database import execute
+
+MANIFEST_NAMES = ("manifest.csv", "manifest.json")
+
+class ImportItem(NamedTuple):
+    """One file to import and the metadata its document row gets"""
+    file: str  # Entry name in the archive, or path relative to the directory
+    title: str
+    subject_id: Optional[str]
+    description: Optional[str] = None
+    author: Optional[str] = None
+    tags: List[str] = []
+
+class ImportedFile:
+    """A file inside an import source, shaped like an UploadFile
+    
+    ``FileStorage.validate_file`` reads the name, type and size, and
+    ``FileStorage.receive_file`` streams it with ``read()``. The underlying
+    stream is synchronous (zip entries decompress as they are read), so each
+    chunk is read in a worker thread.
+    """
+    
+    def __init__(self, filename: str, size: int, opener: Callable[[], IO[bytes]]):
+        self.filename = PurePosixPath(filename).name
+        self.size = size
+        self.content_type = mimetypes.guess_type(self.filename)[0]
+        self._opener = opener
+        self._stream: Optional[IO[bytes]] = None
+    
+    async def read(self, size: int = -1) -> bytes:
+        loop = asyncio.get_running_loop()
+        if self._stream is None:
+            self._stream = await loop.run_in_executor(None, self._opener)
+        return await loop.run_in_executor(None, self._stream.read, size)
+    
+    def close(self):
+        if self._stream is not None:
+            self._stream.close()
+            self._stream = None
+
+class ImportSource:
+    """Files to import: a ZIP archive on disk or a directory"""
+    
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.archive: Optional[zipfile.ZipFile] = None
+        
+        if self.path.is_dir():
+            return
+        try:
+            self.archive = zipfile.ZipFile(self.path)
+        except (zipfile.BadZipFile, OSError):
+            raise HTTPException(status_code=400, detail="Import source must be a ZIP archive or a directory")
+    
+    def names(self) -> List[str]:
+        """Every regular file, skipping hidden files and archiver metadata"""
+        if self.archive is not None:
+            names = [info.filename for info in self.archive.infolist() if not info.is_dir()]
+        else:
+            names = [path.relative_to(self.path).as_posix() for path in sorted(self.path.rglob("*")) if path.is_file()]
+        
+        return [
+            name for name in names
+            if not any(part.startswith(".") or part == "__MACOSX" for part in PurePosixPath(name).parts)
+        ]
+    
+    def read_text(self, name: str) -> str:
+        if self.archive is not None:
+            return self.archive.read(name).decode("utf-8-sig")
+        return self._local_path(name).read_text(encoding="utf-8-sig")
+    
+    def _local_path(self, name: str) -> Path:
+        path = (self.path / name).resolve()
+        if self.path.resolve() not in path.parents:
+            raise KeyError(name)
+        return path
+    
+    def open(self, name: str) -> ImportedFile:
+        """Open one file for streaming; KeyError if it isn't in the source"""
+        if self.archive is not None:
+            info = self.archive.getinfo(name)
+            return ImportedFile(name, info.file_size, lambda: self.archive.open(info))
+        
+        path = self._local_path(name)
+        if not path.is_file():
+            raise KeyError(name)
+        return ImportedFile(name, path.stat().st_size, lambda: open(path, "rb"))
+    
+    def close(self):
+        if self.archive is not None:
+            self.archive.close()
+
+def _split_tags(value) -> List[str]:
+    if isinstance(value, list):
+        return [str(tag).strip() for tag in value if str(tag).strip()]
+    return [tag.strip() for tag in (value or "").split(",") if tag.strip()]
+
+def parse_manifest(text: str, fmt: str, default_subject: Optional[str] = None) -> List[ImportItem]:
+    """Read a CSV or JSON manifest
+    
+    Each entry names its ``file`` and may set ``title``, ``subject``,
+    ``description``, ``author`` and ``tags`` (a list, or comma-separated).
+    """
+    try:
+        if fmt == "json":
+            rows = json.loads(text)
+            if isinstance(rows, dict):
+                rows = rows.get("documents", [])
+        else:
+            rows = list(csv.DictReader(io.StringIO(text)))
+    except (ValueError, csv.Error) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid {fmt.upper()} manifest: {e}")
+    
+    items = []
+    for number, row in enumerate(rows, start=1):
+        if not isinstance(row, dict) or not row.get("file"):
+            raise HTTPException(status_code=400, detail=f"Manifest entry {number} has no 'file'")
+        
+        file = str(row["file"]).strip()
+        items.append(ImportItem(
+            file=file,
+            title=(row.get("title") or "").strip() or PurePosixPath(file).stem,
+            subject_id=(row.get("subject") or row.get("subject_id") or "").strip() or default_subject,
+            description=row.get("description") or None,
+            author=row.get("author") or None,
+            tags=_split_tags(row.get("tags"))
+        ))
+    return items
+
+def plan_import(
+    source: ImportSource,
+    manifest_text: Optional[str] = None,
+    manifest_format: Optional[str] = None,
+    default_subject: Optional[str] = None
+) -> List[ImportItem]:
+    """Work out what to import: the manifest's entries, or every file in the source
+    
+    A manifest.csv or manifest.json at the root of the source is used when
+    no manifest is given. Without one, titles come from the file names.
+    """
+    names = source.names()
+    
+    if manifest_text is None:
+        for manifest_name in MANIFEST_NAMES:
+            if manifest_name in names:
+                manifest_text = source.read_text(manifest_name)
+                manifest_format = manifest_name.rsplit(".", 1)[-1]
+                break
+    
+    if manifest_text is not None:
+        items = parse_manifest(manifest_text, manifest_format or "csv", default_subject)
+    else:
+        items = [
+            ImportItem(file=name, title=PurePosixPath(name).stem.replace("_", " "), subject_id=default_subject)
+            for name in names
+        ]
+    
+    items = [item for item in items if item.file not in MANIFEST_NAMES]
+    if not items:
+        raise HTTPException(status_code=400, detail="Nothing to import")
+    if len(items) > settings.import_max_files:
+        raise HTTPException(status_code=400, detail=f"Imports are limited to {settings.import_max_files} files")
+    return items
+
+async def spool_upload(file, suffix: str = ".zip") -> Path:
+    """Stream an uploaded archive to disk in chunks, enforcing the size limit"""
+    storage.spool_dir.mkdir(parents=True, exist_ok=True)
+    path = storage.spool_dir / f"{uuid.uuid4().hex}{suffix}"
+    size = 0
+    
+    try:
+        async with aiofiles.open(path, "wb") as f:
+            while True:
+                chunk = await file.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > settings.import_max_archive_size:
+                    raise HTTPException(status_code=413, detail="Import archive is too large")
+                await f.write(chunk)
+        return path
+    except BaseException:
+        path.unlink(missing_ok=True)
+        raise
+
+async def run_import(
+    source: ImportSource,
+    items: List[ImportItem],
+    uploader: dict,
+    supabase,
+    status: str = "approved"
+) -> dict:
+    """Store every item and insert its document row
+    
+    Files are validated and streamed to deduplicated storage a few at a
+    time; rows go in with batched inserts. Returns a per-file report and
+    the inserted rows (for preview and text processing).
+    """
+    subjects = {row["id"] for row in (await execute(supabase.table("subjects").select("id"))).data}
+    semaphore = asyncio.Semaphore(settings.import_concurrency)
+    report: Dict[int, dict] = {}
+    pending: Dict[int, dict] = {}
+    
+    async def store(index: int, item: ImportItem):
+        entry = {"file": item.file, "title": item.title}
+        report[index] = entry
+        
+        if not item.subject_id or item.subject_id not in subjects:
+            entry.update(status="failed", error=f"Unknown subject '{item.subject_id or ''}'")
+            return
+        
+        try:
+            file = source.open(item.file)
+        except KeyError:
+            entry.update(status="failed", error="File not found in import source")
+            return
+        
+        is_valid, message, file_ext = storage.validate_file(file)
+        if not is_valid:
+            entry.update(status="failed", error=message)
+            return
+        
+        async with semaphore:
+            try:
+                stored = await storage.save_file(file, file_ext, supabase)
+            except HTTPException as e:
+                entry.update(status="failed", error=e.detail)
+                return
+            except Exception as e:
+                entry.update(status="failed", error=f"Storage failed: {e}")
+                return
+            finally:
+                file.close()
+        
+        upload_bytes.inc(stored.size, method="import")
+        now = datetime.utcnow().isoformat()
+        pending[index] = {
+            "id": str(uuid.uuid4()),
+            "title": item.title,
+            "description": item.description,
+            "subject_id": item.subject_id,
+            "format": file_ext,
+            "file_path": stored.path,
+            "file_size": stored.size,
+            "content_hash": stored.sha256,
+            "author": item.author or "Admin",
+            "tags": item.tags,
+            "status": status,
+            "uploaded_by": uploader["id"],
+            "created_at": now,
+            "updated_at": now
+        }
+    
+    await asyncio.gather(*(store(index, item) for index, item in enumerate(items)))
+    
+    # Batched inserts; a failed batch falls back to row by row so one bad row doesn't sink the rest
+    inserted = []
+    orphaned = []
+    indexes = sorted(pending)
+    for start in range(0, len(indexes), settings.import_insert_batch_size):
+        batch = indexes[start:start + settings.import_insert_batch_size]
+        try:
+            await execute(supabase.table("documents").insert([pending[i] for i in batch]))
+            succeeded = batch
+        except Exception as e:
+            print(f"Batch insert of {len(batch)} imported documents failed, retrying individually: {e}")
+            succeeded = []
+            for i in batch:
+                try:
+                    await execute(supabase.table("documents").insert(pending[i]))
+                    succeeded.append(i)
+                except Exception as row_error:
+                    report[i].update(status="failed", error=f"Failed to save document record: {row_error}")
+                    orphaned.append((pending[i]["file_path"], pending[i]["content_hash"]))
+        
+        for i in succeeded:
+            report[i].update(status="imported", document_id=pending[i]["id"])
+            inserted.append(pending[i])
+    
+    if orphaned:
+        await release_files(orphaned)
+    
+    results = [report[index] for index in range(len(items))]
+    return {
+        "results": results,
+        "imported": len(inserted),
+        "failed": len(results) - len(inserted),
+        "documents": inserted
+    }
+
+async def schedule_processing(documents: List[dict]):
+    """Queue preview rendering and text extraction for imported documents"""
+    for document in documents:
+        previews.schedule(document["id"], document["file_path"], document["content_hash"], document["format"])
+        await text_indexer.schedule(document["id"], document["file_path"], document["content_hash"], document["format"])
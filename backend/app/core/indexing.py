@@ -0,0 +1,223 @@
+# Background text extraction feeding the search index
+import asyncio
+import multiprocessing
+import uuid
+from typing import Optional, Set
+
+from app.core.config import settings
+from app.core.extraction import ExtractionUnsupported, run_extraction
+from app.core.jobs import jobs
+from app.core.storage import storage
+from app.database import get_supabase, execute
+
+# Spawned processes import only the extraction module, not the app
+_spawn = multiprocessing.get_context("spawn")
+
+REINDEX_PAGE_SIZE = 500
+
+class TextIndexer:
+    """Extracts document text for search through durable background jobs
+    
+    Uploads queue an ``extract_text`` job and return immediately, so pending
+    work survives restarts. Each job parses one file in a process of its own
+    that is killed if it overruns ``time_budget``; failed jobs are retried by
+    the job queue. The extracted text is written to ``documents.content_text``,
+    where the search_vector trigger picks it up, and progress is tracked in
+    ``documents.text_status``.
+    """
+    
+    def __init__(self, time_budget: float, max_chars: int):
+        self.time_budget = time_budget
+        self.max_chars = max_chars
+        self._processes: Set[multiprocessing.Process] = set()
+        self._stopping = False
+        
+        # Metrics
+        self.indexed = 0
+        self.reused = 0
+        self.partial = 0
+        self.unsupported = 0
+        self.failed = 0
+        self.timeouts = 0
+        self.reindex_queued = 0
+    
+    def stop(self):
+        """Kill running extractions; their jobs fail and are retried later"""
+        self._stopping = True
+        for process in list(self._processes):
+            process.kill()
+    
+    async def _enqueue(self, document_id: str, file_path: str, content_hash: Optional[str], file_ext: str,
+                       idempotency_key: Optional[str] = None):
+        await jobs.enqueue("extract_text", {
+            "document_id": document_id,
+            "file_path": file_path,
+            "content_hash": content_hash,
+            "format": file_ext
+        }, idempotency_key=idempotency_key)
+    
+    async def schedule(self, document_id: str, file_path: str, content_hash: Optional[str], file_ext: str):
+        """Queue text extraction for a stored document without failing the caller"""
+        try:
+            await self._enqueue(document_id, file_path, content_hash, file_ext)
+        except Exception as e:
+            # The document keeps text_status 'pending' and is picked up by a reindex
+            print(f"Failed to queue text extraction for document {document_id}: {e}")
+    
+    async def _set_fields(self, document_id: str, fields: dict):
+        supabase = get_supabase()
+        await execute(supabase.table("documents").update(fields).eq("id", document_id))
+    
+    async def _extract(self, file_path: str, file_ext: str):
+        if self._stopping:
+            raise RuntimeError("Text indexer is shutting down")
+        
+        source, is_temporary = await storage.fetch_local_copy(file_path)
+        receiver, sender = _spawn.Pipe(duplex=False)
+        process = _spawn.Process(
+            target=run_extraction,
+            args=(sender, str(source), file_ext, self.max_chars, self.time_budget),
+            daemon=True
+        )
+        
+        try:
+            try:
+                process.start()
+            finally:
+                sender.close()  # The child holds its own end, so a crash shows up as EOF
+            self._processes.add(process)
+            
+            # The parser stops itself at the budget; this only catches a stuck process
+            limit = self.time_budget * 2 + 5
+            if not await asyncio.to_thread(receiver.poll, limit):
+                self.timeouts += 1
+                raise TimeoutError(f"Text extraction did not finish within {limit:.0f}s")
+            try:
+                result = await asyncio.to_thread(receiver.recv)
+            except EOFError:
+                process.join(1)
+                raise RuntimeError(f"Text extraction process died (exit code {process.exitcode})")
+        finally:
+            self._processes.discard(process)
+            if process.is_alive():
+                process.kill()
+            if process.pid is not None:
+                process.join()
+            receiver.close()
+            if is_temporary:
+                source.unlink(missing_ok=True)
+        
+        if isinstance(result, Exception):
+            raise result
+        return result
+    
+    async def process(self, document_id: str, file_path: str, content_hash: Optional[str], file_ext: str):
+        """Extract and store one document's text
+        
+        Raises after marking the document 'failed' when extraction fails for
+        a reason a retry might fix.
+        """
+        supabase = get_supabase()
+        
+        # Identical content indexed before: copy its text instead of parsing again
+        if content_hash:
+            existing = await execute(
+                supabase.table("documents")
+                .select("content_text")
+                .eq("content_hash", content_hash)
+                .eq("text_status", "ready")
+                .limit(1)
+            )
+            if existing.data:
+                await self._set_fields(document_id, {
+                    "content_text": existing.data[0]["content_text"],
+                    "text_status": "ready"
+                })
+                self.reused += 1
+                return
+        
+        await self._set_fields(document_id, {"text_status": "processing"})
+        
+        try:
+            text, complete = await self._extract(file_path, file_ext)
+        except ExtractionUnsupported as e:
+            print(f"No text extracted for document {document_id}: {e}")
+            self.unsupported += 1
+            await self._set_fields(document_id, {"text_status": "unsupported"})
+            return
+        except Exception as e:
+            print(f"Text extraction failed for document {document_id}: {e!r}")
+            self.failed += 1
+            try:
+                await self._set_fields(document_id, {"text_status": "failed"})
+            except Exception:
+                pass
+            raise
+        
+        await self._set_fields(document_id, {"content_text": text, "text_status": "ready"})
+        self.indexed += 1
+        if not complete:
+            self.partial += 1
+    
+    async def reindex(self, only_missing: bool = True) -> bool:
+        """Queue the existing corpus for extraction in the background
+        
+        Returns False if a reindex is already under way.
+        """
+        if await jobs.pending("reindex_text"):
+            return False
+        
+        await jobs.enqueue("reindex_text", {"run": uuid.uuid4().hex, "only_missing": only_missing, "after": None})
+        return True
+    
+    async def reindex_page(self, run: str, only_missing: bool, after: Optional[str]):
+        """Queue one page of documents for extraction, then a job for the next page
+        
+        Keys derived from ``run`` make a repeated page job queue nothing twice.
+        """
+        supabase = get_supabase()
+        query = supabase.table("documents").select("id, file_path, content_hash, format")
+        if only_missing:
+            query = query.in_("text_status", ["pending", "processing", "failed"])
+        if after:
+            query = query.gt("id", after)
+        
+        batch = (await execute(query.order("id").limit(REINDEX_PAGE_SIZE))).data
+        for document in batch:
+            # A full reindex re-parses everything rather than copying earlier text
+            content_hash = document["content_hash"] if only_missing else None
+            await self._enqueue(
+                document["id"], document["file_path"], content_hash, document["format"],
+                idempotency_key=f"reindex:{run}:{document['id']}"
+            )
+        self.reindex_queued += len(batch)
+        
+        if len(batch) == REINDEX_PAGE_SIZE:
+            last_id = batch[-1]["id"]
+            await jobs.enqueue(
+                "reindex_text",
+                {"run": run, "only_missing": only_missing, "after": last_id},
+                idempotency_key=f"reindex:{run}:after:{last_id}"
+            )
+        else:
+            print(f"Reindex {run} finished queueing documents for text extraction")
+    
+    async def stats(self) -> dict:
+        return {
+            "queued": await jobs.pending("extract_text"),
+            "running": len(self._processes),
+            "reindexing": await jobs.pending("reindex_text") > 0,
+            "reindex_queued": self.reindex_queued,
+            "indexed": self.indexed,
+            "reused": self.reused,
+            "partial": self.partial,
+            "unsupported": self.unsupported,
+            "failed": self.failed,
+            "timeouts": self.timeouts
+        }
+
+# Global text indexer
+text_indexer = TextIndexer(
+    time_budget=settings.extraction_time_budget_seconds,
+    max_chars=settings.extraction_max_chars
+)
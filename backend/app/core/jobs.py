@@ -0,0 +1,411 @@
+# Durable background jobs for Sukun Slide
+import asyncio
+import json
+import random
+import socket
+import sqlite3
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+from app.core.config import settings
+
+JOB_STATUSES = ("queued", "running", "done", "dead")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    idempotency_key TEXT UNIQUE,
+    run_at REAL NOT NULL,
+    locked_by TEXT,
+    locked_until REAL,
+    last_error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status_run_at ON jobs (status, run_at);
+"""
+
+Handler = Callable[[dict], Awaitable[Any]]
+
+class JobHandler:
+    def __init__(self, func: Handler, concurrency: Optional[int], max_attempts: Optional[int]):
+        self.func = func
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+
+# Job kind -> handler, filled in by @job_handler
+handlers: Dict[str, JobHandler] = {}
+
+def job_handler(kind: str, concurrency: Optional[int] = None, max_attempts: Optional[int] = None):
+    """Register an async function as the handler for a job kind
+    
+    ``concurrency`` caps how many jobs of this kind one worker runs at once.
+    Handlers may run more than once for the same job (after a crash or a
+    retry), so they must be safe to repeat.
+    """
+    def register(func: Handler) -> Handler:
+        handlers[kind] = JobHandler(func, concurrency, max_attempts)
+        return func
+    return register
+
+class JobQueue:
+    """SQLite-backed job queue shared by the API and worker processes
+    
+    Jobs survive restarts. A worker claims a job by leasing it for
+    ``lease_seconds``; a job whose worker died is claimed again once the
+    lease runs out. Failed jobs are retried with exponential backoff and
+    dead-lettered after their last attempt. An idempotency key makes
+    enqueueing the same work twice a no-op while the first job is retained.
+    """
+    
+    def __init__(self, path: str, lease_seconds: float, retry_base: float, retry_max: float, max_attempts: int, retention_hours: float):
+        self.path = Path(path)
+        self.lease_seconds = lease_seconds
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.max_attempts = max_attempts
+        self.retention_hours = retention_hours
+        self._connection: Optional[sqlite3.Connection] = None
+        self._listeners: List[Callable[[], None]] = []
+        # One thread per process serialises access to the connection;
+        # WAL mode and the busy timeout handle other processes
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="jobs")
+    
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            connection = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False, timeout=30)
+            connection.row_factory = sqlite3.Row
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(SCHEMA)
+            self._connection = connection
+        return self._connection
+    
+    async def _run(self, func: Callable[..., Any], *args: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+    
+    def _enqueue(self, kind: str, payload: dict, idempotency_key: Optional[str], max_attempts: int, delay: float) -> int:
+        connection = self._connect()
+        now = time.time()
+        cursor = connection.execute(
+            "INSERT INTO jobs (kind, payload, max_attempts, idempotency_key, run_at, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT (idempotency_key) DO NOTHING",
+            (kind, json.dumps(payload, default=str), max_attempts, idempotency_key, now + delay, now, now)
+        )
+        if cursor.rowcount:
+            return cursor.lastrowid
+        
+        row = connection.execute("SELECT id FROM jobs WHERE idempotency_key = ?", (idempotency_key,)).fetchone()
+        return row["id"]
+    
+    async def enqueue(
+        self,
+        kind: str,
+        payload: dict,
+        idempotency_key: Optional[str] = None,
+        max_attempts: Optional[int] = None,
+        delay: float = 0
+    ) -> int:
+        """Persist a job and return its id (the existing job's id for a repeated key)"""
+        if kind not in handlers:
+            raise ValueError(f"No handler registered for job kind '{kind}'")
+        
+        attempts = max_attempts or handlers[kind].max_attempts or self.max_attempts
+        job_id = await self._run(self._enqueue, kind, payload, idempotency_key, attempts, delay)
+        
+        for listener in self._listeners:
+            listener()
+        return job_id
+    
+    def add_listener(self, listener: Callable[[], None]):
+        """Call ``listener`` whenever this process enqueues a job"""
+        self._listeners.append(listener)
+    
+    def _claim(self, worker_id: str, limit: int, exclude_kinds: List[str]) -> List[dict]:
+        now = time.time()
+        placeholders = ",".join("?" * len(exclude_kinds))
+        rows = self._connect().execute(
+            f"""
+            UPDATE jobs SET status = 'running', attempts = attempts + 1, locked_by = ?, locked_until = ?, updated_at = ?
+            WHERE id IN (
+                SELECT id FROM jobs
+                WHERE ((status = 'queued' AND run_at <= ?) OR (status = 'running' AND locked_until < ?))
+                  AND kind NOT IN ({placeholders})
+                ORDER BY run_at, id
+                LIMIT ?
+            )
+            RETURNING id, kind, payload, attempts, max_attempts
+            """,
+            (worker_id, now + self.lease_seconds, now, now, now, *exclude_kinds, limit)
+        ).fetchall()
+        return [dict(row, payload=json.loads(row["payload"])) for row in rows]
+    
+    async def claim(self, worker_id: str, limit: int, exclude_kinds: List[str] = ()) -> List[dict]:
+        """Lease up to ``limit`` due jobs, skipping kinds at their concurrency limit"""
+        return await self._run(self._claim, worker_id, limit, list(exclude_kinds))
+    
+    def _release(self, job_id: int, worker_id: str):
+        self._connect().execute(
+            "UPDATE jobs SET status = 'queued', attempts = attempts - 1, locked_by = NULL, locked_until = NULL "
+            "WHERE id = ? AND locked_by = ?",
+            (job_id, worker_id)
+        )
+    
+    async def release(self, job: dict, worker_id: str):
+        """Hand a claimed job back untouched, without using up an attempt"""
+        await self._run(self._release, job["id"], worker_id)
+    
+    def _complete(self, job_id: int, worker_id: str):
+        self._connect().execute(
+            "UPDATE jobs SET status = 'done', locked_by = NULL, locked_until = NULL, last_error = NULL, updated_at = ? "
+            "WHERE id = ? AND locked_by = ?",
+            (time.time(), job_id, worker_id)
+        )
+    
+    async def complete(self, job: dict, worker_id: str):
+        await self._run(self._complete, job["id"], worker_id)
+    
+    def _fail(self, job: dict, worker_id: str, error: str) -> str:
+        now = time.time()
+        if job["attempts"] >= job["max_attempts"]:
+            status, run_at = "dead", now
+        else:
+            # Exponential backoff with jitter so retries of a burst spread out
+            backoff = min(self.retry_base * 2 ** (job["attempts"] - 1), self.retry_max)
+            status, run_at = "queued", now + backoff * random.uniform(1.0, 1.2)
+        
+        self._connect().execute(
+            "UPDATE jobs SET status = ?, run_at = ?, last_error = ?, locked_by = NULL, locked_until = NULL, updated_at = ? "
+            "WHERE id = ? AND locked_by = ?",
+            (status, run_at, error[:2000], now, job["id"], worker_id)
+        )
+        return status
+    
+    async def fail(self, job: dict, worker_id: str, error: str) -> str:
+        """Schedule a retry, or dead-letter the job after its last attempt"""
+        return await self._run(self._fail, job, worker_id, error)
+    
+    def _retry(self, job_id: int) -> bool:
+        now = time.time()
+        cursor = self._connect().execute(
+            "UPDATE jobs SET status = 'queued', attempts = 0, run_at = ?, updated_at = ? WHERE id = ? AND status = 'dead'",
+            (now, now, job_id)
+        )
+        return cursor.rowcount > 0
+    
+    async def retry(self, job_id: int) -> bool:
+        """Put a dead-lettered job back on the queue with fresh attempts"""
+        return await self._run(self._retry, job_id)
+    
+    def _pending(self, kind: str) -> int:
+        row = self._connect().execute(
+            "SELECT count(*) AS n FROM jobs WHERE kind = ? AND status IN ('queued', 'running')", (kind,)
+        ).fetchone()
+        return row["n"]
+    
+    async def pending(self, kind: str) -> int:
+        """Number of jobs of a kind waiting to run or running"""
+        return await self._run(self._pending, kind)
+    
+    def _purge(self) -> int:
+        cutoff = time.time() - self.retention_hours * 3600
+        cursor = self._connect().execute("DELETE FROM jobs WHERE status = 'done' AND updated_at < ?", (cutoff,))
+        return cursor.rowcount
+    
+    async def purge(self) -> int:
+        """Delete finished jobs past the retention window (dead letters are kept)"""
+        return await self._run(self._purge)
+    
+    def _stats(self, dead_limit: int) -> dict:
+        connection = self._connect()
+        now = time.time()
+        
+        depth = {status: 0 for status in JOB_STATUSES}
+        by_kind: Dict[str, Dict[str, int]] = {}
+        for row in connection.execute("SELECT kind, status, count(*) AS n FROM jobs GROUP BY kind, status"):
+            depth[row["status"]] += row["n"]
+            by_kind.setdefault(row["kind"], {})[row["status"]] = row["n"]
+        
+        oldest = connection.execute("SELECT min(run_at) AS run_at FROM jobs WHERE status = 'queued' AND run_at <= ?", (now,)).fetchone()
+        dead = connection.execute(
+            "SELECT id, kind, payload, attempts, last_error, updated_at FROM jobs WHERE status = 'dead' "
+            "ORDER BY updated_at DESC LIMIT ?",
+            (dead_limit,)
+        ).fetchall()
+        
+        return {
+            "depth": depth,
+            "by_kind": by_kind,
+            "oldest_ready_seconds": round(now - oldest["run_at"], 1) if oldest["run_at"] else 0.0,
+            "dead_letters": [dict(row, payload=json.loads(row["payload"])) for row in dead]
+        }
+    
+    async def stats(self, dead_limit: int = 20) -> dict:
+        """Queue depth per status and kind, and the latest dead letters"""
+        return await self._run(self._stats, dead_limit)
+    
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+class JobWorker:
+    """Polls the queue and runs jobs with bounded concurrency"""
+    
+    def __init__(self, queue: JobQueue, concurrency: int, poll_interval: float, timeout: float):
+        self.queue = queue
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.worker_id = f"{socket.gethostname()}:{uuid.uuid4().hex[:8]}"
+        self._running: Dict[str, int] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._loop_task: Optional[asyncio.Task] = None
+        self._stopping = False
+        
+        # Metrics
+        self.succeeded = 0
+        self.retried = 0
+        self.dead = 0
+    
+    def start(self):
+        """Start polling in the background"""
+        if self._loop_task is None:
+            self._stopping = False
+            self._wakeup = asyncio.Event()
+            self.queue.add_listener(self.notify)
+            self._loop_task = asyncio.create_task(self.run())
+    
+    def notify(self):
+        """Poll now instead of waiting out the interval (after an enqueue)"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+    
+    async def stop(self):
+        """Stop claiming jobs and let the running ones finish"""
+        self._stopping = True
+        self.notify()
+        if self._loop_task is not None:
+            await self._loop_task
+            self._loop_task = None
+    
+    def _saturated_kinds(self) -> List[str]:
+        return [
+            kind for kind, handler in handlers.items()
+            if handler.concurrency and self._running.get(kind, 0) >= handler.concurrency
+        ]
+    
+    async def run(self):
+        """Claim and run jobs until stopped, then drain the ones in flight"""
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        last_purge = 0.0
+        
+        while not self._stopping:
+            free = self.concurrency - len(self._tasks)
+            jobs = []
+            if free > 0:
+                try:
+                    jobs = await self.queue.claim(self.worker_id, free, self._saturated_kinds())
+                except Exception as e:
+                    print(f"Failed to claim jobs: {e}")
+            
+            saturated = set()
+            for job in jobs:
+                handler = handlers.get(job["kind"])
+                if job["kind"] in saturated or (handler and handler.concurrency and self._running.get(job["kind"], 0) >= handler.concurrency):
+                    # One claim can return more jobs of a kind than its limit allows
+                    saturated.add(job["kind"])
+                    await self.queue.release(job, self.worker_id)
+                    continue
+                
+                self._running[job["kind"]] = self._running.get(job["kind"], 0) + 1
+                task = asyncio.create_task(self._execute(job))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+            
+            if time.monotonic() - last_purge > 3600:
+                last_purge = time.monotonic()
+                try:
+                    await self.queue.purge()
+                except Exception as e:
+                    print(f"Failed to purge finished jobs: {e}")
+            
+            # A full batch means more work is probably waiting
+            if not jobs or len(self._tasks) >= self.concurrency:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+        
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+    
+    async def _execute(self, job: dict):
+        try:
+            handler = handlers.get(job["kind"])
+            if handler is None:
+                raise LookupError(f"No handler registered for job kind '{job['kind']}'")
+            
+            await asyncio.wait_for(handler.func(job["payload"]), self.timeout)
+            await self.queue.complete(job, self.worker_id)
+            self.succeeded += 1
+        
+        except Exception as e:
+            error = f"{type(e).__name__}: {getattr(e, 'detail', None) or e}"
+            try:
+                status = await self.queue.fail(job, self.worker_id, error)
+            except Exception as queue_error:
+                print(f"Failed to record failure of job {job['id']}: {queue_error}")
+                return
+            
+            if status == "dead":
+                self.dead += 1
+                print(f"Job {job['id']} ({job['kind']}) dead-lettered after {job['attempts']} attempts: {error}")
+            else:
+                self.retried += 1
+        finally:
+            self._running[job["kind"]] -= 1
+            self.notify()  # A slot is free
+    
+    def stats(self) -> dict:
+        return {
+            "worker_id": self.worker_id,
+            "running": self._loop_task is not None and not self._loop_task.done(),
+            "concurrency": self.concurrency,
+            "in_flight": dict(self._running),
+            "succeeded": self.succeeded,
+            "retried": self.retried,
+            "dead": self.dead
+        }
+
+# Global job queue
+jobs = JobQueue(
+    path=settings.job_db_path,
+    lease_seconds=settings.job_lease_seconds,
+    retry_base=settings.job_retry_base_seconds,
+    retry_max=settings.job_retry_max_seconds,
+    max_attempts=settings.job_max_attempts,
+    retention_hours=settings.job_retention_hours
+)
+
+# Worker for this process; the API runs it when JOB_WORKER_IN_APP is set,
+# otherwise it runs in `python -m app.worker`
+job_worker = JobWorker(
+    jobs,
+    concurrency=settings.job_concurrency,
+    poll_interval=settings.job_poll_interval_seconds,
+    timeout=settings.job_timeout_seconds
+)
@@ -0,0 +1,240 @@
+# Metrics for Sukun Slide
+#
+# A small in-process registry exposed in the Prometheus text format at
+# /metrics. Each worker process keeps its own numbers, so scrape every
+# process (or run one worker per instance). Recording is a dict lookup and
+# a few additions under a lock, cheap enough for every request and query.
+import bisect
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from app.core.config import settings
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+TRANSFER_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(names: Sequence[str], values: Sequence[str], le: Optional[str] = None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if le is not None:
+        pairs.append(f'le="{le}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+class Metric:
+    """A named family of samples, one per combination of label values"""
+    
+    type = ""
+    
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values: Dict[Tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+    
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        return tuple([str(labels[name]) for name in self.labels]) if self.labels else ()
+    
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        with self._lock:
+            values = list(self._values.items())
+        for key, value in sorted(values):
+            lines.append(f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}")
+        return lines
+
+class Counter(Metric):
+    type = "counter"
+    
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+class Gauge(Metric):
+    type = "gauge"
+    
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+    
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+    
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+class Histogram(Metric):
+    type = "histogram"
+    
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+    
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                # Per-bucket counts (the last one is +Inf), then the sum
+                entry = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            entry[index] += 1
+            entry[-1] += value
+    
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        with self._lock:
+            values = [(key, list(entry)) for key, entry in self._values.items()]
+        for key, entry in sorted(values):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), entry):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {_format_value(entry[-1])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {cumulative}")
+        return lines
+
+class MetricsRegistry:
+    """Holds every metric and renders them for a scrape
+    
+    Caches are registered by name and read at scrape time, so their hit
+    ratios cost nothing between scrapes.
+    """
+    
+    def __init__(self):
+        self._metrics: List[Metric] = []
+        self._caches: Dict[str, Any] = {}
+    
+    def counter(self, name: str, documentation: str, labels: Sequence[str] = ()) -> Counter:
+        return self._add(Counter(name, documentation, labels))
+    
+    def gauge(self, name: str, documentation: str, labels: Sequence[str] = ()) -> Gauge:
+        return self._add(Gauge(name, documentation, labels))
+    
+    def histogram(self, name: str, documentation: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, documentation, labels, buckets))
+    
+    def _add(self, metric: Metric) -> Any:
+        self._metrics.append(metric)
+        return metric
+    
+    def register_cache(self, name: str, cache: Any):
+        """Report a cache's hits, misses and hit ratio; ``cache.stats()`` must return them"""
+        self._caches[name] = cache
+    
+    def _cache_lines(self) -> List[str]:
+        hits = Counter("sukun_cache_hits_total", "Cache lookups that found an entry", ["cache"])
+        misses = Counter("sukun_cache_misses_total", "Cache lookups that found nothing", ["cache"])
+        hit_ratio = Gauge("sukun_cache_hit_ratio", "Share of cache lookups that hit", ["cache"])
+        for name, cache in self._caches.items():
+            stats = cache.stats()
+            hits.inc(stats.get("hits", 0), cache=name)
+            misses.inc(stats.get("misses", 0), cache=name)
+            hit_ratio.set(stats.get("hit_ratio", 0.0), cache=name)
+        return hits.render() + misses.render() + hit_ratio.render()
+    
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        lines.extend(self._cache_lines())
+        return "\n".join(lines) + "\n"
+
+# Global registry and the metrics the app records
+metrics = MetricsRegistry()
+
+http_requests_in_flight = metrics.gauge("sukun_http_requests_in_flight", "HTTP requests being handled")
+http_request_duration = metrics.histogram(
+    "sukun_http_request_duration_seconds", "HTTP request latency by route template", ["method", "route", "status"]
+)
+db_queries_in_flight = metrics.gauge("sukun_db_queries_in_flight", "Supabase queries waiting for a response")
+db_query_duration = metrics.histogram(
+    "sukun_db_query_duration_seconds", "Supabase query latency", ["table", "operation", "outcome"]
+)
+direct_db_query_duration = metrics.histogram(
+    "sukun_direct_db_query_duration_seconds", "Latency of queries sent over the direct Postgres pool", ["query", "outcome"]
+)
+storage_operations_in_flight = metrics.gauge("sukun_storage_operations_in_flight", "Storage operations in progress")
+storage_operation_duration = metrics.histogram(
+    "sukun_storage_operation_duration_seconds", "Storage operation latency", ["backend", "bucket", "operation", "outcome"],
+    buckets=TRANSFER_BUCKETS
+)
+rate_limited_requests = metrics.counter("sukun_rate_limited_requests_total", "Requests refused with 429, by limit and key scope", ["limit", "scope"])
+upload_bytes = metrics.counter("sukun_upload_bytes_total", "Document bytes received, by upload method", ["method"])
+
+_OPERATIONS = {"GET": "select", "HEAD": "count", "POST": "insert", "PATCH": "update", "DELETE": "delete"}
+
+def query_labels(query: Any) -> Tuple[str, str]:
+    """Table (or rpc/<function>) and operation of a PostgREST query builder"""
+    path = getattr(query, "path", "").strip("/") or "unknown"
+    if path.startswith("rpc/"):
+        return path, "rpc"
+    return path, _OPERATIONS.get(str(getattr(query, "http_method", "")).upper(), "other")
+
+class MetricsMiddleware:
+    """Records latency per route template and the number of requests in flight
+    
+    A plain ASGI middleware: it only wraps ``send`` to see the status code,
+    and reads the matched endpoint the router leaves in the scope.
+    """
+    
+    def __init__(self, app: Callable, routes: Sequence[Any]):
+        self.app = app
+        self.routes = routes
+        self._templates: Dict[Any, str] = {}
+    
+    def _template(self, endpoint: Any) -> str:
+        if endpoint is None:
+            return "unmatched"  # 404s stay one series instead of one per probed URL
+        template = self._templates.get(endpoint)
+        if template is None:
+            # Built on first use, once every router has been included
+            for route in self.routes:
+                if hasattr(route, "endpoint"):
+                    self._templates.setdefault(route.endpoint, route.path)
+                elif hasattr(route, "app"):
+                    self._templates.setdefault(route.app, route.path + "/{path}")
+            template = self._templates.setdefault(endpoint, "unmatched")
+        return template
+    
+    async def __call__(self, scope: dict, receive: Callable, send: Callable):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        status = 500
+        
+        async def send_with_status(message: dict):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+        
+        http_requests_in_flight.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            http_requests_in_flight.dec()
+            http_request_duration.observe(
+                time.perf_counter() - started,
+                method=scope["method"],
+                route=self._template(scope.get("endpoint")),
+                status=status
+            )
+
+def authorized(authorization: Optional[str]) -> bool:
+    """Whether a scrape may read /metrics (always, unless METRICS_TOKEN is set)"""
+    return not settings.metrics_token or authorization == f"Bearer {settings.metrics_token}"
@@ -0,0 +1,94 @@
+# Keyset pagination and field projection for list endpoints
+import base64
+import binascii
+import json
+import uuid
+from datetime import datetime
+from typing import Iterable, List, Optional, Tuple
+
+from fastapi import HTTPException, Query
+
+from app.core.config import settings
+
+# Columns list views may ask for with ``fields=``
+DOCUMENT_FIELDS = (
+    "id", "title", "description", "subject_id", "format", "file_path", "file_size",
+    "content_hash", "author", "tags", "download_count", "status", "uploaded_by",
+    "preview_status", "text_status", "created_at", "updated_at"
+)
+USER_FIELDS = ("id", "email", "first_name", "last_name", "university", "role", "status", "created_at")
+
+class PageParams:
+    """Common ``cursor`` / ``limit`` / ``fields`` query parameters"""
+    
+    def __init__(
+        self,
+        cursor: Optional[str] = Query(None, description="Opaque cursor from the previous page's next_cursor"),
+        limit: int = Query(settings.default_page_size, ge=1, le=settings.max_page_size),
+        fields: Optional[str] = Query(None, description="Comma-separated columns to return")
+    ):
+        self.cursor = cursor
+        self.limit = limit
+        self.fields = fields
+
+def encode_cursor(row: dict, sort_column: str = "created_at") -> str:
+    """Cursor pointing just past ``row`` in (sort_column, id) order"""
+    raw = json.dumps([row[sort_column], row["id"]], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    """Return the (sort value, id) a cursor points at"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        value, row_id = json.loads(base64.urlsafe_b64decode(padded))
+        datetime.fromisoformat(value)  # Sort columns are timestamps
+        return value, str(uuid.UUID(row_id))
+    except (binascii.Error, UnicodeDecodeError, TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def select_fields(
+    fields: Optional[str],
+    allowed: Iterable[str],
+    required: Iterable[str] = ("id", "created_at")
+) -> str:
+    """Build a select list from ``fields=``, defaulting to every allowed column
+    
+    The key columns are always included so the next cursor can be built.
+    """
+    allowed = list(allowed)
+    if not fields:
+        return ", ".join(allowed)
+    
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in requested if f not in allowed]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    
+    columns = list(required)
+    columns += [f for f in requested if f not in columns]
+    return ", ".join(columns)
+
+def keyset(query, params: PageParams, sort_column: str = "created_at"):
+    """Apply newest-first (sort_column, id) ordering, the cursor and the page limit
+    
+    Fetches one row more than the page size to tell whether a next page exists.
+    """
+    if params.cursor:
+        value, row_id = decode_cursor(params.cursor)
+        # (sort_column, id) < (value, row_id); postgrest-py 0.13 has no or_(),
+        # so the logic tree is added as a raw ``or`` parameter
+        query.params = query.params.add(
+            "or",
+            f'({sort_column}.lt."{value}",and({sort_column}.eq."{value}",id.lt.{row_id}))'
+        )
+    
+    # PostgREST takes one comma-separated order list; desc applies to the last column
+    return query.order(f"{sort_column}.desc,id", desc=True).limit(params.limit + 1)
+
+def page(rows: List[dict], params: PageParams, sort_column: str = "created_at") -> Tuple[List[dict], Optional[str]]:
+    """Trim the lookahead row and build the next cursor"""
+    if len(rows) <= params.limit:
+        return rows, None
+    
+    rows = rows[:params.limit]
+    return rows, encode_cursor(rows[-1], sort_column)
@@ -0,0 +1,102 @@
+# Password hashing for Sukun Slide
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from fastapi import HTTPException
+from passlib.context import CryptContext
+
+from app.core.config import settings
+
+class PasswordHasher:
+    """Runs bcrypt in a small dedicated thread pool, off the event loop
+    
+    Each hash or verify costs a few hundred milliseconds of CPU. bcrypt
+    releases the GIL while it works, so the pool's threads don't stall
+    request handling. At most ``max_pending`` operations may be running or
+    waiting; past that callers get a 503 straight away instead of queueing
+    behind a backlog that would time out anyway.
+    
+    Hashes made with a different work factor than ``rounds`` are flagged by
+    ``verify_and_update`` so they can be re-hashed at login.
+    """
+    
+    def __init__(self, workers: int, max_pending: int, rounds: int):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.context = CryptContext(
+            schemes=["bcrypt"],
+            deprecated="auto",
+            bcrypt__default_rounds=rounds,
+            bcrypt__min_desired_rounds=rounds,
+            bcrypt__max_desired_rounds=rounds
+        )
+        self._executor: Optional[ThreadPoolExecutor] = None
+        
+        # Metrics
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.rehashed = 0
+    
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="password-hash")
+        return self._executor
+    
+    async def _run(self, func: Callable[..., Any], *args: Any) -> Any:
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=503,
+                detail="Too many sign-in attempts right now, please try again shortly",
+                headers={"Retry-After": "1"}
+            )
+        
+        self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(self.executor, functools.partial(func, *args))
+            self.completed += 1
+            return result
+        finally:
+            self.pending -= 1
+    
+    async def hash(self, password: str) -> str:
+        """Hash a password with the configured work factor"""
+        return await self._run(self.context.hash, password)
+    
+    async def verify(self, password: str, hashed_password: str) -> bool:
+        """Verify a password against its hash"""
+        return await self._run(self.context.verify, password, hashed_password)
+    
+    async def verify_and_update(self, password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """Verify a password; on success also return a new hash if the stored one is outdated"""
+        valid, new_hash = await self._run(self.context.verify_and_update, password, hashed_password)
+        if new_hash:
+            self.rehashed += 1
+        return valid, new_hash
+    
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "pending": self.pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "rehashed": self.rehashed
+        }
+
+# Global password hasher instance
+password_hasher = PasswordHasher(
+    workers=settings.password_hash_workers,
+    max_pending=settings.password_hash_max_pending,
+    rounds=settings.bcrypt_rounds
+)
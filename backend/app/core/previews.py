@@ -0,0 +1,129 @@
+# Background preview generation for Sukun Slide
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Set
+
+from app.core.config import settings
+from app.core.storage import storage
+from app.core.thumbnails import PREVIEW_SIZES, PreviewUnsupported, render_previews
+from app.database import get_supabase, execute
+
+class PreviewGenerator:
+    """Renders document previews in a process pool after upload
+    
+    Rendering is CPU-bound, so it runs in separate processes and never holds
+    up request handling. Progress is recorded in ``documents.preview_status``
+    (pending -> processing -> ready / unsupported / failed); catalog
+    responses pick up the change when their cache entries expire.
+    """
+    
+    def __init__(self, workers: int):
+        self.workers = workers
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._tasks: Set[asyncio.Task] = set()
+        
+        # Metrics
+        self.generated = 0
+        self.reused = 0
+        self.unsupported = 0
+        self.failed = 0
+    
+    @property
+    def pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # Spawned workers import only the rendering module, not the app
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._pool
+    
+    def schedule(self, document_id: str, file_path: str, content_hash: Optional[str], file_ext: str):
+        """Queue preview generation for a freshly stored document"""
+        if not content_hash:
+            return  # Previews are keyed by content hash
+        
+        task = asyncio.create_task(self.generate(document_id, file_path, content_hash, file_ext))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+    
+    async def _set_status(self, document_id: str, status: str):
+        supabase = get_supabase()
+        await execute(supabase.table("documents").update({"preview_status": status}).eq("id", document_id))
+    
+    async def generate(self, document_id: str, file_path: str, content_hash: str, file_ext: str):
+        # Bulk imports schedule hundreds at once; only fetch as many files as can be rendered
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.workers)
+        async with self._slots:
+            await self._generate(document_id, file_path, content_hash, file_ext)
+    
+    async def _generate(self, document_id: str, file_path: str, content_hash: str, file_ext: str):
+        supabase = get_supabase()
+        
+        try:
+            # Identical content uploaded before already has previews
+            existing = await execute(
+                supabase.table("documents")
+                .select("id")
+                .eq("content_hash", content_hash)
+                .eq("preview_status", "ready")
+                .limit(1)
+            )
+            if existing.data:
+                await self._set_status(document_id, "ready")
+                self.reused += 1
+                return
+            
+            await self._set_status(document_id, "processing")
+            
+            source, is_temporary = await storage.fetch_local_copy(file_path)
+            try:
+                loop = asyncio.get_running_loop()
+                previews = await loop.run_in_executor(self.pool, render_previews, str(source), file_ext)
+            finally:
+                if is_temporary:
+                    source.unlink(missing_ok=True)
+            
+            # Store previews alongside the blob they were rendered from
+            for size, data in previews.items():
+                await storage.save_preview(data, content_hash, size, file_path)
+            
+            await self._set_status(document_id, "ready")
+            self.generated += 1
+        
+        except PreviewUnsupported as e:
+            print(f"No preview for document {document_id}: {e}")
+            self.unsupported += 1
+            await self._set_status(document_id, "unsupported")
+        except Exception as e:
+            print(f"Preview generation failed for document {document_id}: {e}")
+            self.failed += 1
+            try:
+                await self._set_status(document_id, "failed")
+            except Exception:
+                pass
+    
+    async def shutdown(self):
+        """Let in-flight previews finish, then stop the worker processes"""
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+    
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._tasks),
+            "workers": self.workers,
+            "sizes": PREVIEW_SIZES,
+            "generated": self.generated,
+            "reused": self.reused,
+            "unsupported": self.unsupported,
+            "failed": self.failed
+        }
+
+# Global preview generator
+previews = PreviewGenerator(workers=settings.preview_workers)
@@ -0,0 +1,229 @@
+# Token-bucket rate limiting for Sukun Slide
+#
+# Each limit is a bucket per user or per client IP holding up to N tokens
+# and refilling evenly over its period: a burst of N requests passes, then
+# requests are admitted at the sustained rate and the rest get 429 with
+# Retry-After. A request takes a token from each of its buckets (per user and
+# per IP) only if all of them have one, so a refused request costs nothing.
+# A bucket is two numbers, and one that has refilled is the
+# same as one that doesn't exist, so idle keys are dropped for free. Buckets
+# live in Redis when REDIS_URL is set (shared by every worker) and in this
+# process otherwise. Client IPs come from request.client, which uvicorn
+# fills from X-Forwarded-For for trusted proxies (--forwarded-allow-ips).
+import math
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from fastapi import HTTPException, Request
+
+from app.core.cache import get_redis_client
+from app.core.config import settings
+from app.core.metrics import rate_limited_requests
+
+SCOPES = ("user", "ip")
+PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+
+class Limit(NamedTuple):
+    scope: str
+    capacity: int
+    rate: float  # Tokens per second
+
+Bucket = Tuple[str, int, float]  # (key, capacity, rate)
+
+def parse_limits(spec: str) -> List[Limit]:
+    """Parse ``"user:60/minute,ip:120/minute"``; an empty spec means no limits"""
+    limits = []
+    for part in filter(None, (part.strip() for part in spec.split(","))):
+        try:
+            scope, allowance = part.split(":")
+            requests, period = allowance.split("/")
+            limit = Limit(scope, int(requests), int(requests) / PERIODS[period])
+        except (KeyError, ValueError):
+            limit = None
+        if limit is None or limit.scope not in SCOPES or limit.capacity < 1:
+            raise ValueError(f"Invalid rate limit '{part}' (expected e.g. 'ip:10/minute')")
+        limits.append(limit)
+    return limits
+
+class MemoryRateLimitBackend:
+    """Token buckets for this process, in least-recently-used order
+    
+    Every operation is O(1). Buckets that have refilled are dropped as they
+    reach the old end; past ``max_keys`` the least recently used go too.
+    """
+    
+    def __init__(self, max_keys: int):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (tokens, updated, full_at)
+        self.evicted = 0
+    
+    async def take(self, buckets: List[Bucket]) -> List[float]:
+        """Take a token from every bucket, or from none if any is empty
+        
+        Returns each bucket's wait: 0 if it has a token, else seconds until it does.
+        """
+        now = time.monotonic()
+        levels = []
+        for key, capacity, rate in buckets:
+            bucket = self._buckets.pop(key, None)
+            levels.append(capacity if bucket is None else min(capacity, bucket[0] + (now - bucket[1]) * rate))
+        
+        waits = [0.0 if tokens >= 1 else (1 - tokens) / rate for tokens, (_, _, rate) in zip(levels, buckets)]
+        cost = 0 if any(waits) else 1
+        for tokens, (key, capacity, rate) in zip(levels, buckets):
+            tokens -= cost
+            self._buckets[key] = (tokens, now, now + (capacity - tokens) / rate)
+        self._evict(now)
+        return waits
+    
+    def _evict(self, now: float):
+        while self._buckets:
+            key, (_, _, full_at) = next(iter(self._buckets.items()))
+            if full_at > now and len(self._buckets) <= self.max_keys:
+                return
+            del self._buckets[key]
+            if full_at > now:
+                self.evicted += 1  # Dropped before it refilled, so its client got a fresh bucket
+    
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": "memory", "keys": len(self._buckets), "max_keys": self.max_keys, "evicted": self.evicted}
+
+class RedisRateLimitBackend:
+    """Token buckets in Redis, shared by every worker
+    
+    One Lua script refills a request's buckets and takes from them
+    atomically on Redis's clock, and expires each key once its bucket would
+    be full again. The
+    client only needs async ``eval``, so a local stand-in such as fakeredis
+    (with Lua support) can replace Redis in tests.
+    """
+    
+    SCRIPT = """
+    local clock = redis.call('TIME')
+    local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+    local levels, waits, cost = {}, {}, 1
+    for i, key in ipairs(KEYS) do
+        local capacity = tonumber(ARGV[2 * i - 1])
+        local rate = tonumber(ARGV[2 * i])
+        local bucket = redis.call('HMGET', key, 'tokens', 'updated')
+        local tokens = capacity
+        if bucket[1] then
+            tokens = math.min(capacity, tonumber(bucket[1]) + math.max(0, now - tonumber(bucket[2])) * rate)
+        end
+        levels[i] = tokens
+        waits[i] = 0
+        if tokens < 1 then
+            waits[i] = (1 - tokens) / rate
+            cost = 0
+        end
+    end
+    for i, key in ipairs(KEYS) do
+        local capacity = tonumber(ARGV[2 * i - 1])
+        local rate = tonumber(ARGV[2 * i])
+        local tokens = levels[i] - cost
+        redis.call('HSET', key, 'tokens', tokens, 'updated', now)
+        redis.call('PEXPIRE', key, math.ceil((capacity - tokens) / rate * 1000))
+        waits[i] = tostring(waits[i])
+    end
+    return waits
+    """
+    
+    def __init__(self, client: Any):
+        self.client = client
+    
+    async def take(self, buckets: List[Bucket]) -> List[float]:
+        """Take a token from every bucket, or from none if any is empty
+        
+        Returns each bucket's wait: 0 if it has a token, else seconds until it does.
+        """
+        keys = [f"sukun:ratelimit:{key}" for key, _, _ in buckets]
+        limits = [value for _, capacity, rate in buckets for value in (capacity, rate)]
+        waits = await self.client.eval(self.SCRIPT, len(keys), *keys, *limits)
+        return [float(wait) for wait in waits]
+    
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": "redis"}
+
+class RateLimiter:
+    """The token-bucket limits of one group of routes
+    
+    Works as a route dependency for per-IP limits; routes with per-user
+    limits call ``check`` with the signed-in user instead.
+    """
+    
+    def __init__(self, name: str, spec: str, backend: Any):
+        self.name = name
+        self.limits = parse_limits(spec)
+        self.backend = backend
+        
+        # Metrics
+        self.allowed = 0
+        self.limited = 0
+        self.errors = 0
+    
+    async def check(self, request: Request, user_id: Optional[str] = None):
+        """Charge the request to its buckets; 429 with Retry-After if any is empty
+        
+        A refused request is charged to none of them.
+        """
+        buckets, scopes = [], []
+        for limit in self.limits:
+            identity = user_id if limit.scope == "user" else (request.client.host if request.client else None)
+            if identity:
+                buckets.append((f"{self.name}:{limit.scope}:{identity}", limit.capacity, limit.rate))
+                scopes.append(limit.scope)
+        
+        waits = []
+        if buckets:
+            try:
+                waits = await self.backend.take(buckets)
+            except Exception as e:
+                # Fail open: losing the limiter shouldn't take these routes down with it
+                self.errors += 1
+                print(f"Rate limit check for '{self.name}' failed: {e}")
+        
+        for scope, wait in zip(scopes, waits):
+            if wait > 0:
+                rate_limited_requests.inc(limit=self.name, scope=scope)
+        
+        retry_after = max(waits, default=0)
+        if retry_after:
+            self.limited += 1
+            raise HTTPException(
+                status_code=429,
+                detail="Too many requests, please try again later",
+                headers={"Retry-After": str(math.ceil(retry_after))}
+            )
+        self.allowed += 1
+    
+    async def __call__(self, request: Request):
+        await self.check(request)
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "limits": [f"{limit.scope}:{limit.capacity} per {limit.capacity / limit.rate:g}s" for limit in self.limits],
+            "allowed": self.allowed,
+            "limited": self.limited,
+            "errors": self.errors
+        }
+
+_memory_backend = MemoryRateLimitBackend(settings.rate_limit_max_keys)
+
+def create_rate_limiter(name: str, spec: str) -> RateLimiter:
+    """Create a limiter on Redis when REDIS_URL is set, otherwise in-process"""
+    client = get_redis_client()
+    backend = RedisRateLimitBackend(client) if client is not None else _memory_backend
+    return RateLimiter(name, spec, backend)
+
+# Global rate limiters
+login_limit = create_rate_limiter("login", settings.rate_limit_login)
+upload_limit = create_rate_limiter("upload", settings.rate_limit_upload)
+download_limit = create_rate_limiter("download", settings.rate_limit_download)
+
+def stats() -> Dict[str, Any]:
+    """Per-limiter counters and the bucket store's size"""
+    return {
+        "backend": download_limit.backend.stats(),
+        **{limiter.name: limiter.stats() for limiter in (login_limit, upload_limit, download_limit)}
+    }
@@ -0,0 +1,158 @@
+# File serving with HTTP range and conditional request support
+import os
+from pathlib import Path
+from typing import Optional, Tuple
+from urllib.parse import quote
+
+import anyio
+from fastapi import HTTPException, Request
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+# Read size when the server can't hand the file descriptor to the kernel
+SERVE_CHUNK_SIZE = 256 * 1024
+
+# ASGI extension for sendfile(2)-style zero-copy responses
+ZEROCOPY_EXTENSION = "http.response.zerocopy"
+
+def parse_range(range_header: Optional[str], file_size: int) -> Optional[Tuple[int, int]]:
+    """Parse a single ``bytes=`` range into inclusive (start, end) offsets
+    
+    Returns None when the header is absent, malformed or asks for several
+    ranges, in which case the full file is served.
+    """
+    if not range_header or not range_header.startswith("bytes="):
+        return None
+    
+    spec = range_header[len("bytes="):].strip()
+    if "," in spec or "-" not in spec:
+        return None
+    
+    start_str, end_str = spec.split("-", 1)
+    try:
+        if start_str:
+            start = int(start_str)
+            end = int(end_str) if end_str else file_size - 1
+        else:
+            # Suffix range: the last N bytes
+            suffix = int(end_str)
+            if suffix == 0:
+                raise HTTPException(status_code=416, detail="Range not satisfiable", headers={"Content-Range": f"bytes */{file_size}"})
+            start = max(0, file_size - suffix)
+            end = file_size - 1
+    except ValueError:
+        return None
+    
+    if start >= file_size or start > end:
+        raise HTTPException(status_code=416, detail="Range not satisfiable", headers={"Content-Range": f"bytes */{file_size}"})
+    
+    return start, min(end, file_size - 1)
+
+def etag_matches(header: Optional[str], etag: str, weak: bool = True) -> bool:
+    """Check an If-None-Match / If-Range style header against an ETag"""
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    
+    def normalize(tag: str) -> str:
+        tag = tag.strip()
+        return tag[2:] if weak and tag.startswith("W/") else tag
+    
+    if not weak and etag.startswith("W/"):
+        return False  # Weak validators never match strongly
+    return normalize(etag) in (normalize(tag) for tag in header.split(","))
+
+def content_disposition(filename: str) -> str:
+    """Attachment header that survives non-ASCII (e.g. Uzbek Cyrillic) titles"""
+    fallback = filename.encode("ascii", "ignore").decode() or "document"
+    fallback = fallback.replace('"', "")
+    return f"attachment; filename=\"{fallback}\"; filename*=UTF-8''{quote(filename)}"
+
+class FileRangeResponse(Response):
+    """Send a byte range of a file
+    
+    Uses the ASGI zero-copy extension when the server offers it, so the
+    kernel moves the bytes; otherwise falls back to chunked ``pread`` in a
+    worker thread.
+    """
+    
+    def __init__(self, path: Path, start: int, end: int, status_code: int, headers: dict, media_type: str, send_body: bool = True):
+        super().__init__(status_code=status_code, headers=headers, media_type=media_type)
+        self.path = path
+        self.start = start
+        self.end = end
+        self.send_body = send_body
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        
+        count = self.end - self.start + 1
+        if not self.send_body or count <= 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+        
+        fd = os.open(self.path, os.O_RDONLY)
+        try:
+            if ZEROCOPY_EXTENSION in scope.get("extensions", {}):
+                await send({"type": ZEROCOPY_EXTENSION, "file": fd, "offset": self.start, "count": count})
+                return
+            
+            offset = self.start
+            remaining = count
+            while remaining > 0:
+                chunk = await anyio.to_thread.run_sync(os.pread, fd, min(SERVE_CHUNK_SIZE, remaining), offset)
+                if not chunk:
+                    break
+                offset += len(chunk)
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+            
+            if remaining > 0:
+                # File shrank underneath us; close the body so the client notices
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+        finally:
+            os.close(fd)
+
+def serve_file(
+    request: Request,
+    path: Path,
+    etag: str,
+    media_type: str,
+    filename: str,
+    cache_control: str = "private, max-age=3600",
+    inline: bool = False
+) -> Response:
+    """Serve a local file honouring Range, If-Range and If-None-Match"""
+    try:
+        file_size = path.stat().st_size
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="File not found")
+    disposition = content_disposition(filename)
+    headers = {
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+        "Cache-Control": cache_control,
+        "Content-Disposition": disposition.replace("attachment", "inline", 1) if inline else disposition
+    }
+    send_body = request.method != "HEAD"
+    
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={k: headers[k] for k in ("ETag", "Cache-Control")})
+    
+    # A stale If-Range validator means the client's partial copy is outdated
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and if_range and not etag_matches(if_range, etag, weak=False):
+        range_header = None
+    
+    byte_range = parse_range(range_header, file_size)
+    
+    if byte_range is None:
+        headers["Content-Length"] = str(file_size)
+        return FileRangeResponse(path, 0, file_size - 1, 200, headers, media_type, send_body)
+    
+    start, end = byte_range
+    headers["Content-Length"] = str(end - start + 1)
+    headers["Content-Range"] = f"bytes {start}-{end}/{file_size}"
+    return FileRangeResponse(path, start, end, 206, headers, media_type, send_body)
@@ -1,12 +1,19 @@
 # File Storage Configuration for Sukun Slide
-import os
+import asyncio
+import hashlib
+import io
+import tempfile
 import uuid
 import mimetypes
 from pathlib import Path
-from typing import Optional, Tuple
+from typing import Any, Dict, List, NamedTuple, Optional, Set, Tuple
 from fastapi import UploadFile, HTTPException
 import aiofiles
 from supabase import Client
+from app.core.config import settings
+from app.database import execute
+from app.core.storage_drivers import StorageDriver, UploadTarget, backend_of, create_driver
+from app.core.thumbnails import PREVIEW_SIZES
 
 # Storage configuration
 UPLOAD_DIR = Path("uploads")
@@ -21,14 +28,88 @@ ALLOWED_EXTENSIONS = {
     'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
 }
 
+# Uploads are streamed in fixed-size chunks so memory use doesn't grow with file size
+CHUNK_SIZE = 1024 * 1024  # 1MB
+
+# How long an upload waits for the cleanup job to finish deleting the same content
+BLOB_ACQUIRE_ATTEMPTS = 20
+BLOB_ACQUIRE_RETRY_SECONDS = 0.5
+
+# Leading bytes of each container format
+MAGIC_HEADER_LENGTH = 8
+MAGIC_SIGNATURES = {
+    'pdf': b'%PDF',
+    'ole': b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1',  # Legacy Office (doc, ppt, xls)
+    'zip': b'PK\x03\x04',  # Office Open XML (docx, pptx, xlsx)
+}
+EXTENSION_SIGNATURES = {
+    'pdf': 'pdf',
+    'ppt': 'ole',
+    'doc': 'ole',
+    'xls': 'ole',
+    'pptx': 'zip',
+    'docx': 'zip',
+    'xlsx': 'zip'
+}
+
+class IncomingFile(NamedTuple):
+    """An upload that has been received and spooled to disk"""
+    temp_path: Path
+    size: int
+    sha256: str
+    file_ext: str
+
+class StoredFile(NamedTuple):
+    """An upload persisted to storage"""
+    path: str
+    size: int
+    sha256: str
+
 class FileStorage:
-    def __init__(self, use_supabase: bool = True):
-        self.use_supabase = use_supabase
+    """Validates, spools and stores uploads through a pluggable storage driver
+    
+    New files go to the configured ``backend``. Reads and deletes go to the
+    backend recorded in each file path, so files stored before a backend
+    switch stay reachable.
+    """
+    
+    def __init__(self, backend: str = "supabase"):
+        self.backend = backend
         self.local_upload_dir = UPLOAD_DIR
+        self._drivers: Dict[str, StorageDriver] = {"local": create_driver("local", UPLOAD_DIR)}
         
-        # Create upload directory if it doesn't exist
-        if not self.use_supabase:
-            self.local_upload_dir.mkdir(exist_ok=True)
+        # Spool next to local storage so the final move is an atomic rename
+        if self.backend == "local":
+            self.spool_dir = self.local_upload_dir / ".incoming"
+        else:
+            self.spool_dir = Path(tempfile.gettempdir()) / "sukun-uploads"
+    
+    def get_driver(self, backend: str) -> StorageDriver:
+        """The driver for a backend, created on first use and reused after"""
+        if backend not in self._drivers:
+            self._drivers[backend] = create_driver(backend, self.local_upload_dir)
+        return self._drivers[backend]
+    
+    @property
+    def driver(self) -> StorageDriver:
+        """Driver new files are written to"""
+        return self.get_driver(self.backend)
+    
+    def driver_for(self, file_path: str) -> StorageDriver:
+        """Driver holding an already stored file"""
+        return self.get_driver(backend_of(file_path))
+    
+    async def setup(self):
+        """Prepare the storage backend once at startup instead of on every upload"""
+        await self.driver.setup()
+    
+    async def ping(self):
+        """Check the backend new files are written to is reachable"""
+        await self.driver.ping()
+    
+    def close(self):
+        for driver in self._drivers.values():
+            driver.close()
     
     def validate_file(self, file: UploadFile) -> Tuple[bool, str, str]:
         """Validate file type, size, and security"""
@@ -95,83 +176,311 @@ class FileStorage:
         
         return filename
     
-    async def save_file_local(self, file: UploadFile, filename: str) -> str:
-        """Save file to local storage"""
-        file_path = self.local_upload_dir / filename
+    async def receive_file(self, file: Any, file_ext: str) -> IncomingFile:
+        """Stream an upload to a spool file in fixed-size chunks
+        
+        Size, SHA-256 and the magic-byte check are computed in the same pass,
+        and the transfer is aborted as soon as MAX_FILE_SIZE is exceeded, so
+        memory use per upload stays at one chunk regardless of file size.
+        """
+        self.spool_dir.mkdir(parents=True, exist_ok=True)
+        temp_path = self.spool_dir / f"{uuid.uuid4().hex}.part"
+        digest = hashlib.sha256()
+        header = b""
+        size = 0
         
         try:
-            async with aiofiles.open(file_path, 'wb') as f:
-                content = await file.read()
-                await f.write(content)
+            async with aiofiles.open(temp_path, 'wb') as f:
+                while True:
+                    chunk = await file.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    
+                    size += len(chunk)
+                    if size > MAX_FILE_SIZE:
+                        raise HTTPException(
+                            status_code=413,
+                            detail=f"File exceeds maximum allowed size ({MAX_FILE_SIZE} bytes)"
+                        )
+                    
+                    if len(header) < MAGIC_HEADER_LENGTH:
+                        header += chunk[:MAGIC_HEADER_LENGTH - len(header)]
+                        if len(header) == MAGIC_HEADER_LENGTH:
+                            self._check_signature(header, file_ext)
+                    
+                    digest.update(chunk)
+                    await f.write(chunk)
             
-            return str(file_path)
+            if size == 0:
+                raise HTTPException(status_code=400, detail="Uploaded file is empty")
+            if len(header) < MAGIC_HEADER_LENGTH:
+                self._check_signature(header, file_ext)
+            
+            return IncomingFile(temp_path, size, digest.hexdigest(), file_ext)
+        except BaseException:
+            temp_path.unlink(missing_ok=True)
+            raise
+    
+    def _check_signature(self, header: bytes, file_ext: str):
+        """Reject files whose leading bytes don't match their extension"""
+        signature = MAGIC_SIGNATURES[EXTENSION_SIGNATURES[file_ext]]
+        if not header.startswith(signature):
+            raise HTTPException(
+                status_code=400,
+                detail=f"File content does not match the '{file_ext}' format"
+            )
+    
+    async def commit_file(self, incoming: IncomingFile, filename: str) -> StoredFile:
+        """Persist a spooled upload with the configured storage driver"""
+        try:
+            path = await self.driver.put_file(filename, incoming.temp_path, self.content_type(filename))
+        except HTTPException:
+            raise
         except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Failed to save file: {str(e)}")
+            raise HTTPException(status_code=500, detail=f"Failed to store file: {str(e)}")
+        finally:
+            incoming.temp_path.unlink(missing_ok=True)
+        
+        return StoredFile(path, incoming.size, incoming.sha256)
+    
+    def content_type(self, filename: str) -> str:
+        return (
+            ALLOWED_EXTENSIONS.get(filename.lower().split('.')[-1])
+            or mimetypes.guess_type(filename)[0]
+            or "application/octet-stream"
+        )
+    
+    def blob_filename(self, sha256: str, file_ext: str) -> str:
+        """Content-addressed filename: identical files map to one stored blob"""
+        return f"{sha256}.{file_ext}"
     
-    async def save_file_supabase(self, file: UploadFile, filename: str, supabase: Client) -> str:
-        """Save file to Supabase Storage"""
+    async def store_blob(self, incoming: IncomingFile, supabase: Optional[Client] = None) -> StoredFile:
+        """Store a spooled upload once per content hash
+        
+        Duplicate content skips the storage write and only takes another
+        reference on the existing blob in the ``document_blobs`` index.
+        """
+        filename = self.blob_filename(incoming.sha256, incoming.file_ext)
+        
+        if supabase is None:
+            # No index to consult: store under the content-addressed name
+            return await self.commit_file(incoming, filename)
+        
+        existing = await execute(
+            supabase.table("document_blobs").select("file_path").eq("content_hash", incoming.sha256)
+        )
+        file_path = existing.data[0]["file_path"] if existing.data else self.driver.path_for(filename)
+        blob = await self.acquire_blob(incoming.sha256, file_path, incoming.size, supabase)
+        
+        # The reference keeps the cleanup job away from the file, but it may
+        # have been deleted before, or another upload may not have written it yet
+        driver = self.driver_for(blob["file_path"])
+        key = driver.key(blob["file_path"])
         try:
-            # Read file content
-            content = await file.read()
-            
-            # Upload to Supabase Storage
-            bucket_name = "documents"
-            
-            # Create bucket if it doesn't exist
-            try:
-                supabase.storage.create_bucket(bucket_name, {"public": False})
-            except:
-                pass  # Bucket might already exist
-            
-            # Upload file
-            result = supabase.storage.from_(bucket_name).upload(filename, content)
-            
-            if hasattr(result, 'error') and result.error:
-                raise HTTPException(status_code=500, detail=f"Supabase upload failed: {result.error}")
-            
-            # Get file URL
-            file_url = supabase.storage.from_(bucket_name).get_public_url(filename)
-            
-            return file_url
-            
+            if await driver.stat(key) is None:
+                await driver.put_file(key, incoming.temp_path, self.content_type(key))
         except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Failed to upload to Supabase: {str(e)}")
+            await self.release_blobs([incoming.sha256], supabase)
+            raise HTTPException(status_code=500, detail=f"Failed to store file: {str(e)}")
+        
+        return StoredFile(blob["file_path"], incoming.size, incoming.sha256)
     
-    async def save_file(self, file: UploadFile, filename: str, supabase: Optional[Client] = None) -> str:
-        """Save file using configured storage method"""
-        if self.use_supabase and supabase:
-            return await self.save_file_supabase(file, filename, supabase)
-        else:
-            return await self.save_file_local(file, filename)
+    async def acquire_blob(self, sha256: str, file_path: str, size: int, supabase: Client) -> dict:
+        """Take a reference on a blob, waiting while the cleanup job deletes its file
+        
+        Returns the blob's ``file_path`` and ``ref_count``.
+        """
+        for _ in range(BLOB_ACQUIRE_ATTEMPTS):
+            result = await execute(supabase.rpc("acquire_document_blob", {
+                "p_content_hash": sha256,
+                "p_file_path": file_path,
+                "p_file_size": size
+            }))
+            if result.data:
+                return result.data[0]
+            await asyncio.sleep(BLOB_ACQUIRE_RETRY_SECONDS)
+        raise HTTPException(status_code=503, detail="The same file is being deleted, please try again")
+    
+    def staging_key(self, upload_id: str, file_ext: str) -> str:
+        """Key a direct upload is sent to; it is renamed to its blob key once verified"""
+        return f"incoming/{upload_id}.{file_ext}"
     
-    async def delete_file_local(self, file_path: str) -> bool:
-        """Delete file from local storage"""
+    async def presign_upload(self, key: str, size: int, sha256: str, expires_in: int) -> UploadTarget:
+        """Let a client upload straight to storage, without the bytes passing through the API"""
+        if not self.driver.direct_uploads:
+            raise HTTPException(status_code=501, detail="Direct uploads are not available with local storage")
+        
         try:
-            if os.path.exists(file_path):
-                os.remove(file_path)
-            return True
+            return await self.driver.presign_upload(key, size, self.content_type(key), sha256, expires_in)
         except Exception as e:
-            print(f"Failed to delete local file {file_path}: {e}")
-            return False
+            raise HTTPException(status_code=502, detail=f"Failed to sign upload URL: {str(e)}")
+    
+    async def check_direct_upload(self, key: str, size: int, sha256: str, file_ext: str) -> bool:
+        """Check a direct upload in place, without downloading it
+        
+        The size comes from stat() and the format from the first bytes; a bad
+        upload is deleted. Returns whether storage also vouched for the
+        SHA-256. When it can't, the content has to be hashed by a worker
+        before it is deduplicated.
+        """
+        driver = self.driver
+        stat = await driver.stat(key)
+        if stat is None:
+            raise HTTPException(status_code=409, detail="File has not been uploaded yet")
+        
+        try:
+            if stat.size != size:
+                raise HTTPException(status_code=400, detail="Uploaded file size does not match the declared size")
+            if stat.sha256 and stat.sha256 != sha256:
+                raise HTTPException(status_code=400, detail="Uploaded file does not match the declared hash")
+            self._check_signature(await driver.get_range(key, 0, MAGIC_HEADER_LENGTH - 1), file_ext)
+        except HTTPException:
+            await driver.delete_many([key])
+            raise
+        
+        return stat.sha256 == sha256
     
-    async def delete_file_supabase(self, filename: str, supabase: Client) -> bool:
-        """Delete file from Supabase Storage"""
+    async def adopt_blob(self, file_path: str, sha256: str, size: int, file_ext: str, supabase: Client) -> StoredFile:
+        """Turn a verified direct upload into a deduplicated blob, like store_blob
+        
+        The object is renamed inside its backend, or dropped when the same
+        content is already stored, so it is never copied through the API.
+        """
+        driver = self.driver_for(file_path)
+        key = driver.key(file_path)
+        filename = self.blob_filename(sha256, file_ext)
+        
+        existing = await execute(
+            supabase.table("document_blobs").select("file_path").eq("content_hash", sha256)
+        )
+        file_path = existing.data[0]["file_path"] if existing.data else driver.path_for(filename)
+        blob = await self.acquire_blob(sha256, file_path, size, supabase)
+        
+        # Referenced now, so the cleanup job leaves the blob alone; fill it in
+        # from the upload if it isn't there (yet), otherwise drop the upload
+        blob_driver = self.driver_for(blob["file_path"])
+        blob_key = blob_driver.key(blob["file_path"])
+        try:
+            if blob_driver is driver and await driver.stat(blob_key) is None:
+                await driver.move(key, blob_key)
+            else:
+                await driver.delete_many([key])
+        except Exception:
+            await self.release_blobs([sha256], supabase)
+            raise
+        
+        return StoredFile(blob["file_path"], size, sha256)
+    
+    def preview_filename(self, sha256: str, size: str) -> str:
+        """Previews are keyed by content, so documents sharing a blob share them"""
+        return f"{sha256}.preview-{size}.webp"
+    
+    async def save_preview(self, data: bytes, sha256: str, size: str, file_path: str) -> str:
+        """Store one rendered preview next to the document blob at ``file_path``"""
+        driver = self.driver_for(file_path)
+        return await driver.put_stream(self.preview_filename(sha256, size), io.BytesIO(data), "image/webp")
+    
+    def preview_path(self, file_path: str, sha256: str, size: str) -> str:
+        """Stored path of a preview of the blob at ``file_path``"""
+        return self.driver_for(file_path).path_for(self.preview_filename(sha256, size))
+    
+    async def fetch_local_copy(self, file_path: str) -> Tuple[Path, bool]:
+        """Get a stored file on local disk, downloading it from remote storage if needed
+        
+        Returns the path and whether it is a temporary copy the caller must delete.
+        """
+        driver = self.driver_for(file_path)
+        if not driver.remote:
+            return self.local_path(file_path), False
+        
+        key = driver.key(file_path)
+        self.spool_dir.mkdir(parents=True, exist_ok=True)
+        temp_path = self.spool_dir / f"{uuid.uuid4().hex}.{key.rsplit('.', 1)[-1]}"
         try:
-            bucket_name = "documents"
-            result = supabase.storage.from_(bucket_name).remove([filename])
-            return not (hasattr(result, 'error') and result.error)
+            await driver.download(key, temp_path)
+        except BaseException:
+            temp_path.unlink(missing_ok=True)
+            raise
+        return temp_path, True
+    
+    async def save_file(self, file: UploadFile, file_ext: str, supabase: Optional[Client] = None) -> StoredFile:
+        """Stream an upload into deduplicated storage in a single pass"""
+        incoming = await self.receive_file(file, file_ext)
+        
+        try:
+            return await self.store_blob(incoming, supabase)
+        finally:
+            incoming.temp_path.unlink(missing_ok=True)
+    
+    async def release_blobs(self, content_hashes: List[str], supabase: Client) -> Set[str]:
+        """Drop one reference per listed hash; returns the hashes no document uses any more
+        
+        The stored files are left in place; removing them is queued as a
+        ``delete_files`` job (see app.core.tasks).
+        """
+        result = await execute(supabase.rpc("release_document_blobs", {"p_content_hashes": content_hashes}))
+        return {row["content_hash"] for row in result.data}
+    
+    async def claim_unused_blobs(self, files: List[Tuple[str, str]], supabase: Client) -> Set[str]:
+        """Claim blobs that are still unreferenced for deletion; returns the hashes claimed
+        
+        Takes (file_path, content_hash) pairs. Until ``finish_blob_deletes``
+        no upload can take a reference on a claimed blob, so its files can be
+        deleted without racing a new upload of the same content.
+        """
+        result = await execute(supabase.rpc("claim_unused_blobs", {
+            "p_content_hashes": [content_hash for _, content_hash in files],
+            "p_file_paths": [file_path for file_path, _ in files]
+        }))
+        return {row["content_hash"] for row in result.data}
+    
+    async def finish_blob_deletes(self, content_hashes: List[str], supabase: Client):
+        """Forget claimed blobs whose files have been deleted"""
+        await execute(supabase.rpc("finish_blob_deletes", {"p_content_hashes": content_hashes}))
+    
+    async def delete_blob_files(self, files: List[Tuple[str, Optional[str]]]) -> bool:
+        """Delete stored files together with their previews
+        
+        Takes (file_path, content_hash) pairs. Keys are grouped per backend
+        and removed with one batched delete_many() call each.
+        """
+        keys: Dict[str, List[str]] = {}
+        deleted = True
+        for file_path, content_hash in files:
+            driver = self.driver_for(file_path)
+            try:
+                key = driver.key(file_path)
+            except ValueError as e:
+                print(f"Skipping delete of unrecognised file path: {e}")
+                deleted = False
+                continue
+            previews = [self.preview_filename(content_hash, size) for size in PREVIEW_SIZES] if content_hash else []
+            keys.setdefault(driver.name, []).extend([key] + previews)
+        
+        for backend, backend_keys in keys.items():
+            deleted = await self.get_driver(backend).delete_many(backend_keys) and deleted
+        return deleted
+    
+    def local_path(self, file_path: str) -> Path:
+        """Resolve a stored local path, refusing anything outside the upload directory"""
+        path = Path(file_path).resolve()
+        if self.local_upload_dir.resolve() not in path.parents or not path.is_file():
+            raise HTTPException(status_code=404, detail="File not found")
+        return path
+    
+    async def presign(self, file_path: str, download_name: Optional[str] = None, expires_in: int = 3600) -> Optional[str]:
+        """A short-lived URL for a remotely stored file, or None for local files the API serves
+        
+        With a download name the file is sent as an attachment, otherwise inline.
+        """
+        driver = self.driver_for(file_path)
+        if not driver.remote:
+            return None
+        
+        try:
+            return await driver.presign(driver.key(file_path), expires_in, download_name)
         except Exception as e:
-            print(f"Failed to delete Supabase file {filename}: {e}")
-            return False
-    
-    async def delete_file(self, file_path: str, supabase: Optional[Client] = None) -> bool:
-        """Delete file using configured storage method"""
-        if self.use_supabase and supabase:
-            # Extract filename from URL
-            filename = file_path.split('/')[-1]
-            return await self.delete_file_supabase(filename, supabase)
-        else:
-            return await self.delete_file_local(file_path)
+            raise HTTPException(status_code=502, detail=f"Failed to sign download URL: {str(e)}")
 
 # Global storage instance
-storage = FileStorage(use_supabase=True)
+storage = FileStorage(backend=settings.storage_backend)
@@ -0,0 +1,160 @@
+# Background job handlers for Sukun Slide
+#
+# Importing this module registers the handlers; the API and the worker
+# process both import it, so jobs enqueued by one can run in the other.
+import asyncio
+import hashlib
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.jobs import jobs, job_handler
+from app.core.storage import storage, CHUNK_SIZE
+from app.core.previews import previews
+from app.core.indexing import text_indexer
+from app.database import get_supabase, execute
+
+@job_handler("activity_log", concurrency=2)
+async def write_activity_log(payload: dict):
+    """Insert an activity log entry; the id is fixed at enqueue time so a retry cannot duplicate it"""
+    supabase = get_supabase()
+    await execute(supabase.table("activity_logs").upsert(payload, ignore_duplicates=True))
+
+@job_handler("delete_files", concurrency=2)
+async def delete_files(payload: dict):
+    """Remove files nothing references any more, with their previews
+    
+    The same content may have been uploaded again since the job was queued,
+    so blobs are claimed first: those referenced again are skipped, and
+    uploads wait for the claimed ones until their files are gone.
+    """
+    supabase = get_supabase()
+    files = [tuple(entry) for entry in payload["files"]]
+    
+    shared = [(file_path, content_hash) for file_path, content_hash in files if content_hash]
+    claimed = await storage.claim_unused_blobs(shared, supabase) if shared else set()
+    files = [(file_path, content_hash) for file_path, content_hash in files if not content_hash or content_hash in claimed]
+    
+    if files and not await storage.delete_blob_files(files):
+        raise RuntimeError(f"Could not delete all of {len(files)} files")
+    if claimed:
+        await storage.finish_blob_deletes(list(claimed), supabase)
+
+def _hash_file(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while chunk := f.read(CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+@job_handler("verify_upload", concurrency=2)
+async def verify_upload(payload: dict):
+    """Hash a direct upload whose storage couldn't, then deduplicate and process it
+    
+    Until this runs the document points at the staged object and has no
+    content hash (so no preview or search text yet).
+    """
+    supabase = get_supabase()
+    document_id = payload["document_id"]
+    file_path = payload["file_path"]
+    
+    current = await execute(supabase.table("documents").select("file_path, content_hash").eq("id", document_id))
+    if not current.data or current.data[0]["file_path"] != file_path:
+        return  # Deleted since, or already adopted by an earlier attempt
+    
+    local_copy, is_temporary = await storage.fetch_local_copy(file_path)
+    try:
+        sha256 = await asyncio.to_thread(_hash_file, local_copy)
+    finally:
+        if is_temporary:
+            local_copy.unlink(missing_ok=True)
+    
+    if sha256 != payload["sha256"]:
+        print(f"Direct upload for document {document_id} does not match its declared hash; using the actual one")
+    
+    await adopt_upload(document_id, file_path, sha256, payload["file_size"], payload["format"])
+
+async def adopt_upload(document_id: str, file_path: str, sha256: str, file_size: int, file_ext: str):
+    """Deduplicate a document's staged direct upload and start processing it
+    
+    The row is inserted first, pointing at the staged object, so the blob
+    reference taken here always has a document to belong to.
+    """
+    supabase = get_supabase()
+    stored = await storage.adopt_blob(file_path, sha256, file_size, file_ext, supabase)
+    updated = await execute(
+        supabase.table("documents")
+        .update({"file_path": stored.path, "content_hash": sha256})
+        .eq("id", document_id)
+        .eq("file_path", file_path)
+    )
+    if not updated.data:
+        # The document went away (or was adopted by another attempt) meanwhile
+        await release_file(stored.path, sha256)
+        return
+    
+    previews.schedule(document_id, stored.path, sha256, file_ext)
+    await text_indexer.schedule(document_id, stored.path, sha256, file_ext)
+
+@job_handler("discard_upload")
+async def discard_upload(payload: dict):
+    """Delete a direct upload that was never finalized"""
+    supabase = get_supabase()
+    file_path = payload["file_path"]
+    
+    in_use = await execute(supabase.table("documents").select("id").eq("file_path", file_path).limit(1))
+    if not in_use.data:
+        driver = storage.driver_for(file_path)
+        if not await driver.delete_many([driver.key(file_path)]):
+            raise RuntimeError(f"Could not delete unfinished upload {file_path}")
+
+@job_handler("extract_text", concurrency=settings.extraction_workers, max_attempts=settings.extraction_max_attempts)
+async def extract_document_text(payload: dict):
+    """Extract a document's text for the search index"""
+    await text_indexer.process(payload["document_id"], payload["file_path"], payload["content_hash"], payload["format"])
+
+@job_handler("reindex_text", concurrency=1)
+async def reindex_text(payload: dict):
+    """Queue one page of the corpus for text extraction"""
+    await text_indexer.reindex_page(payload["run"], payload["only_missing"], payload["after"])
+
+@job_handler("purge_revoked_tokens")
+async def purge_revoked_tokens(payload: dict):
+    """Drop denylist entries for tokens that have expired anyway"""
+    supabase = get_supabase()
+    now = datetime.now(timezone.utc).isoformat()
+    await execute(supabase.table("revoked_tokens").delete().lt("expires_at", now))
+
+async def log_activity(activity_log: dict):
+    """Queue an activity log entry without holding up the request"""
+    try:
+        await jobs.enqueue("activity_log", {"id": str(uuid.uuid4()), **activity_log})
+    except Exception as e:
+        print(f"Failed to log activity: {e}")
+
+async def release_files(files: List[Tuple[str, Optional[str]]], idempotency_key: Optional[str] = None):
+    """Drop references to stored files and queue deletion of those left unused
+    
+    Takes (file_path, content_hash) pairs. Reference counts are updated right
+    away, in one call, so later uploads of the same content see them; only
+    the slow storage deletes are deferred, as a single job.
+    """
+    supabase = get_supabase()
+    
+    hashes = [content_hash for _, content_hash in files if content_hash]
+    released = await storage.release_blobs(hashes, supabase) if hashes else set()
+    
+    # Files without a hash predate deduplication and belong to one document
+    unused = {}
+    for file_path, content_hash in files:
+        if not content_hash or content_hash in released:
+            unused[content_hash or file_path] = (file_path, content_hash)
+    
+    if unused:
+        await jobs.enqueue("delete_files", {"files": list(unused.values())}, idempotency_key=idempotency_key)
+
+async def release_file(file_path: str, content_hash: Optional[str], idempotency_key: Optional[str] = None):
+    """Drop a reference to one stored file, queueing its deletion if it was the last"""
+    await release_files([(file_path, content_hash)], idempotency_key)
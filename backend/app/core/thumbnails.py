@@ -0,0 +1,94 @@
+# First-page thumbnail rendering for Sukun Slide
+#
+# Runs inside preview worker processes, so it deliberately imports nothing
+# from the rest of the app.
+import io
+import zipfile
+import xml.etree.ElementTree as ET
+from typing import Dict
+
+try:
+    from PIL import Image, UnidentifiedImageError
+except ImportError:  # Pillow is optional; without it no previews are made
+    Image = None
+    UnidentifiedImageError = OSError
+
+try:
+    import pypdfium2 as pdfium
+except ImportError:  # pypdfium2 is optional; without it PDFs get no preview
+    pdfium = None
+
+# Preview name -> longest edge in pixels
+PREVIEW_SIZES = {"small": 160, "medium": 320, "large": 640}
+WEBP_QUALITY = 75
+
+OOXML_FORMATS = {"pptx", "docx", "xlsx"}
+THUMBNAIL_RELATIONSHIP = "http://schemas.openxmlformats.org/package/2006/relationships/metadata/thumbnail"
+
+class PreviewUnsupported(Exception):
+    """The file has no first page that can be rendered here"""
+
+def _ooxml_thumbnail(path: str) -> bytes:
+    """The preview picture Office embeds in the package (docProps/thumbnail.*)"""
+    with zipfile.ZipFile(path) as package:
+        candidates = []
+        
+        try:
+            relationships = ET.fromstring(package.read("_rels/.rels"))
+            for relationship in relationships:
+                if relationship.get("Type") == THUMBNAIL_RELATIONSHIP:
+                    candidates.append(relationship.get("Target", "").lstrip("/"))
+        except (KeyError, ET.ParseError):
+            pass
+        
+        candidates += [name for name in package.namelist() if name.lower().startswith("docprops/thumbnail.")]
+        
+        for name in candidates:
+            try:
+                return package.read(name)
+            except KeyError:
+                continue
+    
+    raise PreviewUnsupported("Document has no embedded preview picture")
+
+def _first_page(path: str, file_ext: str) -> "Image.Image":
+    if file_ext == "pdf":
+        if pdfium is None:
+            raise PreviewUnsupported("pypdfium2 is not installed")
+        
+        pdf = pdfium.PdfDocument(path)
+        try:
+            page = pdf[0]
+            width, height = page.get_size()
+            scale = max(PREVIEW_SIZES.values()) / max(width, height, 1)
+            return page.render(scale=scale).to_pil()
+        finally:
+            pdf.close()
+    
+    if file_ext in OOXML_FORMATS:
+        try:
+            image = Image.open(io.BytesIO(_ooxml_thumbnail(path)))
+            image.load()
+            return image
+        except UnidentifiedImageError:
+            raise PreviewUnsupported("Embedded preview is not a raster image")
+    
+    raise PreviewUnsupported(f"No preview renderer for .{file_ext} files")
+
+def render_previews(path: str, file_ext: str) -> Dict[str, bytes]:
+    """Render the first page or slide as WebP thumbnails, one per preview size"""
+    if Image is None:
+        raise PreviewUnsupported("Pillow is not installed")
+    
+    image = _first_page(path, file_ext).convert("RGB")
+    previews = {}
+    
+    for name, edge in PREVIEW_SIZES.items():
+        thumbnail = image.copy()
+        thumbnail.thumbnail((edge, edge))
+        
+        buffer = io.BytesIO()
+        thumbnail.save(buffer, "WEBP", quality=WEBP_QUALITY, method=4)
+        previews[name] = buffer.getvalue()
+    
+    return previews
@@ -0,0 +1,152 @@
+# Access and refresh tokens for Sukun Slide
+#
+# Access tokens are short-lived and checked on every request, so verified
+# claims are kept in an in-process LRU until the token expires. Refresh
+# tokens are single-use: each refresh consumes one and issues a new pair for
+# the same session. The revoked_tokens table is a compact denylist of
+# consumed refresh token ids and revoked session ids, each kept only until
+# the tokens it covers would have expired anyway.
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+from jose import JWTError, jwt as jose_jwt
+
+from app.core.cache import TTLCache, create_cache
+from app.core.config import settings
+from app.core.jobs import jobs
+from app.database import execute
+
+try:
+    import jwt as pyjwt  # PyJWT verifies HS256 tokens about twice as fast as python-jose
+except ImportError:  # PyJWT is optional
+    pyjwt = None
+
+ACCESS = "access"
+REFRESH = "refresh"
+
+JWT_ERRORS = (JWTError, pyjwt.PyJWTError) if pyjwt is not None else (JWTError,)
+
+class TokenError(Exception):
+    """A token that is malformed, badly signed, expired, revoked or of the wrong kind"""
+
+def encode(claims: dict) -> str:
+    """Sign claims with the configured secret"""
+    if pyjwt is not None:
+        return pyjwt.encode(claims, settings.jwt_secret, algorithm=settings.jwt_algorithm)
+    return jose_jwt.encode(claims, settings.jwt_secret, algorithm=settings.jwt_algorithm)
+
+def decode(token: str, audience: Optional[str] = None) -> dict:
+    """Verify a token's signature and expiry and return its claims
+    
+    Tokens carrying an audience are only accepted when that audience is
+    asked for, so other signed tickets can't stand in for access tokens.
+    """
+    try:
+        if pyjwt is not None:
+            return pyjwt.decode(token, settings.jwt_secret, algorithms=[settings.jwt_algorithm], audience=audience)
+        return jose_jwt.decode(token, settings.jwt_secret, algorithms=[settings.jwt_algorithm], audience=audience)
+    except JWT_ERRORS as e:
+        raise TokenError(str(e))
+
+# Verified access token claims, keyed by the token itself
+claims_cache = TTLCache(max_size=settings.token_cache_max_size, ttl_seconds=settings.access_token_minutes * 60)
+
+# Sessions revoked by logout or refresh token reuse; checked on every request.
+# Shared through Redis when configured, otherwise per process (the database
+# denylist still stops the session at its next refresh).
+revoked_sessions = create_cache("revoked_sessions", settings.token_cache_max_size, settings.access_token_minutes * 60)
+
+def _issue(user: dict, session_id: str, kind: str, lifetime: float) -> str:
+    now = int(time.time())
+    claims = {
+        "sub": user["id"],
+        "typ": kind,
+        "sid": session_id,
+        "jti": uuid.uuid4().hex,
+        "iat": now,
+        "exp": now + int(lifetime)
+    }
+    if kind == ACCESS:
+        claims["email"] = user.get("email")
+    return encode(claims)
+
+def issue_tokens(user: dict, session_id: Optional[str] = None) -> Dict[str, object]:
+    """Create an access and refresh token pair, starting a new session unless one is given"""
+    session_id = session_id or uuid.uuid4().hex
+    return {
+        "access_token": _issue(user, session_id, ACCESS, settings.access_token_minutes * 60),
+        "refresh_token": _issue(user, session_id, REFRESH, settings.refresh_token_days * 86400),
+        "token_type": "bearer",
+        "expires_in": settings.access_token_minutes * 60
+    }
+
+async def verify_access_token(token: str) -> dict:
+    """Claims of a valid access token; raises TokenError otherwise
+    
+    Signature checks are skipped for tokens already verified by this
+    process, but session revocation is checked every time.
+    """
+    claims = claims_cache.get(token)
+    if claims is None:
+        claims = decode(token)
+        if claims.get("typ") != ACCESS or not claims.get("sub"):
+            raise TokenError("Not an access token")
+        claims_cache.set(token, claims, ttl=claims["exp"] - time.time())
+    
+    if await revoked_sessions.get(claims["sid"]):
+        raise TokenError("Session has been revoked")
+    return claims
+
+def _expiry(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc).isoformat()
+
+async def _deny(supabase, token_id: str, expires_at: float) -> bool:
+    """Add an id to the denylist; False if it was already there"""
+    result = await execute(
+        supabase.table("revoked_tokens").upsert(
+            {"jti": token_id, "expires_at": _expiry(expires_at)},
+            ignore_duplicates=True
+        )
+    )
+    # Expired entries are purged at most once an hour
+    await jobs.enqueue("purge_revoked_tokens", {}, idempotency_key=f"purge-revoked-tokens:{int(time.time() // 3600)}")
+    return bool(result.data)
+
+async def revoke_session(supabase, session_id: str):
+    """End a session: its refresh tokens stop working and so do its access tokens"""
+    # No token of the session can outlive a refresh token issued right now
+    await _deny(supabase, session_id, time.time() + settings.refresh_token_days * 86400)
+    await revoked_sessions.set(session_id, True, ttl=settings.access_token_minutes * 60)
+
+async def consume_refresh_token(token: str, supabase) -> dict:
+    """Check a refresh token and mark it used; returns its claims
+    
+    Presenting a refresh token a second time means it leaked (or a client
+    raced itself), so the whole session is revoked.
+    """
+    claims = decode(token)
+    if claims.get("typ") != REFRESH or not claims.get("sub"):
+        raise TokenError("Not a refresh token")
+    
+    revoked = await execute(supabase.table("revoked_tokens").select("jti").eq("jti", claims["sid"]))
+    if revoked.data:
+        raise TokenError("Session has been revoked")
+    
+    if not await _deny(supabase, claims["jti"], claims["exp"]):
+        await revoke_session(supabase, claims["sid"])
+        raise TokenError("Refresh token has already been used")
+    
+    return claims
+
+def forget_token(token: str):
+    """Drop a token's cached claims"""
+    claims_cache.delete(token)
+
+def stats() -> dict:
+    return {
+        "backend": "pyjwt" if pyjwt is not None else "python-jose",
+        "claims": claims_cache.stats(),
+        "revoked_sessions": revoked_sessions.stats()
+    }
@@ -0,0 +1,229 @@
+# Resumable upload sessions for Sukun Slide
+import json
+import math
+import shutil
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+import aiofiles
+from fastapi import HTTPException
+
+from app.core.config import settings
+
+SESSION_FILE = "session.json"
+
+class PartsReader:
+    """File-like async reader over a session's chunk files, in order"""
+    
+    def __init__(self, part_paths: List[Path]):
+        self.part_paths = list(part_paths)
+        self._current = None
+    
+    async def read(self, size: int = -1) -> bytes:
+        while self.part_paths or self._current:
+            if self._current is None:
+                self._current = await aiofiles.open(self.part_paths.pop(0), 'rb')
+            
+            data = await self._current.read(size)
+            if data:
+                return data
+            
+            await self._current.close()
+            self._current = None
+        
+        return b""
+    
+    async def close(self):
+        if self._current is not None:
+            await self._current.close()
+            self._current = None
+
+class UploadSessionStore:
+    """Disk-backed upload sessions
+    
+    Each session is a directory holding its metadata and one file per
+    received chunk. Chunks are written to a temporary name and renamed once
+    complete, so an interrupted PUT never counts as received.
+    """
+    
+    def __init__(self, root: Optional[str] = None):
+        self.root = Path(root or Path(tempfile.gettempdir()) / "sukun-upload-sessions")
+    
+    def _session_dir(self, upload_id: str) -> Path:
+        # Upload IDs are UUIDs; anything else can't name a session directory
+        try:
+            return self.root / str(uuid.UUID(upload_id))
+        except ValueError:
+            raise HTTPException(status_code=404, detail="Upload session not found")
+    
+    def create(self, user: dict, file_ext: str, file_size: int, metadata: Dict[str, Any]) -> dict:
+        """Create a new upload session"""
+        self.purge_expired()
+        
+        upload_id = str(uuid.uuid4())
+        chunk_size = settings.upload_chunk_size
+        expires_at = datetime.utcnow() + timedelta(hours=settings.upload_session_ttl_hours)
+        
+        session = {
+            "upload_id": upload_id,
+            "user_id": user["id"],
+            "user_role": user.get("role"),
+            "format": file_ext,
+            "file_size": file_size,
+            "chunk_size": chunk_size,
+            "total_chunks": max(1, math.ceil(file_size / chunk_size)),
+            "metadata": metadata,
+            "created_at": datetime.utcnow().isoformat(),
+            "expires_at": expires_at.isoformat()
+        }
+        
+        session_dir = self._session_dir(upload_id)
+        session_dir.mkdir(parents=True)
+        (session_dir / SESSION_FILE).write_text(json.dumps(session))
+        
+        return session
+    
+    def get(self, upload_id: str, user: dict) -> dict:
+        """Load a session owned by the given user"""
+        session_file = self._session_dir(upload_id) / SESSION_FILE
+        if not session_file.exists():
+            raise HTTPException(status_code=404, detail="Upload session not found")
+        
+        session = json.loads(session_file.read_text())
+        
+        if session["user_id"] != user["id"]:
+            raise HTTPException(status_code=404, detail="Upload session not found")
+        if datetime.fromisoformat(session["expires_at"]) <= datetime.utcnow():
+            self.delete(upload_id)
+            raise HTTPException(status_code=410, detail="Upload session expired")
+        
+        return session
+    
+    def expected_chunk_length(self, session: dict, index: int) -> int:
+        """Length in bytes of chunk ``index`` (the last chunk may be short)"""
+        if index < 0 or index >= session["total_chunks"]:
+            raise HTTPException(status_code=400, detail="Chunk index out of range")
+        
+        start = index * session["chunk_size"]
+        return min(session["chunk_size"], session["file_size"] - start)
+    
+    async def write_chunk(self, session: dict, index: int, offset: int, stream: AsyncIterator[bytes]) -> int:
+        """Store one chunk from a request body stream"""
+        expected_offset = index * session["chunk_size"]
+        if offset != expected_offset:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Chunk {index} must start at offset {expected_offset}"
+            )
+        
+        expected_length = self.expected_chunk_length(session, index)
+        session_dir = self._session_dir(session["upload_id"])
+        part_path = session_dir / f"{index}.part"
+        temp_path = session_dir / f"{index}.{uuid.uuid4().hex[:8]}.tmp"
+        received = 0
+        
+        try:
+            async with aiofiles.open(temp_path, 'wb') as f:
+                async for data in stream:
+                    received += len(data)
+                    if received > expected_length:
+                        raise HTTPException(status_code=400, detail=f"Chunk {index} is larger than {expected_length} bytes")
+                    await f.write(data)
+            
+            if received != expected_length:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Chunk {index} is incomplete ({received} of {expected_length} bytes)"
+                )
+            
+            temp_path.replace(part_path)
+            return received
+        finally:
+            temp_path.unlink(missing_ok=True)
+    
+    def received_chunks(self, session: dict) -> List[int]:
+        """Indexes of fully received chunks"""
+        session_dir = self._session_dir(session["upload_id"])
+        indexes = []
+        
+        for part in session_dir.glob("*.part"):
+            try:
+                indexes.append(int(part.stem))
+            except ValueError:
+                continue
+        
+        return sorted(i for i in indexes if 0 <= i < session["total_chunks"])
+    
+    def received_ranges(self, session: dict) -> List[Tuple[int, int]]:
+        """Received bytes as merged, inclusive (start, end) ranges"""
+        ranges: List[List[int]] = []
+        
+        for index in self.received_chunks(session):
+            start = index * session["chunk_size"]
+            end = start + self.expected_chunk_length(session, index) - 1
+            if ranges and ranges[-1][1] + 1 == start:
+                ranges[-1][1] = end
+            else:
+                ranges.append([start, end])
+        
+        return [(start, end) for start, end in ranges]
+    
+    def status(self, session: dict) -> dict:
+        """Describe what has been received and what is still missing"""
+        received = self.received_chunks(session)
+        missing = sorted(set(range(session["total_chunks"])) - set(received))
+        received_bytes = sum(self.expected_chunk_length(session, i) for i in received)
+        
+        return {
+            "upload_id": session["upload_id"],
+            "file_size": session["file_size"],
+            "chunk_size": session["chunk_size"],
+            "total_chunks": session["total_chunks"],
+            "received_bytes": received_bytes,
+            "received_ranges": [list(r) for r in self.received_ranges(session)],
+            "missing_chunks": missing,
+            "complete": not missing,
+            "expires_at": session["expires_at"]
+        }
+    
+    def open_parts(self, session: dict) -> PartsReader:
+        """Open a reader over all chunks; the session must be complete"""
+        session_dir = self._session_dir(session["upload_id"])
+        return PartsReader([session_dir / f"{i}.part" for i in range(session["total_chunks"])])
+    
+    def delete(self, upload_id: str):
+        shutil.rmtree(self._session_dir(upload_id), ignore_errors=True)
+    
+    def purge_expired(self) -> int:
+        """Remove sessions past their expiry along with their stale parts"""
+        if not self.root.exists():
+            return 0
+        
+        now = datetime.utcnow()
+        stale_before = time.time() - settings.upload_session_ttl_hours * 3600
+        purged = 0
+        
+        for session_dir in self.root.iterdir():
+            if not session_dir.is_dir():
+                continue
+            
+            session_file = session_dir / SESSION_FILE
+            try:
+                session = json.loads(session_file.read_text())
+                expired = datetime.fromisoformat(session["expires_at"]) <= now
+            except (OSError, ValueError, KeyError):
+                # Unreadable metadata: fall back to the directory's age
+                expired = session_dir.stat().st_mtime < stale_before
+            
+            if expired:
+                shutil.rmtree(session_dir, ignore_errors=True)
+                purged += 1
+        
+        return purged
+
+# Global session store
+upload_sessions = UploadSessionStore(settings.upload_session_dir or None)
@@ -1,16 +1,121 @@
+import asyncio
+import functools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+import httpx
+from fastapi import HTTPException
+from postgrest.utils import SyncClient
 from supabase import create_client, Client
+from supabase.lib.client_options import ClientOptions
 from app.core.config import settings
+from app.core.metrics import db_queries_in_flight, db_query_duration, query_labels
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+# supabase-py is synchronous, so every call is offloaded to this bounded pool
+# instead of blocking the event loop
+_executor: Optional[ThreadPoolExecutor] = None
 
-# Initialize Supabase client
-supabase: Client = create_client(settings.supabase_url, settings.supabase_key)
+# Clients are created on first use rather than at import, so importing the
+# app (and every CLI that shares this module) stays fast and offline
+_clients: Dict[str, Client] = {}
+_clients_lock = threading.Lock()
 
-# Service role client for admin operations
-supabase_admin: Client = create_client(settings.supabase_url, settings.supabase_service_key)
+def _create_client(key: str) -> Client:
+    """Create a Supabase client whose PostgREST session is a shared HTTP/2 pool"""
+    options = ClientOptions(
+        postgrest_client_timeout=settings.db_timeout_seconds,
+        storage_client_timeout=settings.storage_timeout_seconds,
+    )
+    client = create_client(settings.supabase_url, key, options=options)
+    
+    # Replace the default HTTP/1.1 session with a pooled one sized to the executor
+    postgrest = client.postgrest
+    default_session = postgrest.session
+    postgrest.session = SyncClient(
+        base_url=default_session.base_url,
+        headers=default_session.headers,
+        timeout=settings.db_timeout_seconds,
+        http2=HTTP2_AVAILABLE,
+        limits=httpx.Limits(
+            max_connections=settings.db_pool_size,
+            max_keepalive_connections=settings.db_pool_size,
+        ),
+    )
+    default_session.close()
+    
+    return client
+
+def _get_client(role: str, key: str) -> Client:
+    client = _clients.get(role)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(role)
+            if client is None:
+                client = _clients[role] = _create_client(key)
+    return client
 
 def get_supabase() -> Client:
     """Get Supabase client instance"""
-    return supabase
+    return _get_client("anon", settings.supabase_key)
 
 def get_supabase_admin() -> Client:
-    """Get Supabase admin client instance"""
-    return supabase_admin
+    """Get Supabase admin client instance (service role)"""
+    return _get_client("service", settings.supabase_service_key)
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=settings.db_pool_size, thread_name_prefix="supabase")
+    return _executor
+
+async def run_sync(func: Callable[..., Any], *args: Any, timeout: Optional[float] = None) -> Any:
+    """Run a blocking Supabase call in the bounded pool with a per-call timeout"""
+    loop = asyncio.get_running_loop()
+    future = loop.run_in_executor(_get_executor(), functools.partial(func, *args))
+    
+    try:
+        return await asyncio.wait_for(future, timeout or settings.db_timeout_seconds)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Database request timed out")
+
+async def execute(query: Any, timeout: Optional[float] = None) -> Any:
+    """Execute a PostgREST query builder without blocking the event loop"""
+    table, operation = query_labels(query)
+    outcome = "error"
+    db_queries_in_flight.inc()
+    started = time.perf_counter()
+    try:
+        result = await run_sync(query.execute, timeout=timeout)
+        outcome = "ok"
+        return result
+    finally:
+        db_queries_in_flight.dec()
+        db_query_duration.observe(time.perf_counter() - started, table=table, operation=operation, outcome=outcome)
+
+async def ping(timeout: Optional[float] = None) -> None:
+    """Round trip to the database with the cheapest query the API has"""
+    await execute(get_supabase().table("subjects").select("id").limit(1), timeout=timeout)
+
+async def warm_up(connections: int, timeout: Optional[float] = None) -> None:
+    """Create both clients and open pooled connections ahead of the first requests"""
+    get_supabase_admin()
+    await asyncio.gather(*(ping(timeout) for _ in range(max(1, connections))))
+
+def shutdown_executor() -> None:
+    """Stop accepting new database work and close pooled connections"""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+    with _clients_lock:
+        for client in _clients.values():
+            client.postgrest.session.close()
+        _clients.clear()
@@ -0,0 +1,211 @@
+# Direct Postgres access for Sukun Slide's hottest queries
+#
+# Everything else goes through PostgREST. With DIRECT_DB_ENABLED and
+# DATABASE_URL set, the user lookup behind authentication, the catalog
+# listing and download recording use an asyncpg pool instead: one binary
+# round trip per query, with statements prepared once per connection and
+# reused. Rows come back shaped like PostgREST's JSON (UUIDs and timestamps
+# as the same strings), so callers and cached responses can't tell the two
+# paths apart, and turning the flag off falls back to PostgREST.
+import asyncio
+import time
+import uuid
+from datetime import datetime
+from typing import Any, List, Optional, Sequence, Tuple
+
+from fastapi import HTTPException
+
+from app.core.config import settings
+from app.core.metrics import direct_db_query_duration
+
+# Imported on first use, so deployments that leave the pool off never load it
+asyncpg = None
+
+def _import_asyncpg() -> bool:
+    global asyncpg
+    if asyncpg is None:
+        try:
+            import asyncpg as asyncpg_module
+        except ImportError:
+            return False
+        asyncpg = asyncpg_module
+    return True
+
+# Text parameters are cast in SQL, so Postgres parses them exactly as it
+# does the JSON PostgREST sends
+USER_BY_ID = "SELECT * FROM users WHERE id = $1::text::uuid"
+INSERT_DOWNLOADS = """
+    INSERT INTO downloads (user_id, document_id, downloaded_at, ip_address, user_agent)
+    SELECT * FROM unnest($1::text[]::uuid[], $2::text[]::uuid[], $3::text[]::timestamptz[], $4::text[]::inet[], $5::text[])
+"""
+INCREMENT_DOWNLOAD_COUNTS = "SELECT increment_download_counts($1::text[]::uuid[], $2::int[])"
+
+def _timestamp(value: datetime) -> str:
+    """ISO 8601 as Postgres writes it in JSON: no trailing zeros in the fraction"""
+    text = value.isoformat()
+    if value.microsecond:
+        fraction = f".{value.microsecond:06d}"
+        text = text.replace(fraction, fraction.rstrip("0"), 1)
+    return text
+
+def _json_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return _timestamp(value)
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    if isinstance(value, list):
+        return [_json_value(item) for item in value]
+    return value
+
+class DirectDatabase:
+    """asyncpg pool for the hot queries, opened on first use or at warm-up"""
+    
+    def __init__(self, dsn: str, enabled: bool, min_size: int, max_size: int,
+                 statement_cache_size: int, timeout: float):
+        self.dsn = dsn
+        self.enabled = enabled and bool(dsn)
+        self.min_size = min(min_size, max_size)
+        self.max_size = max_size
+        self.statement_cache_size = statement_cache_size
+        self.timeout = timeout
+        self._pool = None
+        self._lock: Optional[asyncio.Lock] = None
+        
+        # Metrics
+        self.queries = 0
+        self.failures = 0
+    
+    async def _get_pool(self):
+        if self._pool is None:
+            if self._lock is None:
+                self._lock = asyncio.Lock()
+            async with self._lock:
+                if self._pool is None:
+                    if not _import_asyncpg():
+                        raise RuntimeError("DIRECT_DB_ENABLED requires asyncpg (pip install asyncpg)")
+                    self._pool = await asyncpg.create_pool(
+                        self.dsn,
+                        min_size=self.min_size,
+                        max_size=self.max_size,
+                        statement_cache_size=self.statement_cache_size,
+                        timeout=self.timeout,
+                    )
+        return self._pool
+    
+    async def _run(self, name: str, method: str, sql: str, *args: Any) -> Any:
+        """Run one statement on a pooled connection, timed like PostgREST calls"""
+        pool = await self._get_pool()
+        outcome = "error"
+        started = time.perf_counter()
+        self.queries += 1
+        try:
+            async with pool.acquire(timeout=self.timeout) as connection:
+                result = await getattr(connection, method)(sql, *args, timeout=self.timeout)
+            outcome = "ok"
+            return result
+        except asyncio.TimeoutError:
+            raise HTTPException(status_code=504, detail="Database request timed out")
+        finally:
+            if outcome != "ok":
+                self.failures += 1
+            direct_db_query_duration.observe(time.perf_counter() - started, query=name, outcome=outcome)
+    
+    async def _fetch(self, name: str, sql: str, *args: Any) -> List[dict]:
+        rows = await self._run(name, "fetch", sql, *args)
+        return [{key: _json_value(value) for key, value in row.items()} for row in rows]
+    
+    async def start(self):
+        """Open the pool's first connections ahead of the first requests"""
+        await self._get_pool()
+    
+    async def ping(self):
+        await self._run("ping", "fetchval", "SELECT 1")
+    
+    async def get_user(self, user_id: str) -> Optional[dict]:
+        """The users row for ``user_id`` (every column), or None"""
+        rows = await self._fetch("user_by_id", USER_BY_ID, user_id)
+        return rows[0] if rows else None
+    
+    async def catalog_rows(
+        self,
+        columns: Sequence[str],
+        subject: Optional[str],
+        format: Optional[str],
+        search: Optional[str],
+        cursor: Optional[Tuple[str, str]],
+        limit: int
+    ) -> List[dict]:
+        """Approved documents newest first, as the PostgREST catalog query returns them
+        
+        ``cursor`` is the (created_at, id) the page starts after. Each filter
+        combination is its own statement, prepared once per connection.
+        """
+        args: List[Any] = []
+        
+        def param(value: Any, cast: str = "") -> str:
+            args.append(value)
+            return f"${len(args)}{cast}"
+        
+        conditions = ["status = 'approved'"]
+        if subject:
+            conditions.append(f"subject_id = {param(subject)}")
+        if format:
+            conditions.append(f"format = {param(format)}")
+        if search:
+            # PostgREST also treats * as a wildcard in like patterns
+            conditions.append(f"title ILIKE {param(f'%{search}%'.replace('*', '%'))}")
+        if cursor:
+            value, row_id = cursor
+            conditions.append(f"(created_at, id) < ({param(value, '::text::timestamptz')}, {param(row_id, '::text::uuid')})")
+        
+        # Column names come from select_fields, which only allows known ones
+        sql = (
+            f"SELECT {', '.join(columns)} FROM documents"
+            f" WHERE {' AND '.join(conditions)}"
+            f" ORDER BY created_at DESC, id DESC LIMIT {param(limit)}"
+        )
+        return await self._fetch("catalog", sql, *args)
+    
+    async def insert_downloads(self, events: List[dict]):
+        """Insert download events in one statement, whatever the batch size"""
+        await self._run(
+            "insert_downloads", "execute", INSERT_DOWNLOADS,
+            [event["user_id"] for event in events],
+            [event["document_id"] for event in events],
+            [event.get("downloaded_at") for event in events],
+            [event.get("ip_address") for event in events],
+            [event.get("user_agent") for event in events]
+        )
+    
+    async def increment_download_counts(self, document_ids: List[str], counts: List[int]):
+        await self._run("increment_download_counts", "execute", INCREMENT_DOWNLOAD_COUNTS, document_ids, counts)
+    
+    async def close(self):
+        """Close pooled connections after in-flight queries finish"""
+        if self._pool is not None:
+            pool, self._pool = self._pool, None
+            try:
+                await asyncio.wait_for(pool.close(), self.timeout)
+            except asyncio.TimeoutError:
+                pool.terminate()
+    
+    def stats(self) -> dict:
+        pool = self._pool
+        return {
+            "enabled": self.enabled,
+            "pool_size": pool.get_size() if pool else 0,
+            "idle_connections": pool.get_idle_size() if pool else 0,
+            "max_size": self.max_size,
+            "queries": self.queries,
+            "failures": self.failures
+        }
+
+# Global direct database instance
+direct_db = DirectDatabase(
+    dsn=settings.database_url,
+    enabled=settings.direct_db_enabled,
+    min_size=settings.warm_connections,
+    max_size=settings.direct_db_pool_size,
+    statement_cache_size=settings.direct_db_statement_cache_size,
+    timeout=settings.db_timeout_seconds
+)
@@ -1,10 +1,94 @@
-from fastapi import FastAPI, HTTPException
+import asyncio
+import time
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, HTTPException, Header
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 import uvicorn
 
-from app.api import auth, documents, users, admin
+from app import database
+from app.direct_db import direct_db
+from app.api import auth, documents, users, admin, uploads
 from app.core.config import settings
+from app.core.health import readiness
+from app.core.uploads import upload_sessions
+from app.core.events import download_events
+from app.core.previews import previews
+from app.core.indexing import text_indexer
+from app.core.storage import storage
+from app.core.jobs import jobs, job_worker
+from app.core.passwords import password_hasher
+from app.core import tokens
+from app.core.metrics import metrics, MetricsMiddleware, authorized
+import app.core.tasks  # noqa: F401  (registers job handlers)
+
+async def warm_up():
+    """Open connections and fill caches; the app reports ready once this is done
+    
+    Runs after the server starts listening, so a cold start binds its port
+    straight away and the platform's readiness check holds traffic back
+    until connections are open. A dependency that is still down by the
+    timeout shows up in the readiness probe instead of blocking startup.
+    """
+    steps = {
+        # Creates the bucket once here rather than on every upload
+        "storage": storage.setup(),
+        "database": database.warm_up(settings.warm_connections, settings.readiness_timeout_seconds),
+    }
+    if direct_db.enabled:
+        steps["direct_db"] = direct_db.start()
+    started = time.perf_counter()
+    
+    async def run(name, step) -> bool:
+        try:
+            await step
+            return True
+        except Exception as e:
+            print(f"Warm-up step '{name}' failed: {getattr(e, 'detail', None) or e}")
+            return False
+    
+    tasks = {name: asyncio.create_task(run(name, step)) for name, step in steps.items()}
+    try:
+        _, pending = await asyncio.wait(tasks.values(), timeout=settings.warm_up_timeout_seconds)
+        if pending:
+            print(f"Warm-up did not finish within {settings.warm_up_timeout_seconds:g}s")
+        elif tasks["database"].result():
+            # The first catalog page needs the database, so it comes last
+            await run("catalog", asyncio.wait_for(documents.warm_catalog(), settings.readiness_timeout_seconds))
+    finally:
+        for task in tasks.values():
+            task.cancel()
+    
+    readiness.mark_ready()
+    print(f"Ready after {time.perf_counter() - started:.2f}s of warm-up")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Garbage-collect resumable upload sessions left over from previous runs
+    upload_sessions.purge_expired()
+    download_events.start()
+    if settings.job_worker_in_app:
+        job_worker.start()
+    warming = asyncio.create_task(warm_up())
+    
+    yield
+    
+    # Fail readiness first so no new traffic is routed here while draining
+    readiness.mark_stopping()
+    warming.cancel()
+    await asyncio.gather(warming, return_exceptions=True)
+    # Drain buffered download events before the database pool goes away
+    await download_events.stop()
+    await direct_db.close()
+    await previews.shutdown()
+    text_indexer.stop()
+    await job_worker.stop()
+    jobs.close()
+    storage.close()
+    password_hasher.shutdown()
+    database.shutdown_executor()
 
 # Create FastAPI app
 app = FastAPI(
@@ -12,7 +96,8 @@ app = FastAPI(
     description="Educational Document Sharing Platform API",
     version="1.0.0",
     docs_url="/api/docs",
-    redoc_url="/api/redoc"
+    redoc_url="/api/redoc",
+    lifespan=lifespan
 )
 
 # Configure CORS
@@ -24,17 +109,41 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Outermost, so recorded latency includes every other middleware
+app.add_middleware(MetricsMiddleware, routes=app.routes)
+
 # Include routers
 app.include_router(auth.router, prefix="/api/auth", tags=["Authentication"])
 app.include_router(documents.router, prefix="/api/documents", tags=["Documents"])
 app.include_router(users.router, prefix="/api/users", tags=["Users"])
 app.include_router(admin.router, prefix="/api/admin", tags=["Admin"])
+app.include_router(uploads.router, prefix="/api/uploads", tags=["Resumable Uploads"])
+
+metrics.register_cache("catalog", documents.catalog_cache)
+metrics.register_cache("users", auth.user_cache)
+metrics.register_cache("analytics", admin.analytics_cache)
+metrics.register_cache("token_claims", tokens.claims_cache)
 
-# Health check endpoint
+# Health checks: liveness says the process is up, readiness that it should get traffic
 @app.get("/api/health")
+@app.get("/api/health/live")
 async def health_check():
     return {"status": "healthy", "message": "Sukun Slide API is running"}
 
+@app.get("/api/health/ready")
+async def readiness_check():
+    ready, body = await readiness.status()
+    if not ready:
+        return JSONResponse(body, status_code=503, headers={"Retry-After": "5"})
+    return body
+
+# Metrics for Prometheus-compatible scrapers
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics(authorization: str = Header(None)):
+    if not authorized(authorization):
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 # Root endpoint
 @app.get("/")
 async def root():
@@ -11,8 +11,18 @@ class TokenData(BaseModel):
     user_id: Optional[str] = None
     email: Optional[str] = None
 
-class LoginResponse(BaseModel):
+class TokenPair(BaseModel):
     access_token: str
+    refresh_token: str
     token_type: str
+    expires_in: int  # Access token lifetime in seconds
+
+class LoginResponse(TokenPair):
     user: dict
     message: str
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
+class LogoutRequest(BaseModel):
+    refresh_token: Optional[str] = None
@@ -0,0 +1,6 @@
+from pydantic import BaseModel, Field
+from typing import List
+from app.core.config import settings
+
+class BulkDocumentIds(BaseModel):
+    document_ids: List[str] = Field(..., min_length=1, max_length=settings.bulk_max_items)
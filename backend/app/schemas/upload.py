@@ -0,0 +1,17 @@
+from pydantic import BaseModel, Field
+from typing import Optional
+
+class UploadSessionCreate(BaseModel):
+    filename: str
+    file_size: int
+    title: str
+    subject_id: str
+    description: Optional[str] = None
+    author: Optional[str] = None
+    tags: Optional[str] = None  # Comma-separated, as in the multipart upload forms
+
+class DirectUploadCreate(UploadSessionCreate):
+    sha256: str = Field(..., pattern="^[0-9a-fA-F]{64}$")  # Hex digest of the file, computed by the client
+
+class DirectUploadComplete(BaseModel):
+    ticket: str
@@ -0,0 +1,33 @@
+# Background job worker for Sukun Slide
+#
+# Runs queued jobs outside the API process:
+#
+#     python -m app.worker
+#
+# Set JOB_WORKER_IN_APP=false on the API when a separate worker is running;
+# both must point at the same JOB_DB_PATH.
+import asyncio
+import signal
+
+import app.core.tasks  # noqa: F401  (registers job handlers)
+from app.core.jobs import jobs, job_worker
+from app.core.previews import previews
+from app.core.storage import storage
+from app.database import shutdown_executor
+
+async def main():
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, lambda: asyncio.create_task(job_worker.stop()))
+    
+    print(f"Job worker {job_worker.worker_id} started (concurrency {job_worker.concurrency})")
+    await job_worker.run()  # Returns once stopped and drained
+    
+    await previews.shutdown()
+    jobs.close()
+    storage.close()
+    shutdown_executor()
+    print("Job worker stopped")
+
+if __name__ == "__main__":
+    asyncio.run(main())
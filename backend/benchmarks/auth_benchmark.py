@@ -0,0 +1,66 @@
+# Auth benchmark: per-request cost of authenticating a bearer token
+#
+# Compares the old path (python-jose decode on every request) with the
+# current one: a first request that verifies the token with the configured
+# backend, and repeat requests served from the verified-claims cache. The
+# user lookup is warm in every case, so only the token handling differs.
+# No database is touched; run it from the backend directory:
+#
+#     python -m benchmarks.auth_benchmark [--requests 20000]
+import argparse
+import asyncio
+import os
+import time
+
+# Placeholders so the app's settings and clients can be built offline
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_KEY", "benchmark")
+os.environ.setdefault("SUPABASE_SERVICE_KEY", "benchmark")
+
+from fastapi.security import HTTPAuthorizationCredentials
+from jose import jwt as jose_jwt
+
+from app.api.auth import get_current_user, user_cache
+from app.core import tokens
+from app.core.config import settings
+
+USER = {"id": "00000000-0000-0000-0000-000000000001", "email": "bench@example.com", "status": "active", "role": "user"}
+
+async def old_get_current_user(credentials: HTTPAuthorizationCredentials):
+    """The previous implementation: decode with python-jose, then the user cache"""
+    payload = jose_jwt.decode(credentials.credentials, settings.jwt_secret, algorithms=[settings.jwt_algorithm])
+    return await user_cache.get(payload["sub"])
+
+async def measure(label: str, requests: int, make_credentials, authenticate) -> float:
+    credentials = [make_credentials() for _ in range(requests)]
+    started = time.perf_counter()
+    for item in credentials:
+        await authenticate(item)
+    per_request = (time.perf_counter() - started) / requests * 1e6
+    print(f"  {label:<38} {per_request:8.1f} us/request")
+    return per_request
+
+async def main(requests: int):
+    await user_cache.set(USER["id"], USER)
+    token = tokens.issue_tokens(USER)["access_token"]
+    
+    def same_token():
+        return HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+    
+    def fresh_token():
+        # A new token each time, so the claims cache never hits
+        return HTTPAuthorizationCredentials(scheme="Bearer", credentials=tokens.issue_tokens(USER)["access_token"])
+    
+    print(f"Token backend: {tokens.stats()['backend']}, {requests} requests each")
+    before = await measure("before: python-jose decode", requests, same_token, old_get_current_user)
+    first = await measure("after: first request (cache miss)", requests, fresh_token, get_current_user)
+    tokens.claims_cache.clear()
+    await get_current_user(same_token())
+    repeat = await measure("after: repeat request (cache hit)", requests, same_token, get_current_user)
+    print(f"  speedup: {before / first:.1f}x on a miss, {before / repeat:.1f}x on a hit")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure per-request authentication overhead")
+    parser.add_argument("--requests", type=int, default=20000)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests))
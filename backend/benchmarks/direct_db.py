@@ -0,0 +1,174 @@
+# Direct Postgres pool vs PostgREST: latency of the hot queries on both paths
+#
+# Runs the user lookup behind authentication, catalog pages and (with
+# --writes) a download-event flush through the functions the API uses, once
+# over the asyncpg pool and once over PostgREST. Both must reach the same
+# database: SUPABASE_URL and keys for PostgREST, DATABASE_URL for the pool
+# (a staging project, or the stack `supabase start` runs locally). Reads are
+# compared first and any difference between the paths fails the run. Run it
+# from the backend directory:
+#
+#     python -m benchmarks.direct_db [--requests 500] [--concurrency 8] [--writes] [--output results.json]
+#
+# --writes records real download events and raises download counts.
+import argparse
+import asyncio
+import json
+import sys
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List
+
+from app import database
+from app.api.auth import fetch_user
+from app.api.documents import catalog_page
+from app.core.config import settings
+from app.core.events import DownloadEventBuffer
+from app.core.pagination import PageParams, DOCUMENT_FIELDS, select_fields
+from app.direct_db import direct_db
+from benchmarks.loadtest import git_commit, summarize
+
+PATHS = {"postgrest": False, "direct": True}
+
+async def measure(call: Callable[[], Awaitable[Any]], requests: int, concurrency: int) -> dict:
+    """Send ``requests`` calls from ``concurrency`` concurrent clients"""
+    latencies: List[float] = []
+    remaining = requests
+    
+    async def client():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            started = time.perf_counter()
+            await call()
+            latencies.append((time.perf_counter() - started) * 1000)
+    
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {
+        "requests": len(latencies),
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+        "latency_ms": summarize(latencies)
+    }
+
+async def read_cases() -> Dict[str, Callable[[], Awaitable[Any]]]:
+    """The hot reads, with a real user, subject and cursor sampled from the data"""
+    users = await database.execute(database.get_supabase().table("users").select("id").limit(1))
+    if not users.data:
+        raise RuntimeError("The database has no users to look up")
+    user_id = users.data[0]["id"]
+    
+    columns = select_fields(None, DOCUMENT_FIELDS)
+    first = PageParams(cursor=None, limit=settings.default_page_size, fields=None)
+    first_page = await catalog_page(None, None, None, columns, first)
+    if not first_page["documents"]:
+        raise RuntimeError("The database has no approved documents to list")
+    subject = first_page["documents"][0]["subject_id"]
+    second = PageParams(cursor=first_page["next_cursor"], limit=settings.default_page_size, fields=None)
+    
+    return {
+        "user_lookup": lambda: fetch_user(user_id),
+        "catalog_first_page": lambda: catalog_page(None, None, None, columns, first),
+        "catalog_next_page": lambda: catalog_page(None, None, None, columns, second),
+        "catalog_subject": lambda: catalog_page(subject, None, None, columns, first),
+        "catalog_search": lambda: catalog_page(None, None, "a", columns, first),
+    }
+
+async def flush_case(batch_size: int) -> Callable[[], Awaitable[Any]]:
+    """One download-event flush: bulk insert plus the counter update"""
+    user = await database.execute(database.get_supabase().table("users").select("id").limit(1))
+    columns = select_fields("id", DOCUMENT_FIELDS)
+    page = await catalog_page(None, None, None, columns, PageParams(cursor=None, limit=20, fields="id"))
+    document_ids = [document["id"] for document in page["documents"]]
+    buffer = DownloadEventBuffer(max_size=batch_size, batch_size=batch_size, flush_interval=1.0, put_timeout=1.0)
+    
+    def batch() -> List[dict]:
+        return [{
+            "user_id": user.data[0]["id"],
+            "document_id": document_ids[i % len(document_ids)],
+            "downloaded_at": datetime.utcnow().isoformat(),
+            "ip_address": "127.0.0.1",
+            "user_agent": f"benchmarks.direct_db/{uuid.uuid4().hex[:8]}"
+        } for i in range(batch_size)]
+    
+    return lambda: buffer._flush(batch())
+
+def print_results(results: dict):
+    print(f"\n{'query':<20} {'path':<10} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'p50 speedup':>12}")
+    for name, case in results["cases"].items():
+        for path in PATHS:
+            result = case[path]
+            latency = result["latency_ms"]
+            speedup = f"{case['speedup_p50']:.2f}x" if path == "direct" else ""
+            print(
+                f"{name:<20} {path:<10} {result['throughput_rps']:>9.1f} {latency['p50']:>9.2f}"
+                f" {latency['p95']:>9.2f} {latency['p99']:>9.2f} {speedup:>12}"
+            )
+
+async def main(args) -> int:
+    if not settings.database_url:
+        print("Set DATABASE_URL (and SUPABASE_URL / SUPABASE_KEY) to the database to benchmark")
+        return 2
+    
+    direct_db.enabled = True
+    try:
+        await direct_db.start()
+        cases = await read_cases()
+        
+        # Both paths must return the same rows before their speed means anything
+        mismatched = []
+        for name, call in cases.items():
+            results = {}
+            for path, enabled in PATHS.items():
+                direct_db.enabled = enabled
+                results[path] = await call()
+            if results["direct"] != results["postgrest"]:
+                mismatched.append(name)
+        if mismatched:
+            print(f"Results differ between PostgREST and the direct pool: {', '.join(mismatched)}")
+            return 1
+        
+        if args.writes:
+            cases["download_flush"] = await flush_case(args.batch_size)
+        
+        results = {
+            "commit": git_commit(),
+            "config": {
+                "requests": args.requests,
+                "concurrency": args.concurrency,
+                "db_pool_size": settings.db_pool_size,
+                "direct_db_pool_size": settings.direct_db_pool_size,
+                "statement_cache_size": settings.direct_db_statement_cache_size
+            },
+            "cases": {}
+        }
+        for name, call in cases.items():
+            case = {}
+            for path, enabled in PATHS.items():
+                direct_db.enabled = enabled
+                await measure(call, args.warmup, args.concurrency)
+                case[path] = await measure(call, args.requests, args.concurrency)
+            case["speedup_p50"] = round(case["postgrest"]["latency_ms"]["p50"] / max(case["direct"]["latency_ms"]["p50"], 0.001), 2)
+            results["cases"][name] = case
+    finally:
+        await direct_db.close()
+        database.shutdown_executor()
+    
+    print_results(results)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.output}")
+    return 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the hot queries over the direct Postgres pool and PostgREST")
+    parser.add_argument("--requests", type=int, default=500, help="Measured calls per query and path")
+    parser.add_argument("--warmup", type=int, default=50, help="Unmeasured calls before each measurement")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--writes", action="store_true", help="Also benchmark download flushes (writes real rows)")
+    parser.add_argument("--batch-size", type=int, default=settings.download_batch_size, help="Events per flush with --writes")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,93 @@
+# Import-time budget: how long a fresh process takes to import the app
+#
+# Imports app.main in new interpreters and fails (exit 1) when the median
+# exceeds the budget, or when importing created a database client or opened
+# a connection, which belongs in the lifespan instead. Also lists the
+# slowest modules so a regression points at its cause. Run it from the
+# backend directory (in CI, with a budget that suits the runner):
+#
+#     python -m benchmarks.import_time [--budget 1.5] [--runs 5] [--top 10]
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+# Runs in the child: time the import, then check nothing was connected
+PROBE = """
+import time
+started = time.perf_counter()
+import app.main
+elapsed = time.perf_counter() - started
+from app import database
+print(elapsed, len(database._clients), database._executor is not None)
+"""
+
+def run_once() -> Tuple[float, int, bool, Dict[str, int]]:
+    env = {
+        **os.environ,
+        # An address nothing listens on: an import that connects would fail or hang here
+        "SUPABASE_URL": "http://127.0.0.1:9",
+        "SUPABASE_KEY": "eyJhbGciOiJIUzI1NiJ9.e30.import-time",
+        "SUPABASE_SERVICE_KEY": "eyJhbGciOiJIUzI1NiJ9.e30.import-time",
+    }
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", PROBE],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, timeout=120
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing the app failed:\n{result.stderr[-2000:]}")
+    
+    elapsed, clients, executor = result.stdout.split()
+    
+    # -X importtime lines: "import time: self [us] | cumulative | module"
+    modules = {}
+    for line in result.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line and "cumulative" not in line:
+            _, cumulative, name = line.split("|")
+            modules[name.strip()] = int(cumulative)
+    return float(elapsed), int(clients), executor == "True", modules
+
+def main(budget: float, runs: int, top: int) -> int:
+    times: List[float] = []
+    slowest: Dict[str, List[int]] = {}
+    failures = []
+    for _ in range(runs):
+        elapsed, clients, executor, modules = run_once()
+        times.append(elapsed)
+        for name, cumulative in modules.items():
+            slowest.setdefault(name, []).append(cumulative)
+        if clients:
+            failures.append(f"importing the app created {clients} Supabase client(s)")
+        if executor:
+            failures.append("importing the app started the database thread pool")
+    
+    median = statistics.median(times)
+    print(f"import app.main: median {median:.3f}s, min {min(times):.3f}s, max {max(times):.3f}s over {runs} runs")
+    
+    # Top-level app modules and third-party packages, by median cumulative time
+    ranked = sorted(
+        ((statistics.median(values) / 1e6, name) for name, values in slowest.items() if "." not in name or name.startswith("app.")),
+        reverse=True
+    )
+    print("Slowest imports (cumulative):")
+    for seconds, name in ranked[:top]:
+        print(f"  {seconds:7.3f}s  {name}")
+    
+    if median > budget:
+        failures.append(f"median import time {median:.3f}s is over the {budget:g}s budget")
+    for failure in dict.fromkeys(failures):
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check the app's import time against a budget")
+    parser.add_argument("--budget", type=float, default=float(os.getenv("IMPORT_BUDGET_SECONDS", "1.5")), help="Seconds")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="Slowest modules to list")
+    args = parser.parse_args()
+    sys.exit(main(args.budget, args.runs, args.top))
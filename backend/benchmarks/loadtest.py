@@ -0,0 +1,397 @@
+# Load test: throughput, latency and memory of the API under realistic traffic
+#
+# Starts the Supabase stand-in (benchmarks/standin.py) seeded with synthetic
+# users, subjects and documents, starts the API against it with uvicorn, then
+# runs each scenario for a fixed time with a fixed number of concurrent
+# clients. Every client loops: pick an action by the scenario's weights, send
+# it, record the latency. Reports requests per second, p50/p95/p99 latency and
+# the API's peak RSS per scenario, and writes them as JSON so runs on
+# different commits can be compared. Run it from the backend directory:
+#
+#     python -m benchmarks.loadtest [--documents 100000] [--concurrency 16] [--duration 15] \
+#         [--scenarios browse,search,mixed] [--output results.json] [--compare baseline.json]
+#
+# The stand-in, the API and the load generator are separate processes; on a
+# small machine they compete for CPU, so compare results from the same
+# machine only. Settings in the environment (DB_POOL_SIZE, REDIS_URL, ...) are
+# passed through to the API.
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import httpx
+
+from benchmarks import standin
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+# supabase-py only accepts JWT-shaped keys; the stand-in doesn't check them
+ANON_KEY = "eyJhbGciOiJIUzI1NiJ9.eyJyb2xlIjoiYW5vbiJ9.loadtest"
+SERVICE_KEY = "eyJhbGciOiJIUzI1NiJ9.eyJyb2xlIjoic2VydmljZV9yb2xlIn0.loadtest"
+
+# Action weights per scenario
+SCENARIOS = {
+    "login": {"login": 1},
+    "browse": {"browse": 1},
+    "search": {"search": 1},
+    "download": {"download": 1},
+    "upload": {"upload": 1},
+    "mixed": {"browse": 50, "search": 20, "download": 20, "upload": 5, "login": 5},
+}
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def git_commit() -> Optional[str]:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=BACKEND_DIR, capture_output=True, text=True).stdout.strip()
+        return commit + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def rss_mb(pid: int) -> Optional[float]:
+    """Resident set size of a process (Linux only)"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+    return None
+
+def child_pids(pid: int) -> List[int]:
+    pids = []
+    try:
+        for task in os.listdir(f"/proc/{pid}/task"):
+            with open(f"/proc/{pid}/task/{task}/children") as f:
+                pids += [int(child) for child in f.read().split()]
+    except OSError:
+        pass
+    return pids
+
+def percentile(latencies: List[float], p: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    return latencies[min(len(latencies) - 1, int(len(latencies) * p))] if latencies else 0.0
+
+def summarize(latencies: List[float]) -> Dict[str, float]:
+    latencies = sorted(latencies)
+    return {
+        "p50": round(percentile(latencies, 0.50), 2),
+        "p95": round(percentile(latencies, 0.95), 2),
+        "p99": round(percentile(latencies, 0.99), 2),
+        "mean": round(sum(latencies) / len(latencies), 2) if latencies else 0.0,
+        "max": round(latencies[-1], 2) if latencies else 0.0
+    }
+
+async def wait_until_ready(url: str, process: subprocess.Popen, timeout: float):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(timeout=2) as client:
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError(f"{url} exited with code {process.returncode}")
+            try:
+                await client.get(url)
+                return
+            except httpx.HTTPError:
+                await asyncio.sleep(0.25)
+    raise RuntimeError(f"{url} did not start within {timeout:.0f}s")
+
+class Traffic:
+    """The requests one client sends for each kind of action"""
+    
+    def __init__(self, client: httpx.AsyncClient, args, tokens: List[str], rng: random.Random):
+        self.client = client
+        self.args = args
+        self.tokens = tokens
+        self.rng = rng
+        self.cursors: List[str] = []
+        self.terms = standin.search_terms()
+    
+    def headers(self) -> dict:
+        return {"Authorization": f"Bearer {self.rng.choice(self.tokens)}"}
+    
+    def approved_document(self) -> str:
+        while True:
+            index = self.rng.randrange(self.args.documents)
+            if standin.is_approved(index):
+                return standin.document_id(index)
+    
+    async def login(self) -> httpx.Response:
+        email = standin.user_email(self.rng.randrange(self.args.users))
+        return await self.client.post("/api/auth/login", json={"email": email, "password": standin.PASSWORD})
+    
+    async def browse(self) -> httpx.Response:
+        # Mostly first pages (optionally by subject), then deeper pages and detail views
+        choice = self.rng.random()
+        if choice < 0.25 and self.cursors:
+            params = {"cursor": self.cursors.pop(self.rng.randrange(len(self.cursors)))}
+        elif choice < 0.45:
+            return await self.client.get(f"/api/documents/{self.approved_document()}", headers=self.headers())
+        else:
+            params = {"subject": self.rng.choice(list(standin.SUBJECTS))} if self.rng.random() < 0.6 else {}
+        params["limit"] = 20
+        
+        response = await self.client.get("/api/documents/", params=params, headers=self.headers())
+        if response.status_code == 200 and response.json().get("next_cursor") and len(self.cursors) < 100:
+            self.cursors.append(response.json()["next_cursor"])
+        return response
+    
+    async def search(self) -> httpx.Response:
+        words = self.rng.sample(self.terms, self.rng.choice((1, 1, 2)))
+        params = {"q": " ".join(words), "limit": 20}
+        if self.rng.random() < 0.3:
+            params["subject"] = self.rng.choice(list(standin.SUBJECTS))
+        return await self.client.get("/api/documents/search", params=params, headers=self.headers())
+    
+    async def download(self) -> httpx.Response:
+        return await self.client.post(f"/api/documents/{self.approved_document()}/download", headers=self.headers())
+    
+    async def upload(self) -> httpx.Response:
+        # Unique content each time, so every upload stores a new blob
+        content = b"%PDF-1.4\n" + os.urandom(self.args.upload_kb * 1024)
+        data = {
+            "title": f"{self.rng.choice(self.terms).capitalize()} yuklama",
+            "subject_id": self.rng.choice(list(standin.SUBJECTS)),
+            "description": "Load test upload",
+            "tags": "benchmark"
+        }
+        files = {"file": ("loadtest.pdf", content, "application/pdf")}
+        return await self.client.post("/api/documents/", data=data, files=files, headers=self.headers())
+
+async def run_scenario(name: str, weights: Dict[str, int], args, base_url: str, tokens: List[str], api_pid: int) -> dict:
+    actions, action_weights = list(weights), list(weights.values())
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    statuses: Counter = Counter()
+    errors = 0
+    measuring = False
+    stop = asyncio.Event()
+    
+    async def client_loop(worker: int):
+        nonlocal errors
+        rng = random.Random(args.seed * 1000 + worker)
+        limits = httpx.Limits(max_connections=1)
+        async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as client:
+            traffic = Traffic(client, args, tokens, rng)
+            while not stop.is_set():
+                action = rng.choices(actions, action_weights)[0]
+                started = time.perf_counter()
+                try:
+                    response = await getattr(traffic, action)()
+                    status = response.status_code
+                except httpx.HTTPError as e:
+                    status = type(e).__name__
+                elapsed = (time.perf_counter() - started) * 1000
+                if measuring:
+                    latencies[action].append(elapsed)
+                    statuses[str(status)] += 1
+                    if not isinstance(status, int) or status >= 400:
+                        errors += 1
+    
+    async def sample_rss():
+        peak, peak_total = 0.0, 0.0
+        while not stop.is_set():
+            rss = rss_mb(api_pid) or 0.0
+            total = rss + sum(rss_mb(child) or 0.0 for child in child_pids(api_pid))
+            peak, peak_total = max(peak, rss), max(peak_total, total)
+            await asyncio.sleep(0.1)
+        return peak, peak_total
+    
+    clients = [asyncio.create_task(client_loop(worker)) for worker in range(args.concurrency)]
+    await asyncio.sleep(args.warmup)
+    
+    measuring = True
+    sampler = asyncio.create_task(sample_rss())
+    started = time.perf_counter()
+    await asyncio.sleep(args.duration)
+    measuring = False
+    elapsed = time.perf_counter() - started
+    
+    stop.set()
+    await asyncio.gather(*clients)
+    peak_rss, peak_rss_total = await sampler
+    
+    everything = [latency for values in latencies.values() for latency in values]
+    return {
+        "requests": len(everything),
+        "errors": errors,
+        "statuses": dict(sorted(statuses.items())),
+        "throughput_rps": round(len(everything) / elapsed, 2),
+        "latency_ms": summarize(everything),
+        "actions": {
+            action: {"requests": len(values), "latency_ms": summarize(values)}
+            for action, values in sorted(latencies.items())
+        },
+        "peak_rss_mb": round(peak_rss, 1),
+        "peak_rss_with_workers_mb": round(peak_rss_total, 1)
+    }
+
+async def sign_in(base_url: str, args) -> List[str]:
+    """Access tokens for a few seeded users, shared by the simulated clients"""
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout) as client:
+        tokens = []
+        for index in range(min(args.sessions, args.users)):
+            response = await client.post("/api/auth/login", json={"email": standin.user_email(index), "password": standin.PASSWORD})
+            response.raise_for_status()
+            tokens.append(response.json()["access_token"])
+        return tokens
+
+def print_results(results: dict):
+    print(f"\n{'scenario':<10} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7} {'peak RSS':>10}")
+    for name, result in results["scenarios"].items():
+        latency = result["latency_ms"]
+        print(
+            f"{name:<10} {result['throughput_rps']:>9.1f} {latency['p50']:>9.1f} {latency['p95']:>9.1f}"
+            f" {latency['p99']:>9.1f} {result['errors']:>7} {result['peak_rss_mb']:>7.1f} MB"
+        )
+
+def compare(results: dict, baseline_path: str, max_regression: Optional[float]) -> bool:
+    """Print changes against an earlier run; False if any exceed ``max_regression`` percent"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    
+    print(f"\nCompared with {baseline.get('commit') or baseline_path}:")
+    if baseline.get("config") != results["config"]:
+        print("  (the runs used different settings, so the numbers aren't directly comparable)")
+    ok = True
+    for name, result in results["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(name)
+        if not before:
+            continue
+        changes = {
+            "req/s": (before["throughput_rps"], result["throughput_rps"], -1),
+            "p95": (before["latency_ms"]["p95"], result["latency_ms"]["p95"], 1),
+            "p99": (before["latency_ms"]["p99"], result["latency_ms"]["p99"], 1),
+            "RSS": (before["peak_rss_mb"], result["peak_rss_mb"], 1),
+        }
+        parts = []
+        for label, (old, new, worse) in changes.items():
+            change = (new - old) / old * 100 if old else 0.0
+            regressed = max_regression is not None and change * worse > max_regression
+            ok = ok and not regressed
+            parts.append(f"{label} {change:+6.1f}%{' !' if regressed else ''}")
+        print(f"  {name:<10} " + "   ".join(parts))
+    return ok
+
+async def main(args) -> int:
+    unknown = [name for name in args.scenarios if name not in SCENARIOS]
+    if unknown:
+        print(f"Unknown scenarios: {', '.join(unknown)} (choose from {', '.join(SCENARIOS)})")
+        return 2
+    
+    with tempfile.TemporaryDirectory(prefix="sukun-loadtest-") as workdir:
+        standin_port, api_port = free_port(), free_port()
+        standin_url = f"http://127.0.0.1:{standin_port}"
+        base_url = f"http://127.0.0.1:{api_port}"
+        log_path = Path(workdir) / "api.log"
+        
+        env = {
+            **os.environ,
+            "SUPABASE_URL": standin_url,
+            "SUPABASE_KEY": ANON_KEY,
+            "SUPABASE_SERVICE_KEY": SERVICE_KEY,
+            "JWT_SECRET": "loadtest-secret",
+            "ACCESS_TOKEN_MINUTES": "240",
+            "BCRYPT_ROUNDS": str(args.bcrypt_rounds),
+            "STORAGE_BACKEND": "supabase",
+            "STORAGE_BUCKET": "documents",
+            "JOB_DB_PATH": str(Path(workdir) / "jobs.sqlite3"),
+            "UPLOAD_SESSION_DIR": str(Path(workdir) / "sessions"),
+        }
+        
+        print(f"Seeding the stand-in with {args.users} users and {args.documents} documents...")
+        standin_process = subprocess.Popen([
+            sys.executable, "-m", "benchmarks.standin", "--port", str(standin_port),
+            "--users", str(args.users), "--documents", str(args.documents), "--seed", str(args.seed),
+            "--bcrypt-rounds", str(args.bcrypt_rounds), "--latency-ms", str(args.latency_ms)
+        ], cwd=BACKEND_DIR)
+        api_process = None
+        
+        try:
+            await wait_until_ready(f"{standin_url}/rest/v1/subjects?select=id", standin_process, timeout=600)
+            
+            with open(log_path, "w") as log:
+                api_process = subprocess.Popen([
+                    sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(api_port),
+                    "--log-level", "warning", "--no-access-log"
+                ], cwd=BACKEND_DIR, env=env, stdout=log, stderr=subprocess.STDOUT)
+            started = time.perf_counter()
+            await wait_until_ready(f"{base_url}/api/health", api_process, timeout=120)
+            print(f"API ready in {time.perf_counter() - started:.1f}s, idle RSS {rss_mb(api_process.pid) or 0:.1f} MB")
+            
+            tokens = await sign_in(base_url, args)
+            results = {
+                "commit": git_commit(),
+                "started_at": datetime.utcnow().isoformat() + "Z",
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "cpus": os.cpu_count(),
+                "config": {
+                    key: getattr(args, key) for key in (
+                        "users", "documents", "concurrency", "duration", "warmup", "latency_ms",
+                        "bcrypt_rounds", "upload_kb", "sessions", "seed"
+                    )
+                },
+                "scenarios": {}
+            }
+            
+            for name in args.scenarios:
+                print(f"Running {name} ({args.concurrency} clients, {args.duration:g}s)...")
+                results["scenarios"][name] = await run_scenario(name, SCENARIOS[name], args, base_url, tokens, api_process.pid)
+        except Exception:
+            if log_path.exists():
+                print("API log (last lines):\n" + "".join(log_path.read_text().splitlines(True)[-30:]))
+            raise
+        finally:
+            for process in (api_process, standin_process):
+                if process is not None and process.poll() is None:
+                    process.terminate()
+                    try:
+                        process.wait(timeout=30)
+                    except subprocess.TimeoutExpired:
+                        process.kill()
+    
+    print_results(results)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.output}")
+    if args.compare and not compare(results, args.compare, args.max_regression):
+        print(f"Regression beyond {args.max_regression:g}%")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load-test the API against a local Supabase stand-in")
+    parser.add_argument("--scenarios", type=lambda value: value.split(","), default=list(SCENARIOS),
+                        help=f"Comma-separated, from: {', '.join(SCENARIOS)}")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--documents", type=int, default=100_000)
+    parser.add_argument("--concurrency", type=int, default=16, help="Simulated clients, each with one connection")
+    parser.add_argument("--duration", type=float, default=15.0, help="Measured seconds per scenario")
+    parser.add_argument("--warmup", type=float, default=3.0, help="Unmeasured seconds before each scenario")
+    parser.add_argument("--latency-ms", type=float, default=2.0, help="Simulated round trip to Supabase")
+    parser.add_argument("--bcrypt-rounds", type=int, default=12)
+    parser.add_argument("--upload-kb", type=int, default=256, help="Size of each uploaded file")
+    parser.add_argument("--sessions", type=int, default=8, help="Signed-in users shared by the clients")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--compare", help="Earlier JSON results to compare against")
+    parser.add_argument("--max-regression", type=float, help="With --compare, exit 1 if a metric is this many percent worse")
+    sys.exit(asyncio.run(main(parser.parse_args())))
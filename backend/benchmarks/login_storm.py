@@ -0,0 +1,85 @@
+# Login storm: /api/health latency while the API is flooded with logins
+#
+# Samples /api/health on its own for a few seconds, then again while many
+# clients log in at once, and compares the latencies. With password hashing
+# off the event loop the health check should barely move; logins beyond the
+# hashing pool's queue limit are answered with 503 rather than piling up.
+# Run it against a server with a real account:
+#
+#     python -m benchmarks.login_storm --email user@example.com --password secret \
+#         [--base-url http://localhost:8000] [--logins 200] [--concurrency 50]
+import argparse
+import asyncio
+import statistics
+import time
+from collections import Counter
+from typing import List
+
+import httpx
+
+async def sample_health(client: httpx.AsyncClient, stop: asyncio.Event, interval: float) -> List[float]:
+    latencies = []
+    while not stop.is_set():
+        started = time.perf_counter()
+        response = await client.get("/api/health")
+        response.raise_for_status()
+        latencies.append((time.perf_counter() - started) * 1000)
+        await asyncio.sleep(interval)
+    return latencies
+
+def summarize(label: str, latencies: List[float]):
+    latencies = sorted(latencies)
+    percentile = lambda p: latencies[min(len(latencies) - 1, int(len(latencies) * p))]
+    print(
+        f"  {label:<14} n={len(latencies):<5} p50={statistics.median(latencies):7.1f} ms"
+        f"  p95={percentile(0.95):7.1f} ms  p99={percentile(0.99):7.1f} ms  max={latencies[-1]:7.1f} ms"
+    )
+
+async def login_storm(client: httpx.AsyncClient, args) -> Counter:
+    statuses = Counter()
+    semaphore = asyncio.Semaphore(args.concurrency)
+    
+    async def login():
+        async with semaphore:
+            try:
+                response = await client.post("/api/auth/login", json={"email": args.email, "password": args.password})
+                statuses[response.status_code] += 1
+            except httpx.HTTPError as e:
+                statuses[type(e).__name__] += 1
+    
+    await asyncio.gather(*(login() for _ in range(args.logins)))
+    return statuses
+
+async def main(args):
+    limits = httpx.Limits(max_connections=args.concurrency + 5)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=60, limits=limits) as storm_client, \
+            httpx.AsyncClient(base_url=args.base_url, timeout=60) as health_client:
+        stop = asyncio.Event()
+        baseline = asyncio.create_task(sample_health(health_client, stop, args.interval))
+        await asyncio.sleep(args.baseline_seconds)
+        stop.set()
+        baseline_latencies = await baseline
+        
+        stop = asyncio.Event()
+        under_load = asyncio.create_task(sample_health(health_client, stop, args.interval))
+        started = time.perf_counter()
+        statuses = await login_storm(storm_client, args)
+        elapsed = time.perf_counter() - started
+        stop.set()
+        load_latencies = await under_load
+    
+    print(f"{args.logins} logins ({args.concurrency} concurrent) in {elapsed:.1f}s: {dict(statuses)}")
+    print("/api/health latency:")
+    summarize("idle", baseline_latencies)
+    summarize("login storm", load_latencies)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure health check latency during a login storm")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--email", required=True)
+    parser.add_argument("--password", required=True)
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--interval", type=float, default=0.05, help="Seconds between health checks")
+    parser.add_argument("--baseline-seconds", type=float, default=3.0)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,73 @@
+-- Search benchmark: ILIKE listing filter vs. full-text search_documents()
+--
+-- Seeds a synthetic 100k-document corpus (mixed Latin/Cyrillic Uzbek titles)
+-- inside a transaction that is rolled back, so it is safe to run against a
+-- development database that already has supabase-schema.sql applied:
+--
+--     psql "$DATABASE_URL" -f benchmarks/search_benchmark.sql
+--
+-- Reports the average latency of each query over several runs. The ILIKE
+-- path returns every match (as the listing endpoint does); search_documents
+-- returns the first ranked page of 20.
+
+BEGIN;
+
+\set corpus_size 100000
+\set runs 10
+
+-- Synthetic corpus
+INSERT INTO documents (title, description, subject_id, format, file_path, status, author, tags)
+SELECT
+    initcap(w1.word) || ' ' || w2.word || ' ' || (n % 97)::text,
+    'Ma''ruza: ' || w2.word || ' va ' || w3.word || '. ' || repeat('Qo''shimcha matn. ', 5),
+    (ARRAY['mathematics', 'physics', 'chemistry', 'biology', 'history', 'geography', 'literature', 'english'])[1 + n % 8],
+    (ARRAY['pdf', 'pptx', 'docx', 'xlsx'])[1 + n % 4],
+    'benchmark/' || n || '.pdf',
+    CASE WHEN n % 11 = 0 THEN 'pending' ELSE 'approved' END,
+    (ARRAY['Karimov', 'Aliyeva', 'Тошматов', 'Rahimova'])[1 + n % 4],
+    ARRAY[w3.word, w1.word]
+FROM generate_series(1, :corpus_size) AS n
+CROSS JOIN LATERAL (SELECT (ARRAY['matematika', 'fizika', 'kimyo', 'biologiya', 'tarix', 'математика', 'физика', 'тарих', 'adabiyot', 'geometriya'])[1 + (n * 7) % 10] AS word) w1
+CROSS JOIN LATERAL (SELECT (ARRAY['asoslari', 'laboratoriya', 'maʼruzalar', 'mashqlar', 'nazariya', 'амалиёт', 'imtihon', 'savollar', 'taqdimot', 'qo''llanma'])[1 + (n * 13) % 10] AS word) w2
+CROSS JOIN LATERAL (SELECT (ARRAY['algebra', 'mexanika', 'optika', 'genetika', 'ekologiya', 'grammatika', 'statistika', 'termodinamika'])[1 + (n * 31) % 8] AS word) w3;
+
+ANALYZE documents;
+
+SELECT set_config('benchmark.runs', :'runs', true);
+
+CREATE TEMP TABLE benchmark_results (path TEXT, query TEXT, avg_ms NUMERIC, rows_returned INTEGER);
+
+DO $$
+DECLARE
+    queries TEXT[] := ARRAY['matematika', 'fizika laboratoriya', 'mexanika', 'qo''llanma', 'matematka'];
+    q TEXT;
+    started TIMESTAMP;
+    elapsed_ms NUMERIC;
+    row_count INTEGER;
+    runs INTEGER := current_setting('benchmark.runs')::INTEGER;
+BEGIN
+    FOREACH q IN ARRAY queries LOOP
+        -- Current path: GET /api/documents/?search=...
+        started := clock_timestamp();
+        FOR i IN 1..runs LOOP
+            SELECT count(*) INTO row_count FROM (
+                SELECT * FROM documents WHERE status = 'approved' AND title ILIKE '%' || q || '%'
+            ) s;
+        END LOOP;
+        elapsed_ms := extract(epoch FROM clock_timestamp() - started) * 1000 / runs;
+        INSERT INTO benchmark_results VALUES ('ilike', q, round(elapsed_ms, 2), row_count);
+
+        -- New path: GET /api/documents/search?q=... (first page)
+        started := clock_timestamp();
+        FOR i IN 1..runs LOOP
+            SELECT count(*) INTO row_count FROM search_documents(q, NULL, NULL, 20, 0);
+        END LOOP;
+        elapsed_ms := extract(epoch FROM clock_timestamp() - started) * 1000 / runs;
+        INSERT INTO benchmark_results VALUES ('fts', q, round(elapsed_ms, 2), row_count);
+    END LOOP;
+END;
+$$;
+
+SELECT path, query, avg_ms, rows_returned FROM benchmark_results ORDER BY query, path;
+
+ROLLBACK;
@@ -0,0 +1,671 @@
+# Local stand-in for Supabase (PostgREST and Storage) used by the load tests
+#
+# An in-memory Starlette app answering the subset of the PostgREST and
+# Storage APIs the API uses, so it can be benchmarked without a Supabase
+# project. It is not a database: filters, ordering and the RPCs the API calls
+# are implemented just well enough to return realistic rows, and an optional
+# fixed delay stands in for the network round trip. Seeded data is
+# deterministic, so the helpers below give the load test the same emails and
+# ids. It can also be run on its own:
+#
+#     python -m benchmarks.standin [--port 54321] [--documents 100000] [--latency-ms 5]
+import argparse
+import asyncio
+import bisect
+import random
+import re
+import uuid
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import uvicorn
+from passlib.context import CryptContext
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+PASSWORD = "benchmark-password"
+SUBJECTS = {
+    "mathematics": ("Matematika", ["algebra", "geometriya", "integral", "matritsa", "funksiya", "limit", "ehtimollik", "statistika"]),
+    "physics": ("Fizika", ["mexanika", "optika", "elektr", "kvant", "termodinamika", "tebranish", "magnit", "atom"]),
+    "chemistry": ("Kimyo", ["organik", "anorganik", "reaksiya", "kislota", "polimer", "eritma", "katalizator", "element"]),
+    "biology": ("Biologiya", ["hujayra", "genetika", "ekologiya", "evolyutsiya", "anatomiya", "botanika", "zoologiya", "oqsil"]),
+    "history": ("Tarix", ["temuriylar", "qadimgi", "mustaqillik", "sivilizatsiya", "arxeologiya", "xonliklar", "urush", "madaniyat"]),
+    "geography": ("Geografiya", ["iqlim", "relyef", "aholi", "xarita", "daryo", "tuproq", "iqtisodiy", "materik"]),
+    "literature": ("Adabiyot", ["navoiy", "roman", "sheriyat", "hikoya", "doston", "drama", "tanqid", "folklor"]),
+    "english": ("Ingliz tili", ["grammar", "vocabulary", "reading", "writing", "listening", "tenses", "essay", "speaking"]),
+}
+KINDS = ["ma'ruza", "amaliyot", "seminar", "test", "konspekt", "taqdimot", "laboratoriya", "qo'llanma"]
+FORMATS = ["pdf", "pdf", "pdf", "pptx", "docx", "ppt", "doc", "xlsx"]
+SEED_EPOCH = datetime(2023, 1, 1)
+
+def user_id(index: int) -> str:
+    return str(uuid.UUID(int=(1 << 40) + index, version=4))
+
+def user_email(index: int) -> str:
+    return f"user{index}@bench.sukunslide.uz"
+
+def document_id(index: int) -> str:
+    return str(uuid.UUID(int=(2 << 40) + index, version=4))
+
+def is_approved(index: int) -> bool:
+    """Every twentieth seeded document is still waiting for review"""
+    return index % 20 != 0
+
+def search_terms() -> List[str]:
+    """Words that appear in seeded titles, for search traffic"""
+    return [word for _, words in SUBJECTS.values() for word in words] + KINDS
+
+# Primary keys that aren't ``id``, and columns with an equality index
+PRIMARY_KEYS = {
+    "subjects": "id", "document_blobs": "content_hash", "system_settings": "key",
+    "revoked_tokens": "jti", "stat_counters": "name"
+}
+INDEXES = {"users": ("email",), "documents": ("content_hash", "file_path")}
+DEFAULTS = {
+    "users": {"university": None, "phone": None, "role": "user", "status": "active"},
+    "documents": {"download_count": 0, "status": "pending", "preview_status": "pending", "text_status": "pending"},
+    "document_blobs": {"ref_count": 0, "deleting_at": None},
+}
+
+def _now() -> str:
+    return datetime.utcnow().isoformat()
+
+def _words(text: Optional[str]) -> List[str]:
+    return re.findall(r"[\w']+", (text or "").lower())
+
+def _sort_value(value: Any) -> Tuple[bool, Any]:
+    return (value is not None, value if value is not None else 0)
+
+class Table:
+    """Rows in insertion order, a primary-key map and sorted views built on demand"""
+    
+    def __init__(self, name: str):
+        self.name = name
+        self.key = PRIMARY_KEYS.get(name, "id")
+        self.rows: List[dict] = []
+        self.by_key: Dict[Any, dict] = {}
+        self.indexes: Dict[str, Dict[Any, List[dict]]] = {column: defaultdict(list) for column in INDEXES.get(name, ())}
+        self._views: Dict[Tuple[str, ...], Tuple[list, List[dict]]] = {}
+    
+    def _sort_key(self, row: dict, columns: Tuple[str, ...]) -> tuple:
+        return tuple(_sort_value(row.get(column)) for column in columns)
+    
+    def insert(self, row: dict) -> dict:
+        row = {**DEFAULTS.get(self.name, {}), **row}
+        if self.key == "id":
+            row.setdefault("id", str(uuid.uuid4()))
+        if self.name not in ("revoked_tokens", "stat_counters"):
+            row.setdefault("created_at", _now())
+        self.rows.append(row)
+        self.by_key[row.get(self.key)] = row
+        for column, index in self.indexes.items():
+            index[row.get(column)].append(row)
+        # Keep sorted views current: an insert into a sorted list is a memmove
+        for columns, (keys, rows) in self._views.items():
+            sort_key = self._sort_key(row, columns)
+            position = bisect.bisect(keys, sort_key)
+            keys.insert(position, sort_key)
+            rows.insert(position, row)
+        return row
+    
+    def update(self, row: dict, values: dict):
+        if any(column in values for columns in self._views for column in columns):
+            self._views.clear()
+        for column, index in self.indexes.items():
+            if column in values and values[column] != row.get(column):
+                index[row.get(column)].remove(row)
+                index[values[column]].append(row)
+        row.update(values)
+    
+    def delete(self, doomed: List[dict]):
+        ids = {id(row) for row in doomed}
+        self.rows = [row for row in self.rows if id(row) not in ids]
+        for row in doomed:
+            self.by_key.pop(row.get(self.key), None)
+            for column, index in self.indexes.items():
+                index[row.get(column)].remove(row)
+        self._views.clear()
+    
+    def scan(self, order: List[Tuple[str, bool]], equal: Dict[str, Any]) -> Iterable[dict]:
+        """Candidate rows in the requested order, narrowed by an index when one applies"""
+        if self.key in equal:
+            row = self.by_key.get(equal[self.key])
+            return [row] if row is not None else []
+        columns = tuple(column for column, _ in order)
+        for column, index in self.indexes.items():
+            if column in equal:
+                rows = list(index.get(equal[column], []))
+                if order:
+                    rows.sort(key=lambda r: self._sort_key(r, columns), reverse=order[0][1])
+                return rows
+        if not order:
+            return self.rows
+        
+        directions = {desc for _, desc in order}
+        if len(directions) > 1:
+            rows = list(self.rows)
+            for column, desc in reversed(order):
+                rows.sort(key=lambda r: _sort_value(r.get(column)), reverse=desc)
+            return rows
+        
+        view = self._views.get(columns)
+        if view is None:
+            rows = sorted(self.rows, key=lambda r: self._sort_key(r, columns))
+            view = self._views[columns] = ([self._sort_key(r, columns) for r in rows], rows)
+        return reversed(view[1]) if directions.pop() else view[1]
+
+class Store:
+    """Tables, storage objects and a word index over document titles"""
+    
+    def __init__(self):
+        self.tables: Dict[str, Table] = {}
+        self.buckets: Dict[str, dict] = {}
+        self.objects: Dict[Tuple[str, str], Tuple[bytes, str, str]] = {}
+        self.words: Dict[str, set] = defaultdict(set)
+    
+    def table(self, name: str) -> Table:
+        if name not in self.tables:
+            self.tables[name] = Table(name)
+        return self.tables[name]
+    
+    def index_document(self, row: dict):
+        for word in _words(row.get("title")) + _words(row.get("description")) + [t.lower() for t in row.get("tags") or []]:
+            self.words[word].add(row["id"])
+    
+    def seed(self, users: int, documents: int, seed: int, bcrypt_rounds: int):
+        """Synthetic subjects, users (all sharing PASSWORD) and documents"""
+        rng = random.Random(seed)
+        password_hash = CryptContext(schemes=["bcrypt"], bcrypt__default_rounds=bcrypt_rounds).hash(PASSWORD)
+        
+        for subject_id, (name, _) in SUBJECTS.items():
+            self.table("subjects").insert({"id": subject_id, "name": name, "description": f"{name} fani"})
+        
+        for i in range(users):
+            self.table("users").insert({
+                "id": user_id(i), "email": user_email(i), "password_hash": password_hash,
+                "first_name": f"User{i}", "last_name": "Benchmark", "university": "Benchmark University",
+                "role": "admin" if i == 0 else "user", "status": "active",
+                "created_at": (SEED_EPOCH + timedelta(minutes=i)).isoformat()
+            })
+        
+        subject_ids = list(SUBJECTS)
+        for i in range(documents):
+            subject_id = rng.choice(subject_ids)
+            topic, kind = rng.choice(SUBJECTS[subject_id][1]), rng.choice(KINDS)
+            file_ext = rng.choice(FORMATS)
+            content_hash = f"{rng.getrandbits(256):064x}"
+            created_at = (SEED_EPOCH + timedelta(minutes=5 * i)).isoformat()
+            row = self.table("documents").insert({
+                "id": document_id(i),
+                "title": f"{topic.capitalize()} {kind} {i % 50 + 1}",
+                "description": f"{SUBJECTS[subject_id][0]}: {topic} bo'yicha {kind}",
+                "subject_id": subject_id,
+                "format": file_ext,
+                "file_path": f"/storage/v1/object/public/documents/{content_hash}.{file_ext}",
+                "file_size": rng.randint(50_000, 20_000_000),
+                "content_hash": content_hash,
+                "author": f"User{i % max(users, 1)} Benchmark",
+                "tags": [topic, kind],
+                "download_count": rng.randint(0, 500),
+                "status": "approved" if is_approved(i) else "pending",
+                "uploaded_by": user_id(i % max(users, 1)),
+                "preview_status": "ready",
+                "text_status": "ready",
+                "created_at": created_at,
+                "updated_at": created_at
+            })
+            self.index_document(row)
+            self.table("document_blobs").insert({
+                "content_hash": content_hash, "file_path": row["file_path"], "file_size": row["file_size"], "ref_count": 1
+            })
+        
+        self.add_bucket("documents")
+    
+    def add_bucket(self, bucket_id: str, public: bool = False) -> dict:
+        bucket = self.buckets[bucket_id] = {
+            "id": bucket_id, "name": bucket_id, "owner": "", "public": public, "file_size_limit": None,
+            "allowed_mime_types": None, "created_at": _now(), "updated_at": _now()
+        }
+        return bucket
+
+# PostgREST query parameters
+
+def _split(text: str) -> List[str]:
+    """Split on commas outside parentheses and double quotes"""
+    parts, depth, quoted, current = [], 0, False, []
+    for char in text:
+        if char == '"':
+            quoted = not quoted
+        elif not quoted and char == "(":
+            depth += 1
+        elif not quoted and char == ")":
+            depth -= 1
+        elif not quoted and depth == 0 and char == ",":
+            parts.append("".join(current))
+            current = []
+            continue
+        current.append(char)
+    if current:
+        parts.append("".join(current))
+    return parts
+
+def _unquote(value: str) -> str:
+    return value[1:-1] if len(value) >= 2 and value[0] == value[-1] == '"' else value
+
+def _coerce(value: str, sample: Any) -> Any:
+    if isinstance(sample, bool):
+        return value == "true"
+    if isinstance(sample, (int, float)):
+        try:
+            return float(value)
+        except ValueError:
+            return value
+    return value
+
+def _like(pattern: str, flags: int = 0) -> Callable[[Any], bool]:
+    regex = re.compile("^" + ".*".join(re.escape(part) for part in re.split(r"[%*]", pattern)) + "$", flags | re.S)
+    return lambda value: value is not None and regex.match(str(value)) is not None
+
+def _predicate(column: str, spec: str) -> Callable[[dict], bool]:
+    negate = spec.startswith("not.")
+    if negate:
+        spec = spec[4:]
+    operator, _, raw = spec.partition(".")
+    
+    if operator == "in":
+        values = {_unquote(v) for v in _split(raw.strip("()"))}
+        test = lambda value: value is not None and str(value) in values
+    elif operator == "is":
+        expected = {"null": None, "true": True, "false": False}[raw]
+        test = lambda value: value is expected
+    elif operator == "like":
+        test = _like(_unquote(raw))
+    elif operator == "ilike":
+        test = _like(_unquote(raw), re.I)
+    elif operator == "cs":
+        wanted = {_unquote(v) for v in _split(raw.strip("{}"))}
+        test = lambda value: value is not None and wanted <= set(value)
+    else:
+        compare = {
+            "eq": lambda a, b: a == b, "neq": lambda a, b: a != b, "lt": lambda a, b: a < b,
+            "lte": lambda a, b: a <= b, "gt": lambda a, b: a > b, "gte": lambda a, b: a >= b
+        }[operator]
+        raw = _unquote(raw)
+        
+        def test(value):
+            if value is None:
+                return False
+            try:
+                return compare(value, _coerce(raw, value) if not isinstance(value, str) else raw)
+            except TypeError:
+                return False
+    
+    if negate:
+        return lambda row: not test(row.get(column))
+    return lambda row: test(row.get(column))
+
+def _logic(operator: str, text: str) -> Callable[[dict], bool]:
+    """An ``or=(...)`` / ``and=(...)`` tree of conditions"""
+    predicates = []
+    for item in _split(text[1:-1]):
+        if item.startswith(("and(", "or(")):
+            name, _, rest = item.partition("(")
+            predicates.append(_logic(name, "(" + rest))
+        else:
+            column, _, spec = item.partition(".")
+            predicates.append(_predicate(column, spec))
+    if operator == "or":
+        return lambda row: any(p(row) for p in predicates)
+    return lambda row: all(p(row) for p in predicates)
+
+class Query:
+    """Filters, ordering, paging and projection parsed from a PostgREST request"""
+    
+    RESERVED = {"select", "order", "limit", "offset", "on_conflict", "columns"}
+    
+    def __init__(self, request: Request):
+        self.columns: Optional[List[str]] = None
+        self.order: List[Tuple[str, bool]] = []
+        self.limit: Optional[int] = None
+        self.offset = 0
+        self.equal: Dict[str, Any] = {}
+        self.predicates: List[Callable[[dict], bool]] = []
+        
+        for name, value in request.query_params.multi_items():
+            if name == "select":
+                columns = [c.strip() for c in _split(value)]
+                self.columns = None if "*" in columns else columns
+            elif name == "order":
+                for item in value.split(","):
+                    parts = item.split(".")
+                    self.order.append((parts[0], "desc" in parts[1:]))
+            elif name == "limit":
+                self.limit = int(value)
+            elif name == "offset":
+                self.offset = int(value)
+            elif name in ("or", "and"):
+                self.predicates.append(_logic(name, value))
+            elif name not in self.RESERVED:
+                if value.startswith("eq."):
+                    self.equal[name] = _unquote(value[3:])
+                self.predicates.append(_predicate(name, value))
+        
+        range_header = request.headers.get("range")
+        if range_header:
+            start, _, end = range_header.partition("-")
+            self.offset, self.limit = int(start), int(end) - int(start) + 1
+    
+    def matches(self, table: Table, page: bool = True) -> List[dict]:
+        rows, skipped = [], 0
+        for row in table.scan(self.order, self.equal):
+            if all(p(row) for p in self.predicates):
+                if page and skipped < self.offset:
+                    skipped += 1
+                    continue
+                rows.append(row)
+                if page and self.limit is not None and len(rows) >= self.limit:
+                    break
+        return rows
+    
+    def count(self, table: Table) -> int:
+        return sum(1 for row in table.scan([], self.equal) if all(p(row) for p in self.predicates))
+    
+    def project(self, row: dict) -> dict:
+        if self.columns is None:
+            return dict(row)
+        # Embedded resources (``users(first_name)``) aren't joined
+        return {column.split("(")[0]: row.get(column) if "(" not in column else None for column in self.columns}
+
+def _error(status: int, message: str, code: str = "PGRST000") -> JSONResponse:
+    return JSONResponse({"code": code, "message": message, "details": None, "hint": None}, status_code=status)
+
+# RPCs the API calls
+
+def _search_matches(store: Store, args: dict) -> List[dict]:
+    words = _words(args.get("p_query"))
+    if not words:
+        return []
+    documents = store.table("documents")
+    candidates = set.intersection(*(store.words.get(word, set()) for word in words))
+    rows = []
+    for document_id_ in candidates:
+        row = documents.by_key.get(document_id_)
+        if row is None or row.get("status") != "approved":
+            continue
+        if args.get("p_subject") and row.get("subject_id") != args["p_subject"]:
+            continue
+        if args.get("p_format") and row.get("format") != args["p_format"]:
+            continue
+        rows.append(row)
+    return rows
+
+def _highlight(text: Optional[str], words: List[str]) -> str:
+    if not text:
+        return ""
+    pattern = re.compile(r"\b(" + "|".join(re.escape(w) for w in words) + r")\b", re.I)
+    return pattern.sub(r"<mark>\1</mark>", text)
+
+def rpc_search_documents(store: Store, args: dict) -> List[dict]:
+    words = _words(args.get("p_query"))
+    # Newest first; ranking every match by relevance would make the stand-in the bottleneck
+    rows = sorted(_search_matches(store, args), key=lambda r: r["created_at"], reverse=True)
+    offset, limit = args.get("p_offset") or 0, args.get("p_limit") or 20
+    return [
+        {
+            **{column: row.get(column) for column in (
+                "id", "title", "description", "subject_id", "format", "author", "tags", "download_count", "file_size", "created_at"
+            )},
+            "rank": float(len(set(words) & set(_words(row["title"])))),
+            "title_highlight": _highlight(row["title"], words),
+            "description_highlight": _highlight(row.get("description"), words),
+            "content_highlight": ""
+        }
+        for row in rows[offset:offset + limit]
+    ]
+
+def rpc_search_document_facets(store: Store, args: dict) -> List[dict]:
+    rows = _search_matches(store, args)
+    facets = []
+    for facet in ("subject", "format"):
+        counts = Counter(row["subject_id" if facet == "subject" else "format"] for row in rows)
+        facets += [{"facet": facet, "value": value, "count": count} for value, count in counts.items()]
+    return facets
+
+def rpc_increment_download_counts(store: Store, args: dict) -> None:
+    documents = store.table("documents")
+    for document_id_, amount in zip(args["document_ids"], args["counts"]):
+        row = documents.by_key.get(document_id_)
+        if row is not None:
+            row["download_count"] = (row.get("download_count") or 0) + amount
+    return None
+
+def rpc_acquire_document_blob(store: Store, args: dict) -> List[dict]:
+    blobs = store.table("document_blobs")
+    blob = blobs.by_key.get(args["p_content_hash"])
+    if blob is None:
+        blob = blobs.insert({"content_hash": args["p_content_hash"], "file_path": args["p_file_path"], "file_size": args["p_file_size"]})
+    elif blob.get("deleting_at"):
+        return []
+    blob["ref_count"] += 1
+    return [{"file_path": blob["file_path"], "ref_count": blob["ref_count"]}]
+
+def rpc_release_document_blobs(store: Store, args: dict) -> List[dict]:
+    blobs = store.table("document_blobs")
+    released = []
+    for content_hash, count in Counter(args["p_content_hashes"]).items():
+        blob = blobs.by_key.get(content_hash)
+        if blob is not None:
+            blob["ref_count"] = max(0, blob["ref_count"] - count)
+        if blob is None or blob["ref_count"] == 0:
+            released.append({"content_hash": content_hash})
+    return released
+
+def rpc_claim_unused_blobs(store: Store, args: dict) -> List[dict]:
+    blobs = store.table("document_blobs")
+    claimed = []
+    for content_hash, file_path in zip(args["p_content_hashes"], args["p_file_paths"]):
+        blob = blobs.by_key.get(content_hash) or blobs.insert({"content_hash": content_hash, "file_path": file_path})
+        if blob["ref_count"] == 0 and content_hash not in claimed:
+            blob["deleting_at"] = _now()
+            claimed.append(content_hash)
+    return [{"content_hash": content_hash} for content_hash in claimed]
+
+def rpc_finish_blob_deletes(store: Store, args: dict) -> None:
+    blobs = store.table("document_blobs")
+    blobs.delete([
+        blob for blob in map(blobs.by_key.get, set(args["p_content_hashes"]))
+        if blob is not None and blob["ref_count"] == 0 and blob.get("deleting_at")
+    ])
+    return None
+
+RPCS = {
+    "search_documents": rpc_search_documents,
+    "search_document_facets": rpc_search_document_facets,
+    "increment_download_counts": rpc_increment_download_counts,
+    "acquire_document_blob": rpc_acquire_document_blob,
+    "release_document_blobs": rpc_release_document_blobs,
+    "claim_unused_blobs": rpc_claim_unused_blobs,
+    "finish_blob_deletes": rpc_finish_blob_deletes,
+}
+
+def create_app(store: Store, latency_ms: float = 0.0) -> Starlette:
+    """The stand-in as an ASGI app; every request waits ``latency_ms`` first"""
+    delay = latency_ms / 1000
+    
+    async def round_trip():
+        if delay:
+            await asyncio.sleep(delay)
+    
+    async def table_endpoint(request: Request) -> Response:
+        await round_trip()
+        table = store.table(request.path_params["table"])
+        prefer = request.headers.get("prefer", "")
+        query = Query(request)
+        
+        if request.method in ("GET", "HEAD"):
+            rows = [query.project(row) for row in query.matches(table)]
+            headers = {}
+            if "count=" in prefer:
+                total = query.count(table)
+                end = query.offset + len(rows) - 1
+                headers["Content-Range"] = f"{query.offset}-{end}/{total}" if rows else f"*/{total}"
+            if request.method == "HEAD":
+                return Response(status_code=200, headers=headers)
+            return JSONResponse(rows, headers=headers)
+        
+        body = await request.json() if request.method in ("POST", "PATCH") else None
+        if request.method == "POST":
+            written = []
+            for values in body if isinstance(body, list) else [body]:
+                existing = table.by_key.get(values.get(table.key)) if table.key in values else None
+                if existing is not None:
+                    if "resolution=ignore-duplicates" in prefer:
+                        continue
+                    if "resolution=merge-duplicates" not in prefer:
+                        return _error(409, f'duplicate key value violates unique constraint "{table.name}_pkey"', "23505")
+                    table.update(existing, values)
+                    written.append(existing)
+                else:
+                    row = table.insert(values)
+                    if table.name == "documents":
+                        store.index_document(row)
+                    written.append(row)
+            status = 201
+        elif request.method == "PATCH":
+            written = query.matches(table, page=False)
+            for row in written:
+                table.update(row, {**body, "updated_at": _now()} if "updated_at" in row else body)
+                if table.name == "documents":
+                    store.index_document(row)
+            status = 200
+        else:
+            written = query.matches(table, page=False)
+            table.delete(written)
+            status = 200
+        
+        if "return=minimal" in prefer:
+            return Response(status_code=204 if status == 200 else status)
+        return JSONResponse([query.project(row) for row in written], status_code=status)
+    
+    async def rpc_endpoint(request: Request) -> Response:
+        await round_trip()
+        function = RPCS.get(request.path_params["function"])
+        if function is None:
+            return _error(404, f"Could not find the function public.{request.path_params['function']}", "PGRST202")
+        body = await request.body()
+        return JSONResponse(function(store, await request.json() if body else {}))
+    
+    # Storage
+    
+    def _storage_error(status: int, message: str) -> JSONResponse:
+        return JSONResponse({"statusCode": str(status), "error": message, "message": message}, status_code=status)
+    
+    async def get_bucket(request: Request) -> Response:
+        await round_trip()
+        bucket = store.buckets.get(request.path_params["bucket"])
+        return JSONResponse(bucket) if bucket else _storage_error(404, "Bucket not found")
+    
+    async def create_bucket(request: Request) -> Response:
+        await round_trip()
+        body = await request.json()
+        store.add_bucket(body["id"], body.get("public", False))
+        return JSONResponse({"name": body["id"]})
+    
+    async def upload_object(request: Request) -> Response:
+        await round_trip()
+        bucket, key = request.path_params["bucket"], request.path_params["key"]
+        if bucket not in store.buckets:
+            return _storage_error(404, "Bucket not found")
+        form = await request.form()
+        upload = form["file"]
+        store.objects[(bucket, key)] = (await upload.read(), upload.content_type or "application/octet-stream", _now())
+        return JSONResponse({"Key": f"{bucket}/{key}"})
+    
+    async def get_object(request: Request) -> Response:
+        await round_trip()
+        stored = store.objects.get((request.path_params["bucket"], request.path_params["key"]))
+        if stored is None:
+            return _storage_error(404, "Object not found")
+        data, content_type, _ = stored
+        byte_range = re.match(r"bytes=(\d+)-(\d*)", request.headers.get("range", ""))
+        if byte_range:
+            start = int(byte_range.group(1))
+            end = int(byte_range.group(2)) if byte_range.group(2) else len(data) - 1
+            return Response(data[start:end + 1], status_code=206, media_type=content_type, headers={
+                "Content-Range": f"bytes {start}-{min(end, len(data) - 1)}/{len(data)}"
+            })
+        return Response(data, media_type=content_type)
+    
+    async def remove_objects(request: Request) -> Response:
+        await round_trip()
+        bucket = request.path_params["bucket"]
+        removed = []
+        for key in (await request.json()).get("prefixes", []):
+            if store.objects.pop((bucket, key), None) is not None:
+                removed.append({"name": key, "bucket_id": bucket})
+        return JSONResponse(removed)
+    
+    async def list_objects(request: Request) -> Response:
+        await round_trip()
+        bucket = request.path_params["bucket"]
+        body = await request.json()
+        prefix = body.get("prefix", "").strip("/")
+        search = body.get("search", "")
+        entries = []
+        for (object_bucket, key), (data, content_type, created_at) in store.objects.items():
+            folder, _, name = key.rpartition("/")
+            if object_bucket == bucket and folder == prefix and name.startswith(search):
+                entries.append({"name": name, "id": key, "created_at": created_at,
+                                "metadata": {"size": len(data), "mimetype": content_type}})
+        return JSONResponse(entries[:body.get("limit", 100)])
+    
+    async def sign_object(request: Request) -> Response:
+        await round_trip()
+        bucket, key = request.path_params["bucket"], request.path_params["key"]
+        return JSONResponse({"signedURL": f"/object/sign/{bucket}/{key}?token={uuid.uuid4().hex}"})
+    
+    async def move_object(request: Request) -> Response:
+        await round_trip()
+        body = await request.json()
+        stored = store.objects.pop((body["bucketId"], body["sourceKey"]), None)
+        if stored is None:
+            return _storage_error(404, "Object not found")
+        store.objects[(body["bucketId"], body["destinationKey"])] = stored
+        return JSONResponse({"message": "Successfully moved"})
+    
+    return Starlette(routes=[
+        Route("/rest/v1/rpc/{function}", rpc_endpoint, methods=["POST"]),
+        Route("/rest/v1/{table}", table_endpoint, methods=["GET", "HEAD", "POST", "PATCH", "DELETE"]),
+        Route("/storage/v1/bucket/{bucket}", get_bucket, methods=["GET"]),
+        Route("/storage/v1/bucket", create_bucket, methods=["POST"]),
+        Route("/storage/v1/object/list/{bucket}", list_objects, methods=["POST"]),
+        Route("/storage/v1/object/sign/{bucket}/{key:path}", sign_object, methods=["POST"]),
+        Route("/storage/v1/object/sign/{bucket}/{key:path}", get_object, methods=["GET"]),
+        Route("/storage/v1/object/move", move_object, methods=["POST"]),
+        Route("/storage/v1/object/public/{bucket}/{key:path}", get_object, methods=["GET"]),
+        Route("/storage/v1/object/authenticated/{bucket}/{key:path}", get_object, methods=["GET"]),
+        Route("/storage/v1/object/{bucket}", remove_objects, methods=["DELETE"]),
+        Route("/storage/v1/object/{bucket}/{key:path}", upload_object, methods=["POST", "PUT"]),
+        Route("/storage/v1/object/{bucket}/{key:path}", get_object, methods=["GET"]),
+    ])
+
+def serve(host: str, port: int, users: int, documents: int, seed: int, bcrypt_rounds: int, latency_ms: float):
+    store = Store()
+    store.seed(users, documents, seed, bcrypt_rounds)
+    print(f"Stand-in seeded with {users} users and {documents} documents, listening on {host}:{port}", flush=True)
+    uvicorn.run(create_app(store, latency_ms), host=host, port=port, log_level="warning", access_log=False)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve an in-memory Supabase stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=54321)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--documents", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--bcrypt-rounds", type=int, default=12, help="Work factor of the seeded password hashes")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Delay added to every request")
+    args = parser.parse_args()
+    serve(args.host, args.port, args.users, args.documents, args.seed, args.bcrypt_rounds, args.latency_ms)
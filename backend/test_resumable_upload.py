@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Test script for resumable chunked uploads
+Simulates an interrupted transfer and resumes it from the received ranges
+"""
+
+import asyncio
+import aiohttp
+import os
+
+# Test configuration
+API_BASE = "http://localhost:8000"
+ADMIN_EMAIL = "admin@sukunslide.uz"
+ADMIN_PASSWORD = "admin123"
+TEST_FILE_SIZE = 12 * 1024 * 1024  # Spans several 5MB chunks
+
+def create_test_content():
+    """Create PDF-like test content large enough for several chunks"""
+    header = b"%PDF-1.4\n"
+    return header + os.urandom(TEST_FILE_SIZE - len(header))
+
+async def login(session):
+    """Login as admin and get token"""
+    login_data = {"email": ADMIN_EMAIL, "password": ADMIN_PASSWORD}
+    
+    async with session.post(f"{API_BASE}/api/auth/login", json=login_data) as response:
+        if response.status == 200:
+            data = await response.json()
+            print(f"✅ Admin login successful")
+            return data.get("access_token")
+        
+        error = await response.text()
+        print(f"❌ Admin login failed: {response.status} - {error}")
+        return None
+
+async def create_session(session, headers, content):
+    """Start a resumable upload session"""
+    upload_data = {
+        "filename": "resumable_test.pdf",
+        "file_size": len(content),
+        "title": "Test Document - Resumable Upload",
+        "subject_id": "mathematics",
+        "description": "This is a test document to verify resumable uploads",
+        "tags": "test, upload, resumable"
+    }
+    
+    async with session.post(f"{API_BASE}/api/uploads/", headers=headers, json=upload_data) as response:
+        data = await response.json()
+        if response.status != 200:
+            print(f"❌ Session creation failed: {response.status} - {data}")
+            return None
+        
+        print(f"✅ Upload session created: {data['upload_id']} ({data['total_chunks']} chunks)")
+        return data
+
+async def put_chunk(session, headers, upload, content, index, truncate_to=None):
+    """Upload one chunk, optionally cutting it short to simulate a dropped connection"""
+    chunk_size = upload["chunk_size"]
+    offset = index * chunk_size
+    chunk = content[offset:offset + chunk_size]
+    if truncate_to is not None:
+        chunk = chunk[:truncate_to]
+    
+    url = f"{API_BASE}/api/uploads/{upload['upload_id']}/chunks/{index}?offset={offset}"
+    async with session.put(url, headers=headers, data=chunk) as response:
+        return response.status == 200
+
+async def get_status(session, headers, upload):
+    async with session.get(f"{API_BASE}/api/uploads/{upload['upload_id']}", headers=headers) as response:
+        return await response.json()
+
+async def test_interrupted_upload(token):
+    """Upload part of a file, drop a chunk mid-transfer, then resume"""
+    content = create_test_content()
+    headers = {"Authorization": f"Bearer {token}"}
+    
+    async with aiohttp.ClientSession() as session:
+        upload = await create_session(session, headers, content)
+        if not upload:
+            return False
+        
+        # Step 1: First chunk arrives, second is cut off mid-transfer
+        await put_chunk(session, headers, upload, content, 0)
+        if await put_chunk(session, headers, upload, content, 1, truncate_to=1024):
+            print(f"❌ Truncated chunk was accepted")
+            return False
+        print(f"✅ Truncated chunk rejected")
+        
+        # Step 2: Completing now must fail
+        async with session.post(f"{API_BASE}/api/uploads/{upload['upload_id']}/complete", headers=headers) as response:
+            if response.status != 409:
+                print(f"❌ Incomplete upload was finalized: {response.status}")
+                return False
+        print(f"✅ Incomplete upload refused")
+        
+        # Step 3: Resume from the server's view of what's missing
+        status = await get_status(session, headers, upload)
+        print(f"   Received ranges: {status['received_ranges']}")
+        print(f"   Missing chunks: {status['missing_chunks']}")
+        
+        for index in status["missing_chunks"]:
+            if not await put_chunk(session, headers, upload, content, index):
+                print(f"❌ Chunk {index} upload failed")
+                return False
+        
+        status = await get_status(session, headers, upload)
+        if not status["complete"] or status["received_ranges"] != [[0, len(content) - 1]]:
+            print(f"❌ Upload not complete after resuming: {status}")
+            return False
+        print(f"✅ Upload resumed and complete")
+        
+        # Step 4: Finalize into a document
+        async with session.post(f"{API_BASE}/api/uploads/{upload['upload_id']}/complete", headers=headers) as response:
+            data = await response.json()
+            if response.status != 200:
+                print(f"❌ Finalize failed: {response.status} - {data}")
+                return False
+            
+            print(f"✅ Document created: {data['document_id']}")
+            print(f"   File Size: {data['file_size']} bytes")
+            return data["file_size"] == len(content)
+
+async def main():
+    """Run all tests"""
+    print("🚀 Starting resumable upload integration test...\n")
+    
+    try:
+        async with aiohttp.ClientSession() as session:
+            token = await login(session)
+        if not token:
+            print("❌ Cannot proceed without admin token")
+            return
+        
+        print("\n📤 Testing interrupted upload...")
+        if await test_interrupted_upload(token):
+            print("\n🎉 All tests passed! Resumable uploads are working correctly.")
+        else:
+            print("\n💥 Some tests failed. Check the output above for details.")
+    
+    except Exception as e:
+        print(f"\n💥 Test failed with exception: {e}")
+
+if __name__ == "__main__":
+    print("📋 Resumable Upload Integration Test")
+    print("=" * 50)
+    print("⚠️  Make sure the backend server is running on localhost:8000")
+    print("⚠️  Make sure you have an admin user with email: admin@sukunslide.uz")
+    print()
+    
+    asyncio.run(main())
@@ -9,6 +9,12 @@ let currentFilters = {
     format: ''
 };
 
+// Server-side paging (used when signed in)
+const BROWSE_FIELDS = ['title', 'description', 'subject_id', 'format', 'author', 'download_count', 'file_size', 'preview_status'];
+let loadedFromApi = false;
+let nextCursor = null;
+let searchTimer = null;
+
 // Initialize the browse page
 document.addEventListener('DOMContentLoaded', function() {
     initializeSubjects();
@@ -17,6 +23,7 @@ document.addEventListener('DOMContentLoaded', function() {
     setupEventListeners();
     renderFiles();
     updateStats();
+    loadDocumentsFromApi();
 });
 
 // Initialize subjects data
@@ -69,6 +76,47 @@ function syncDocumentsFromAdmin() {
     currentDocuments = [...documentsData];
 }
 
+// Load the first page of approved documents from the API, filtered server-side.
+// Falls back to the locally stored catalogue when signed out or offline.
+async function loadDocumentsFromApi() {
+    if (!localStorage.getItem('access_token')) return;
+    
+    try {
+        const data = await apiFetchPage(CONFIG.DOCUMENTS.LIST, {
+            fields: BROWSE_FIELDS,
+            params: currentFilters
+        });
+        
+        documentsData = data.documents.map(documentFromApi);
+        currentDocuments = [...documentsData];
+        nextCursor = data.next_cursor;
+        loadedFromApi = true;
+        displayedDocuments = 12;
+        renderFiles();
+    } catch (error) {
+        console.error('Error loading documents from API:', error);
+    }
+}
+
+// Append the next page from the API
+async function fetchNextPage() {
+    try {
+        const data = await apiFetchPage(CONFIG.DOCUMENTS.LIST, {
+            cursor: nextCursor,
+            fields: BROWSE_FIELDS,
+            params: currentFilters
+        });
+        
+        const documents = data.documents.map(documentFromApi);
+        documentsData.push(...documents);
+        currentDocuments.push(...documents);
+        nextCursor = data.next_cursor;
+    } catch (error) {
+        console.error('Error loading more documents:', error);
+        nextCursor = null;
+    }
+}
+
 // Handle URL parameters for subject filtering
 function handleURLParameters() {
     const urlParams = new URLSearchParams(window.location.search);
@@ -133,6 +181,13 @@ function handleFilter() {
 
 // Apply all filters
 function applyFilters() {
+    if (loadedFromApi) {
+        // Filter on the server and start again from the first page
+        clearTimeout(searchTimer);
+        searchTimer = setTimeout(loadDocumentsFromApi, 300);
+        return;
+    }
+    
     currentDocuments = documentsData.filter(doc => {
         const matchesSearch = !currentFilters.search || 
             doc.title.toLowerCase().includes(currentFilters.search) ||
@@ -173,6 +228,10 @@ function renderFiles() {
     
     filesGrid.innerHTML = filesToShow.map(doc => `
         <div class="file-card">
+            ${previewUrl(doc) ? `
+            <div class="file-preview">
+                <img src="${previewUrl(doc)}" srcset="${previewUrl(doc, 'small')} 160w, ${previewUrl(doc)} 320w, ${previewUrl(doc, 'large')} 640w" sizes="(max-width: 600px) 100vw, 320px" alt="${doc.title}" loading="lazy" decoding="async">
+            </div>` : ''}
             <div class="file-card-header">
                 <div class="file-format">
                     <i class="${getFormatIcon(doc.format)}"></i>
@@ -206,13 +265,16 @@ function renderFiles() {
     
     // Show/hide load more button
     if (loadMoreBtn) {
-        loadMoreBtn.style.display = currentDocuments.length > displayedDocuments ? 'block' : 'none';
+        loadMoreBtn.style.display = currentDocuments.length > displayedDocuments || nextCursor ? 'block' : 'none';
     }
 }
 
 // Load more files
-function loadMoreFiles() {
+async function loadMoreFiles() {
     displayedDocuments += 12;
+    if (displayedDocuments > currentDocuments.length && nextCursor) {
+        await fetchNextPage();
+    }
     renderFiles();
 }
 
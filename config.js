@@ -10,14 +10,16 @@ const CONFIG = {
         LOGIN: '/auth/login',
         REGISTER: '/auth/register', 
         LOGOUT: '/auth/logout',
+        REFRESH: '/auth/refresh',
         ME: '/auth/me'
     },
     
     // Document endpoints
     DOCUMENTS: {
-        LIST: '/documents',
+        LIST: '/documents/',
         UPLOAD: '/documents',
-        DOWNLOAD: '/documents/{id}/download'
+        DOWNLOAD: '/documents/{id}/download',
+        PREVIEW: '/documents/{id}/preview/{size}'
     },
     
     // User endpoints
@@ -32,12 +34,82 @@ const CONFIG = {
         USERS: '/admin/users',
         DOCUMENTS: '/admin/documents/pending',
         UPLOAD: '/admin/documents/upload',
+        BULK: '/admin/documents/bulk/{action}',  // approve, reject or delete
         ANALYTICS: '/admin/analytics/overview'
-    }
+    },
+    
+    // Upload endpoints
+    UPLOADS: {
+        DIRECT: '/uploads/direct',
+        DIRECT_COMPLETE: '/uploads/direct/complete'
+    },
+    
+    // Rows per page for cursor-paginated lists
+    PAGE_SIZE: 20
 };
 
+// Keep the token pair returned by login, register and refresh
+function storeTokens(data) {
+    localStorage.setItem('access_token', data.access_token);
+    if (data.refresh_token) {
+        localStorage.setItem('refresh_token', data.refresh_token);
+    }
+}
+
+// Access tokens are short-lived; trade the refresh token for a new pair.
+// Concurrent callers share one request, since each refresh token works once.
+let refreshInFlight = null;
+function refreshAccessToken() {
+    const refreshToken = localStorage.getItem('refresh_token');
+    if (!refreshToken) return Promise.resolve(false);
+    
+    if (!refreshInFlight) {
+        refreshInFlight = fetch(CONFIG.API_BASE + CONFIG.AUTH.REFRESH, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ refresh_token: refreshToken })
+        })
+            .then(async (response) => {
+                if (!response.ok) {
+                    localStorage.removeItem('access_token');
+                    localStorage.removeItem('refresh_token');
+                    return false;
+                }
+                storeTokens(await response.json());
+                return true;
+            })
+            .catch(() => false)
+            .finally(() => { refreshInFlight = null; });
+    }
+    return refreshInFlight;
+}
+
+// Revoke the session server-side and forget its tokens
+async function endSession() {
+    const token = localStorage.getItem('access_token');
+    const refreshToken = localStorage.getItem('refresh_token');
+    
+    if (token || refreshToken) {
+        try {
+            await fetch(CONFIG.API_BASE + CONFIG.AUTH.LOGOUT, {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                    ...(token && { 'Authorization': `Bearer ${token}` })
+                },
+                body: JSON.stringify({ refresh_token: refreshToken })
+            });
+        } catch (error) {
+            console.error('Logout request failed:', error);
+        }
+    }
+    
+    localStorage.removeItem('access_token');
+    localStorage.removeItem('refresh_token');
+}
+
 // Helper function to make API calls
-async function apiCall(endpoint, options = {}) {
+async function apiCall(endpoint, options = {}, retried = false) {
     const url = CONFIG.API_BASE + endpoint;
     const token = localStorage.getItem('access_token');
     
@@ -60,6 +132,10 @@ async function apiCall(endpoint, options = {}) {
     try {
         const response = await fetch(url, finalOptions);
         
+        if (response.status === 401 && token && !retried && await refreshAccessToken()) {
+            return apiCall(endpoint, options, true);
+        }
+        
         if (!response.ok) {
             const error = await response.json();
             throw new Error(error.detail || `HTTP ${response.status}`);
@@ -97,3 +173,195 @@ async function apiUpload(endpoint, formData) {
         throw error;
     }
 }
+
+// Send a request with XMLHttpRequest so upload progress can be reported.
+// Resolves to the parsed JSON body (or null); rejects with the API's error detail.
+function xhrRequest(method, url, { body = null, headers = {}, onProgress = null } = {}) {
+    return new Promise((resolve, reject) => {
+        const xhr = new XMLHttpRequest();
+        xhr.open(method, url, true);
+        Object.entries(headers).forEach(([name, value]) => xhr.setRequestHeader(name, value));
+        
+        if (onProgress) {
+            xhr.upload.onprogress = (event) => {
+                if (event.lengthComputable) onProgress((event.loaded / event.total) * 100);
+            };
+        }
+        
+        xhr.onload = () => {
+            let response = null;
+            try {
+                response = xhr.responseText ? JSON.parse(xhr.responseText) : null;
+            } catch (e) {
+                // Storage services answer uploads with XML or nothing
+            }
+            
+            if (xhr.status >= 200 && xhr.status < 300) {
+                resolve(response);
+            } else {
+                const error = new Error((response && (response.detail || response.message)) || `HTTP ${xhr.status}`);
+                error.status = xhr.status;
+                reject(error);
+            }
+        };
+        xhr.onerror = () => reject(new Error('Network error'));
+        xhr.send(body);
+    });
+}
+
+// SHA-256 initial hash values and round constants
+const SHA256_INIT = [
+    0x6a09e667, 0xbb67ae85, 0x3c6ef372, 0xa54ff53a, 0x510e527f, 0x9b05688c, 0x1f83d9ab, 0x5be0cd19
+];
+const SHA256_K = new Int32Array([
+    0x428a2f98, 0x71374491, 0xb5c0fbcf, 0xe9b5dba5, 0x3956c25b, 0x59f111f1, 0x923f82a4, 0xab1c5ed5,
+    0xd807aa98, 0x12835b01, 0x243185be, 0x550c7dc3, 0x72be5d74, 0x80deb1fe, 0x9bdc06a7, 0xc19bf174,
+    0xe49b69c1, 0xefbe4786, 0x0fc19dc6, 0x240ca1cc, 0x2de92c6f, 0x4a7484aa, 0x5cb0a9dc, 0x76f988da,
+    0x983e5152, 0xa831c66d, 0xb00327c8, 0xbf597fc7, 0xc6e00bf3, 0xd5a79147, 0x06ca6351, 0x14292967,
+    0x27b70a85, 0x2e1b2138, 0x4d2c6dfc, 0x53380d13, 0x650a7354, 0x766a0abb, 0x81c2c92e, 0x92722c85,
+    0xa2bfe8a1, 0xa81a664b, 0xc24b8b70, 0xc76c51a3, 0xd192e819, 0xd6990624, 0xf40e3585, 0x106aa070,
+    0x19a4c116, 0x1e376c08, 0x2748774c, 0x34b0bcb5, 0x391c0cb3, 0x4ed8aa4a, 0x5b9cca4f, 0x682e6ff3,
+    0x748f82ee, 0x78a5636f, 0x84c87814, 0x8cc70208, 0x90befffa, 0xa4506ceb, 0xbef9a3f7, 0xc67178f2
+]);
+
+// Bytes read from the file at a time (a multiple of the 64-byte block)
+const HASH_SLICE_SIZE = 4 * 1024 * 1024;
+
+// Run the SHA-256 compression over `length` bytes of `view` (whole blocks)
+function sha256Blocks(state, words, view, length) {
+    for (let offset = 0; offset < length; offset += 64) {
+        for (let t = 0; t < 16; t++) words[t] = view.getInt32(offset + t * 4);
+        for (let t = 16; t < 64; t++) {
+            const w15 = words[t - 15], w2 = words[t - 2];
+            const s0 = ((w15 >>> 7) | (w15 << 25)) ^ ((w15 >>> 18) | (w15 << 14)) ^ (w15 >>> 3);
+            const s1 = ((w2 >>> 17) | (w2 << 15)) ^ ((w2 >>> 19) | (w2 << 13)) ^ (w2 >>> 10);
+            words[t] = (words[t - 16] + s0 + words[t - 7] + s1) | 0;
+        }
+        
+        let a = state[0], b = state[1], c = state[2], d = state[3];
+        let e = state[4], f = state[5], g = state[6], h = state[7];
+        for (let t = 0; t < 64; t++) {
+            const S1 = ((e >>> 6) | (e << 26)) ^ ((e >>> 11) | (e << 21)) ^ ((e >>> 25) | (e << 7));
+            const t1 = (h + S1 + ((e & f) ^ (~e & g)) + SHA256_K[t] + words[t]) | 0;
+            const S0 = ((a >>> 2) | (a << 30)) ^ ((a >>> 13) | (a << 19)) ^ ((a >>> 22) | (a << 10));
+            const t2 = (S0 + ((a & b) ^ (a & c) ^ (b & c))) | 0;
+            h = g; g = f; f = e; e = (d + t1) | 0;
+            d = c; c = b; b = a; a = (t1 + t2) | 0;
+        }
+        state[0] += a; state[1] += b; state[2] += c; state[3] += d;
+        state[4] += e; state[5] += f; state[6] += g; state[7] += h;
+    }
+}
+
+// Hex SHA-256 of a file, computed in the browser. WebCrypto only digests a
+// whole buffer, which would hold the entire file in memory, so the file is
+// read and hashed one slice at a time instead.
+async function sha256Hex(file) {
+    const state = new Int32Array(SHA256_INIT);
+    const words = new Int32Array(64);
+    
+    // Only the last slice can end in a partial block
+    let tail = new Uint8Array(0);
+    for (let offset = 0; offset < file.size; offset += HASH_SLICE_SIZE) {
+        const slice = new Uint8Array(await file.slice(offset, offset + HASH_SLICE_SIZE).arrayBuffer());
+        const whole = slice.length - (slice.length % 64);
+        sha256Blocks(state, words, new DataView(slice.buffer), whole);
+        tail = slice.subarray(whole);
+    }
+    
+    // Padding: a 1 bit, zeros, then the length in bits as a 64-bit integer
+    const padded = new Uint8Array(tail.length < 56 ? 64 : 128);
+    padded.set(tail);
+    padded[tail.length] = 0x80;
+    const view = new DataView(padded.buffer);
+    const bits = file.size * 8;
+    view.setUint32(padded.length - 8, Math.floor(bits / 0x100000000));
+    view.setUint32(padded.length - 4, bits >>> 0);
+    sha256Blocks(state, words, view, padded.length);
+    
+    return Array.from(state).map(word => (word >>> 0).toString(16).padStart(8, '0')).join('');
+}
+
+// Upload a document straight to storage: the API only signs the transfer and
+// checks the stored file afterwards, so the bytes never pass through it.
+// `metadata` has title, subject_id, description, author and tags. When the
+// server's storage can't take direct uploads (local storage answers 501) the
+// file is posted as multipart form data to `fallbackEndpoint` instead.
+async function uploadDocumentDirect(file, metadata, { onProgress = null, fallbackEndpoint = null } = {}) {
+    const token = localStorage.getItem('access_token');
+    const auth = token ? { 'Authorization': `Bearer ${token}` } : {};
+    
+    let direct;
+    try {
+        direct = await xhrRequest('POST', CONFIG.API_BASE + CONFIG.UPLOADS.DIRECT, {
+            body: JSON.stringify({
+                filename: file.name,
+                file_size: file.size,
+                sha256: await sha256Hex(file),
+                ...metadata
+            }),
+            headers: { 'Content-Type': 'application/json', ...auth }
+        });
+    } catch (error) {
+        if (error.status !== 501 || !fallbackEndpoint) throw error;
+        
+        const formData = new FormData();
+        formData.append('file', file);
+        formData.append('title', metadata.title);
+        formData.append('subject', metadata.subject_id);
+        ['author', 'description', 'tags'].forEach(field => {
+            if (metadata[field]) formData.append(field, metadata[field]);
+        });
+        return xhrRequest('POST', CONFIG.API_BASE + fallbackEndpoint, { body: formData, headers: auth, onProgress });
+    }
+    
+    await xhrRequest(direct.upload.method, direct.upload.url, {
+        body: file,
+        headers: direct.upload.headers,
+        onProgress
+    });
+    
+    return xhrRequest('POST', CONFIG.API_BASE + CONFIG.UPLOADS.DIRECT_COMPLETE, {
+        body: JSON.stringify({ ticket: direct.ticket }),
+        headers: { 'Content-Type': 'application/json', ...auth }
+    });
+}
+
+// Fetch one page of a cursor-paginated list endpoint.
+// Resolves to the raw response; pass its next_cursor back as `cursor` for the next page
+// (next_cursor is null on the last page). `fields` limits the columns returned.
+async function apiFetchPage(endpoint, { cursor = null, limit = CONFIG.PAGE_SIZE, fields = null, params = {} } = {}) {
+    const query = new URLSearchParams();
+    
+    Object.entries(params).forEach(([key, value]) => {
+        if (value) query.set(key, value);
+    });
+    query.set('limit', limit);
+    if (cursor) query.set('cursor', cursor);
+    if (fields) query.set('fields', Array.isArray(fields) ? fields.join(',') : fields);
+    
+    return apiCall(`${endpoint}?${query.toString()}`);
+}
+
+// Map an API document row onto the shape the pages render
+function documentFromApi(doc) {
+    return {
+        id: doc.id,
+        title: doc.title,
+        description: doc.description || '',
+        subject: doc.subject_id,
+        format: doc.format,
+        author: doc.author || '',
+        downloadCount: doc.download_count || 0,
+        size: doc.file_size ? `${(doc.file_size / (1024 * 1024)).toFixed(1)} MB` : 'N/A',
+        uploadDate: doc.created_at,
+        previewStatus: doc.preview_status
+    };
+}
+
+// Preview image URL for a document, or null until its preview is ready.
+// Sizes: 'small' (160px), 'medium' (320px), 'large' (640px)
+function previewUrl(doc, size = 'medium') {
+    if (doc.previewStatus !== 'ready') return null;
+    return CONFIG.API_BASE + CONFIG.DOCUMENTS.PREVIEW.replace('{id}', doc.id).replace('{size}', size);
+}
@@ -4,6 +4,11 @@
 let userDownloads = [];
 let userFavorites = [];
 
+// Cursors for the next API page of each list (null when exhausted or offline)
+const USER_LIST_FIELDS = ['title', 'subject_id', 'format', 'author', 'preview_status'];
+let downloadsCursor = null;
+let favoritesCursor = null;
+
 // Document data (synced from admin panel)
 let documentsData = [];
 
@@ -252,6 +257,81 @@ function loadUserData() {
     
     // Load statistics
     updateStatistics();
+    
+    // Replace local history with the server's when signed in
+    loadUserListsFromApi();
+}
+
+// Map an API download/favorite row onto the shape the lists render
+function userListItemFromApi(row, dateField) {
+    return {
+        ...documentFromApi(row.documents || { id: row.document_id }),
+        id: row.document_id,
+        downloadDate: row[dateField]
+    };
+}
+
+// Load the first page of downloads and favorites from the API
+async function loadUserListsFromApi() {
+    if (!localStorage.getItem('access_token')) return;
+    
+    try {
+        const [downloads, favorites] = await Promise.all([
+            apiFetchPage(CONFIG.USERS.DOWNLOADS, { fields: USER_LIST_FIELDS }),
+            apiFetchPage(CONFIG.USERS.FAVORITES, { fields: USER_LIST_FIELDS })
+        ]);
+        
+        userDownloads = downloads.downloads.map(row => userListItemFromApi(row, 'downloaded_at'));
+        downloadsCursor = downloads.next_cursor;
+        userFavorites = favorites.favorites.map(row => userListItemFromApi(row, 'created_at'));
+        favoritesCursor = favorites.next_cursor;
+        
+        loadRecentDownloads();
+        loadDownloads();
+        loadFavorites();
+        updateStatistics();
+    } catch (error) {
+        console.error('Error loading downloads and favorites from API:', error);
+    }
+}
+
+// Append the next page of download history
+async function loadMoreDownloads() {
+    if (!downloadsCursor) return;
+    
+    try {
+        const data = await apiFetchPage(CONFIG.USERS.DOWNLOADS, { cursor: downloadsCursor, fields: USER_LIST_FIELDS });
+        userDownloads.push(...data.downloads.map(row => userListItemFromApi(row, 'downloaded_at')));
+        downloadsCursor = data.next_cursor;
+        loadDownloads();
+    } catch (error) {
+        showNotification('Yuklab olishlar tarixini yuklashda xatolik', 'error');
+    }
+}
+
+// Append the next page of favorites
+async function loadMoreFavorites() {
+    if (!favoritesCursor) return;
+    
+    try {
+        const data = await apiFetchPage(CONFIG.USERS.FAVORITES, { cursor: favoritesCursor, fields: USER_LIST_FIELDS });
+        userFavorites.push(...data.favorites.map(row => userListItemFromApi(row, 'created_at')));
+        favoritesCursor = data.next_cursor;
+        loadFavorites();
+    } catch (error) {
+        showNotification('Sevimlilarni yuklashda xatolik', 'error');
+    }
+}
+
+// "Load more" button for a paginated list
+function loadMoreButton(onclick) {
+    return `
+        <div class="load-more-container" style="grid-column: 1 / -1; text-align: center; margin-top: 1rem;">
+            <button class="btn btn-outline" onclick="${onclick}">
+                <i class="fas fa-chevron-down"></i> Ko'proq yuklash
+            </button>
+        </div>
+    `;
 }
 
 // Load profile form
@@ -410,7 +490,7 @@ function loadDownloads() {
                 </div>
             </div>
         </div>
-    `).join('');
+    `).join('') + (downloadsCursor ? loadMoreButton('loadMoreDownloads()') : '');
 }
 
 // Load favorites
@@ -434,6 +514,10 @@ function loadFavorites() {
             <button class="favorite-remove" onclick="removeFromFavorites(${favorite.id})">
                 <i class="fas fa-times"></i>
             </button>
+            ${previewUrl(favorite) ? `
+            <div class="favorite-preview">
+                <img src="${previewUrl(favorite, 'small')}" srcset="${previewUrl(favorite, 'small')} 160w, ${previewUrl(favorite)} 320w" sizes="300px" alt="${favorite.title}" loading="lazy" decoding="async">
+            </div>` : ''}
             <div class="document-header">
                 <div class="document-format">
                     <i class="${getFormatIcon(favorite.format)}"></i>
@@ -453,7 +537,7 @@ function loadFavorites() {
                 </div>
             </div>
         </div>
-    `).join('');
+    `).join('') + (favoritesCursor ? loadMoreButton('loadMoreFavorites()') : '');
 }
 
 // Update statistics
@@ -892,7 +976,9 @@ function logout() {
     if (confirm('Chiqishni xohlaysizmi?')) {
         localStorage.removeItem('currentUser');
         sessionStorage.removeItem('currentUser');
-        window.location.href = 'index.html';
+        endSession().finally(() => {
+            window.location.href = 'index.html';
+        });
     }
 }
 
@@ -2,6 +2,7 @@
 
 -- Enable necessary extensions
 CREATE EXTENSION IF NOT EXISTS "uuid-ossp";
+CREATE EXTENSION IF NOT EXISTS "pg_trgm";
 
 -- Users table
 CREATE TABLE users (
@@ -37,15 +38,30 @@ CREATE TABLE documents (
     format VARCHAR NOT NULL CHECK (format IN ('pdf', 'ppt', 'pptx', 'doc', 'docx', 'xls', 'xlsx')),
     file_path VARCHAR NOT NULL,
     file_size BIGINT,
+    content_hash VARCHAR(64), -- SHA-256 of the file, key into document_blobs
     author VARCHAR,
     tags TEXT[], -- Array of tags
     download_count INTEGER DEFAULT 0,
     status VARCHAR DEFAULT 'pending' CHECK (status IN ('pending', 'approved', 'rejected')),
     uploaded_by UUID REFERENCES users(id),
+    search_vector TSVECTOR, -- Maintained by the update_documents_search_vector trigger
+    preview_status VARCHAR DEFAULT 'pending' CHECK (preview_status IN ('pending', 'processing', 'ready', 'unsupported', 'failed')),
+    content_text TEXT, -- Truncated plain text extracted from the file, for search
+    text_status VARCHAR DEFAULT 'pending' CHECK (text_status IN ('pending', 'processing', 'ready', 'unsupported', 'failed')),
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
 
+-- Content-addressed file storage: one stored blob per distinct file
+CREATE TABLE document_blobs (
+    content_hash VARCHAR(64) PRIMARY KEY,
+    file_path VARCHAR NOT NULL,
+    file_size BIGINT,
+    ref_count INTEGER NOT NULL DEFAULT 0 CHECK (ref_count >= 0),
+    deleting_at TIMESTAMP WITH TIME ZONE, -- Set while the cleanup job deletes the file
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
 -- Downloads tracking
 CREATE TABLE downloads (
     id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
@@ -83,18 +99,29 @@ CREATE TABLE system_settings (
     updated_by UUID REFERENCES users(id)
 );
 
+-- Token denylist: used refresh token ids and revoked session ids. Rows are
+-- purged once every token they cover has expired, so the table stays small.
+CREATE TABLE revoked_tokens (
+    jti VARCHAR(32) PRIMARY KEY,
+    expires_at TIMESTAMP WITH TIME ZONE NOT NULL
+);
+
 -- Indexes for performance
 CREATE INDEX idx_users_email ON users(email);
 CREATE INDEX idx_users_role ON users(role);
+CREATE INDEX idx_users_created_at ON users(created_at DESC, id DESC); -- Keyset pagination
 CREATE INDEX idx_documents_subject ON documents(subject_id);
-CREATE INDEX idx_documents_status ON documents(status);
+CREATE INDEX idx_documents_status_created_at ON documents(status, created_at DESC, id DESC); -- Keyset pagination
+CREATE INDEX idx_documents_subject_created_at ON documents(subject_id, status, created_at DESC, id DESC);
 CREATE INDEX idx_documents_uploaded_by ON documents(uploaded_by);
-CREATE INDEX idx_downloads_user_id ON downloads(user_id);
+CREATE INDEX idx_documents_content_hash ON documents(content_hash, preview_status);
+CREATE INDEX idx_downloads_user_downloaded_at ON downloads(user_id, downloaded_at DESC, id DESC); -- Keyset pagination
 CREATE INDEX idx_downloads_document_id ON downloads(document_id);
 CREATE INDEX idx_downloads_downloaded_at ON downloads(downloaded_at);
-CREATE INDEX idx_favorites_user_id ON favorites(user_id);
+CREATE INDEX idx_favorites_user_created_at ON favorites(user_id, created_at DESC, id DESC); -- Keyset pagination
 CREATE INDEX idx_activity_logs_user_id ON activity_logs(user_id);
 CREATE INDEX idx_activity_logs_created_at ON activity_logs(created_at);
+CREATE INDEX idx_revoked_tokens_expires_at ON revoked_tokens(expires_at);
 
 -- Function to update updated_at timestamp
 CREATE OR REPLACE FUNCTION update_updated_at_column()
@@ -115,11 +142,373 @@ BEGIN
 END;
 $$ language 'plpgsql';
 
+-- Take a reference on a blob, registering it on first use. Returns no row
+-- while the cleanup job is deleting the blob's file (callers retry); a claim
+-- older than 10 minutes belongs to a job that gave up and is taken over.
+CREATE OR REPLACE FUNCTION acquire_document_blob(p_content_hash VARCHAR, p_file_path VARCHAR, p_file_size BIGINT)
+RETURNS TABLE (file_path VARCHAR, ref_count INTEGER) AS $$
+    INSERT INTO document_blobs AS b (content_hash, file_path, file_size, ref_count)
+    VALUES (p_content_hash, p_file_path, p_file_size, 1)
+    ON CONFLICT (content_hash) DO UPDATE SET ref_count = b.ref_count + 1, deleting_at = NULL
+    WHERE b.deleting_at IS NULL OR b.deleting_at < NOW() - INTERVAL '10 minutes'
+    RETURNING b.file_path, b.ref_count;
+$$ language 'sql';
+
+-- Drop one reference per listed hash (a hash may repeat); returns the hashes
+-- left with no references, whose files can be deleted. Their rows stay until
+-- the cleanup job claims them.
+CREATE OR REPLACE FUNCTION release_document_blobs(p_content_hashes VARCHAR[])
+RETURNS TABLE (content_hash VARCHAR) AS $$
+BEGIN
+    UPDATE document_blobs b
+    SET ref_count = GREATEST(b.ref_count - r.n, 0)
+    FROM (SELECT h, count(*) AS n FROM unnest(p_content_hashes) AS h GROUP BY h) r
+    WHERE b.content_hash = r.h;
+    
+    -- Hashes without a blob row were never shared, so their files go too
+    RETURN QUERY
+    SELECT DISTINCT h FROM unnest(p_content_hashes) AS h
+    WHERE NOT EXISTS (SELECT 1 FROM document_blobs b WHERE b.content_hash = h AND b.ref_count > 0);
+END;
+$$ language 'plpgsql';
+
+-- Claim unreferenced blobs for deletion; returns the hashes claimed, whose
+-- files the caller may now delete. The check and the claim are one statement,
+-- so an upload of the same content either took its reference first (and the
+-- blob is skipped) or waits in acquire_document_blob until the files are gone.
+CREATE OR REPLACE FUNCTION claim_unused_blobs(p_content_hashes VARCHAR[], p_file_paths VARCHAR[])
+RETURNS TABLE (content_hash VARCHAR) AS $$
+BEGIN
+    -- Blobs that were never shared have no row yet
+    INSERT INTO document_blobs (content_hash, file_path)
+    SELECT h, p FROM unnest(p_content_hashes, p_file_paths) AS f(h, p)
+    ON CONFLICT DO NOTHING;
+    
+    RETURN QUERY
+    UPDATE document_blobs b SET deleting_at = NOW()
+    WHERE b.content_hash = ANY(p_content_hashes) AND b.ref_count = 0
+    RETURNING b.content_hash;
+END;
+$$ language 'plpgsql';
+
+-- Drop the rows of claimed blobs once their files are deleted
+CREATE OR REPLACE FUNCTION finish_blob_deletes(p_content_hashes VARCHAR[])
+RETURNS void AS $$
+    DELETE FROM document_blobs b
+    WHERE b.content_hash = ANY(p_content_hashes) AND b.ref_count = 0 AND b.deleting_at IS NOT NULL;
+$$ language 'sql';
+
+-- Apply aggregated download counts from a batch of download events
+CREATE OR REPLACE FUNCTION increment_download_counts(document_ids UUID[], counts INTEGER[])
+RETURNS void AS $$
+BEGIN
+    UPDATE documents d
+    SET download_count = d.download_count + c.amount, updated_at = NOW()
+    FROM unnest(document_ids, counts) AS c(document_id, amount)
+    WHERE d.id = c.document_id;
+END;
+$$ language 'plpgsql';
+
 -- Triggers for updated_at
 CREATE TRIGGER update_users_updated_at BEFORE UPDATE ON users FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
 CREATE TRIGGER update_documents_updated_at BEFORE UPDATE ON documents FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
 CREATE TRIGGER update_system_settings_updated_at BEFORE UPDATE ON system_settings FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
 
+-- Full-text search
+
+-- Fold Uzbek Cyrillic to Latin and drop apostrophe variants (o‘zbek, o'zbek -> ozbek)
+-- so both scripts and all spellings index and match the same way
+CREATE OR REPLACE FUNCTION normalize_uz(input TEXT)
+RETURNS TEXT AS $$
+    SELECT translate(
+        replace(replace(replace(replace(replace(replace(lower(coalesce(input, '')),
+            'ё', 'yo'), 'ц', 'ts'), 'ч', 'ch'), 'ш', 'sh'), 'ю', 'yu'), 'я', 'ya'),
+        'абвгдежзийклмнопрстуфхэўқғҳъь''ʻʼ`’‘',
+        'abvgdejziyklmnoprstufxeoqgh'
+    );
+$$ language 'sql' IMMUTABLE;
+
+-- Weighted search document: title > tags > author > description and file text
+CREATE OR REPLACE FUNCTION update_documents_search_vector()
+RETURNS TRIGGER AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('simple', normalize_uz(NEW.title)), 'A') ||
+        setweight(to_tsvector('simple', normalize_uz(array_to_string(NEW.tags, ' '))), 'B') ||
+        setweight(to_tsvector('simple', normalize_uz(NEW.author)), 'C') ||
+        setweight(to_tsvector('simple', normalize_uz(NEW.description)), 'D') ||
+        setweight(to_tsvector('simple', normalize_uz(NEW.content_text)), 'D');
+    RETURN NEW;
+END;
+$$ language 'plpgsql';
+
+CREATE TRIGGER update_documents_search_vector BEFORE INSERT OR UPDATE OF title, description, tags, author, content_text ON documents FOR EACH ROW EXECUTE FUNCTION update_documents_search_vector();
+
+CREATE INDEX idx_documents_search_vector ON documents USING GIN (search_vector);
+CREATE INDEX idx_documents_title_trgm ON documents USING GIN (normalize_uz(title) gin_trgm_ops); -- Typo tolerance
+
+-- Ranked search over approved documents. Matches on the tsvector, or on title
+-- trigrams for misspelled queries; highlights are wrapped in <mark> tags.
+CREATE OR REPLACE FUNCTION search_documents(
+    p_query TEXT,
+    p_subject VARCHAR DEFAULT NULL,
+    p_format VARCHAR DEFAULT NULL,
+    p_limit INTEGER DEFAULT 20,
+    p_offset INTEGER DEFAULT 0
+)
+RETURNS TABLE (
+    id UUID,
+    title VARCHAR,
+    description TEXT,
+    subject_id VARCHAR,
+    format VARCHAR,
+    author VARCHAR,
+    tags TEXT[],
+    download_count INTEGER,
+    file_size BIGINT,
+    created_at TIMESTAMP WITH TIME ZONE,
+    rank REAL,
+    title_highlight TEXT,
+    description_highlight TEXT,
+    content_highlight TEXT
+) AS $$
+    WITH q AS (
+        SELECT websearch_to_tsquery('simple', normalize_uz(p_query)) AS tsq, normalize_uz(p_query) AS norm
+    ),
+    matches AS (
+        SELECT d.*, q.tsq,
+            ts_rank_cd(d.search_vector, q.tsq) + word_similarity(q.norm, normalize_uz(d.title)) AS score
+        FROM documents d, q
+        WHERE d.status = 'approved'
+          AND (d.search_vector @@ q.tsq OR q.norm <% normalize_uz(d.title))
+          AND (p_subject IS NULL OR d.subject_id = p_subject)
+          AND (p_format IS NULL OR d.format = p_format)
+        ORDER BY score DESC, d.created_at DESC
+        LIMIT p_limit OFFSET p_offset
+    )
+    SELECT m.id, m.title, m.description, m.subject_id, m.format, m.author, m.tags,
+        m.download_count, m.file_size, m.created_at, m.score::REAL,
+        ts_headline('simple', m.title, m.tsq, 'StartSel=<mark>, StopSel=</mark>, HighlightAll=true'),
+        ts_headline('simple', coalesce(m.description, ''), m.tsq, 'StartSel=<mark>, StopSel=</mark>, MaxFragments=2'),
+        ts_headline('simple', coalesce(m.content_text, ''), m.tsq, 'StartSel=<mark>, StopSel=</mark>, MaxFragments=2, MaxWords=20')
+    FROM matches m
+    ORDER BY m.score DESC, m.created_at DESC;
+$$ language 'sql' STABLE;
+
+-- Subject and format counts for a search, for faceted filtering
+CREATE OR REPLACE FUNCTION search_document_facets(
+    p_query TEXT,
+    p_subject VARCHAR DEFAULT NULL,
+    p_format VARCHAR DEFAULT NULL
+)
+RETURNS TABLE (facet TEXT, value VARCHAR, count BIGINT) AS $$
+    WITH q AS (
+        SELECT websearch_to_tsquery('simple', normalize_uz(p_query)) AS tsq, normalize_uz(p_query) AS norm
+    ),
+    matches AS (
+        SELECT d.subject_id, d.format
+        FROM documents d, q
+        WHERE d.status = 'approved'
+          AND (d.search_vector @@ q.tsq OR q.norm <% normalize_uz(d.title))
+          AND (p_subject IS NULL OR d.subject_id = p_subject)
+          AND (p_format IS NULL OR d.format = p_format)
+    )
+    SELECT 'subject', subject_id, count(*) FROM matches GROUP BY subject_id
+    UNION ALL
+    SELECT 'format', format, count(*) FROM matches GROUP BY format;
+$$ language 'sql' STABLE;
+
+-- Statistics
+--
+-- Totals and daily rollups kept current by statement-level triggers, so the
+-- admin dashboard never scans the base tables. A bulk insert (e.g. a flushed
+-- batch of download events) costs one rollup update per statement, not per row.
+-- refresh_statistics() rebuilds everything from the base tables. The trigger
+-- functions run as the table owner so that users recording downloads through
+-- RLS can update the rollups, which have RLS enabled and no policies.
+
+CREATE TABLE stat_counters (
+    name VARCHAR PRIMARY KEY,
+    value BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+INSERT INTO stat_counters (name) VALUES ('users'), ('documents'), ('downloads');
+
+-- Site-wide activity per day
+CREATE TABLE daily_stats (
+    day DATE PRIMARY KEY,
+    downloads INTEGER NOT NULL DEFAULT 0,
+    uploads INTEGER NOT NULL DEFAULT 0,
+    new_users INTEGER NOT NULL DEFAULT 0
+);
+
+-- Downloads per document per day (no foreign key: history outlives deleted documents)
+CREATE TABLE daily_document_stats (
+    day DATE NOT NULL,
+    document_id UUID NOT NULL,
+    subject_id VARCHAR NOT NULL DEFAULT '',
+    format VARCHAR NOT NULL DEFAULT '',
+    downloads INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, document_id)
+);
+
+-- Uploads and downloads per subject and format per day
+CREATE TABLE daily_subject_stats (
+    day DATE NOT NULL,
+    subject_id VARCHAR NOT NULL DEFAULT '',
+    format VARCHAR NOT NULL DEFAULT '',
+    uploads INTEGER NOT NULL DEFAULT 0,
+    downloads INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, subject_id, format)
+);
+
+CREATE INDEX idx_daily_document_stats_document ON daily_document_stats(document_id, day);
+
+-- Add (INSERT) or subtract (DELETE) the statement's row count; TG_ARGV[0] names the counter
+CREATE OR REPLACE FUNCTION update_stat_counter()
+RETURNS TRIGGER AS $$
+BEGIN
+    UPDATE stat_counters
+    SET value = value + CASE WHEN TG_OP = 'DELETE' THEN -1 ELSE 1 END * (SELECT count(*) FROM changed_rows),
+        updated_at = NOW()
+    WHERE name = TG_ARGV[0];
+    RETURN NULL;
+END;
+$$ language 'plpgsql' SECURITY DEFINER SET search_path = public;
+
+CREATE OR REPLACE FUNCTION rollup_new_downloads()
+RETURNS TRIGGER AS $$
+BEGIN
+    WITH batch AS (
+        SELECT (n.downloaded_at AT TIME ZONE 'UTC')::date AS day, n.document_id,
+               coalesce(d.subject_id, '') AS subject_id, coalesce(d.format, '') AS format, count(*) AS downloads
+        FROM changed_rows n
+        LEFT JOIN documents d ON d.id = n.document_id
+        WHERE n.document_id IS NOT NULL
+        GROUP BY 1, 2, 3, 4
+    ), per_document AS (
+        INSERT INTO daily_document_stats AS s (day, document_id, subject_id, format, downloads)
+        SELECT day, document_id, subject_id, format, downloads FROM batch
+        ON CONFLICT (day, document_id) DO UPDATE SET downloads = s.downloads + EXCLUDED.downloads
+    ), per_subject AS (
+        INSERT INTO daily_subject_stats AS s (day, subject_id, format, downloads)
+        SELECT day, subject_id, format, sum(downloads) FROM batch GROUP BY 1, 2, 3
+        ON CONFLICT (day, subject_id, format) DO UPDATE SET downloads = s.downloads + EXCLUDED.downloads
+    )
+    INSERT INTO daily_stats AS s (day, downloads)
+    SELECT day, sum(downloads) FROM batch GROUP BY 1
+    ON CONFLICT (day) DO UPDATE SET downloads = s.downloads + EXCLUDED.downloads;
+
+    RETURN NULL;
+END;
+$$ language 'plpgsql' SECURITY DEFINER SET search_path = public;
+
+CREATE OR REPLACE FUNCTION rollup_new_documents()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO daily_subject_stats AS s (day, subject_id, format, uploads)
+    SELECT (created_at AT TIME ZONE 'UTC')::date, coalesce(subject_id, ''), format, count(*)
+    FROM changed_rows GROUP BY 1, 2, 3
+    ON CONFLICT (day, subject_id, format) DO UPDATE SET uploads = s.uploads + EXCLUDED.uploads;
+
+    INSERT INTO daily_stats AS s (day, uploads)
+    SELECT (created_at AT TIME ZONE 'UTC')::date, count(*) FROM changed_rows GROUP BY 1
+    ON CONFLICT (day) DO UPDATE SET uploads = s.uploads + EXCLUDED.uploads;
+
+    RETURN NULL;
+END;
+$$ language 'plpgsql' SECURITY DEFINER SET search_path = public;
+
+CREATE OR REPLACE FUNCTION rollup_new_users()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO daily_stats AS s (day, new_users)
+    SELECT (created_at AT TIME ZONE 'UTC')::date, count(*) FROM changed_rows GROUP BY 1
+    ON CONFLICT (day) DO UPDATE SET new_users = s.new_users + EXCLUDED.new_users;
+
+    RETURN NULL;
+END;
+$$ language 'plpgsql' SECURITY DEFINER SET search_path = public;
+
+-- Transition tables allow only one event per trigger, hence the INSERT/DELETE pairs
+CREATE TRIGGER count_users_insert AFTER INSERT ON users REFERENCING NEW TABLE AS changed_rows FOR EACH STATEMENT EXECUTE FUNCTION update_stat_counter('users');
+CREATE TRIGGER count_users_delete AFTER DELETE ON users REFERENCING OLD TABLE AS changed_rows FOR EACH STATEMENT EXECUTE FUNCTION update_stat_counter('users');
+CREATE TRIGGER count_documents_insert AFTER INSERT ON documents REFERENCING NEW TABLE AS changed_rows FOR EACH STATEMENT EXECUTE FUNCTION update_stat_counter('documents');
+CREATE TRIGGER count_documents_delete AFTER DELETE ON documents REFERENCING OLD TABLE AS changed_rows FOR EACH STATEMENT EXECUTE FUNCTION update_stat_counter('documents');
+CREATE TRIGGER count_downloads_insert AFTER INSERT ON downloads REFERENCING NEW TABLE AS changed_rows FOR EACH STATEMENT EXECUTE FUNCTION update_stat_counter('downloads');
+CREATE TRIGGER count_downloads_delete AFTER DELETE ON downloads REFERENCING OLD TABLE AS changed_rows FOR EACH STATEMENT EXECUTE FUNCTION update_stat_counter('downloads');
+CREATE TRIGGER rollup_users_insert AFTER INSERT ON users REFERENCING NEW TABLE AS changed_rows FOR EACH STATEMENT EXECUTE FUNCTION rollup_new_users();
+CREATE TRIGGER rollup_documents_insert AFTER INSERT ON documents REFERENCING NEW TABLE AS changed_rows FOR EACH STATEMENT EXECUTE FUNCTION rollup_new_documents();
+CREATE TRIGGER rollup_downloads_insert AFTER INSERT ON downloads REFERENCING NEW TABLE AS changed_rows FOR EACH STATEMENT EXECUTE FUNCTION rollup_new_downloads();
+
+-- Batch job: rebuild counters and rollups from the base tables (repairs drift,
+-- backfills after restoring data). Locks the base tables against writes meanwhile.
+CREATE OR REPLACE FUNCTION refresh_statistics()
+RETURNS void AS $$
+BEGIN
+    LOCK TABLE users, documents, downloads IN SHARE MODE;
+
+    UPDATE stat_counters SET value = (SELECT count(*) FROM users), updated_at = NOW() WHERE name = 'users';
+    UPDATE stat_counters SET value = (SELECT count(*) FROM documents), updated_at = NOW() WHERE name = 'documents';
+    UPDATE stat_counters SET value = (SELECT count(*) FROM downloads), updated_at = NOW() WHERE name = 'downloads';
+
+    DELETE FROM daily_document_stats;
+    INSERT INTO daily_document_stats (day, document_id, subject_id, format, downloads)
+    SELECT (dl.downloaded_at AT TIME ZONE 'UTC')::date, dl.document_id,
+           coalesce(d.subject_id, ''), coalesce(d.format, ''), count(*)
+    FROM downloads dl
+    LEFT JOIN documents d ON d.id = dl.document_id
+    WHERE dl.document_id IS NOT NULL
+    GROUP BY 1, 2, 3, 4;
+
+    DELETE FROM daily_subject_stats;
+    INSERT INTO daily_subject_stats (day, subject_id, format, uploads, downloads)
+    SELECT day, subject_id, format, sum(uploads), sum(downloads)
+    FROM (
+        SELECT (created_at AT TIME ZONE 'UTC')::date AS day, coalesce(subject_id, '') AS subject_id, format, count(*) AS uploads, 0 AS downloads
+        FROM documents GROUP BY 1, 2, 3
+        UNION ALL
+        SELECT day, subject_id, format, 0, sum(downloads) FROM daily_document_stats GROUP BY 1, 2, 3
+    ) t
+    GROUP BY 1, 2, 3;
+
+    DELETE FROM daily_stats;
+    INSERT INTO daily_stats (day, downloads, uploads, new_users)
+    SELECT day, sum(downloads), sum(uploads), sum(new_users)
+    FROM (
+        SELECT day, sum(downloads) AS downloads, 0 AS uploads, 0 AS new_users FROM daily_document_stats GROUP BY 1
+        UNION ALL
+        SELECT day, 0, sum(uploads), 0 FROM daily_subject_stats GROUP BY 1
+        UNION ALL
+        SELECT (created_at AT TIME ZONE 'UTC')::date, 0, 0, count(*) FROM users GROUP BY 1
+    ) t
+    GROUP BY 1;
+END;
+$$ language 'plpgsql';
+
+-- Most downloaded documents since a given day
+CREATE OR REPLACE FUNCTION top_documents(p_since DATE, p_limit INTEGER DEFAULT 10)
+RETURNS TABLE (document_id UUID, title VARCHAR, subject_id VARCHAR, format VARCHAR, downloads BIGINT) AS $$
+    SELECT s.document_id, d.title, d.subject_id, d.format, sum(s.downloads) AS downloads
+    FROM daily_document_stats s
+    JOIN documents d ON d.id = s.document_id
+    WHERE s.day >= p_since
+    GROUP BY s.document_id, d.title, d.subject_id, d.format
+    ORDER BY downloads DESC
+    LIMIT p_limit;
+$$ language 'sql' STABLE;
+
+-- Uploads and downloads per subject since a given day
+CREATE OR REPLACE FUNCTION subject_activity(p_since DATE)
+RETURNS TABLE (subject_id VARCHAR, uploads BIGINT, downloads BIGINT) AS $$
+    SELECT subject_id, sum(uploads), sum(downloads)
+    FROM daily_subject_stats
+    WHERE day >= p_since
+    GROUP BY subject_id
+    ORDER BY sum(uploads) DESC, subject_id;
+$$ language 'sql' STABLE;
+
 -- Insert default subjects
 INSERT INTO subjects (id, name, description, icon, color) VALUES
 ('mathematics', 'Matematika', 'Matematik fanlar', 'fas fa-calculator', '#3b82f6'),
@@ -149,6 +538,12 @@ ALTER TABLE documents ENABLE ROW LEVEL SECURITY;
 ALTER TABLE downloads ENABLE ROW LEVEL SECURITY;
 ALTER TABLE favorites ENABLE ROW LEVEL SECURITY;
 ALTER TABLE activity_logs ENABLE ROW LEVEL SECURITY;
+ALTER TABLE revoked_tokens ENABLE ROW LEVEL SECURITY;
+ALTER TABLE document_blobs ENABLE ROW LEVEL SECURITY;
+ALTER TABLE stat_counters ENABLE ROW LEVEL SECURITY;
+ALTER TABLE daily_stats ENABLE ROW LEVEL SECURITY;
+ALTER TABLE daily_document_stats ENABLE ROW LEVEL SECURITY;
+ALTER TABLE daily_subject_stats ENABLE ROW LEVEL SECURITY;
 
 -- Users policies
 CREATE POLICY "Users can view own profile" ON users FOR SELECT USING (auth.uid()::text = id::text);
@@ -199,3 +594,15 @@ CREATE POLICY "Admins can manage system settings" ON system_settings FOR ALL USI
         SELECT 1 FROM users WHERE id::text = auth.uid()::text AND role = 'admin'
     )
 );
+
+-- Tables without policies (revoked_tokens, document_blobs and the statistics
+-- tables) are reached only through the API's service role key. Postgres lets PUBLIC execute new
+-- functions, so the internal ones are revoked from every other role too.
+REVOKE EXECUTE ON FUNCTION acquire_document_blob(VARCHAR, VARCHAR, BIGINT) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION release_document_blobs(VARCHAR[]) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION claim_unused_blobs(VARCHAR[], VARCHAR[]) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION finish_blob_deletes(VARCHAR[]) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION increment_download_counts(UUID[], INTEGER[]) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION refresh_statistics() FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION top_documents(DATE, INTEGER) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION subject_activity(DATE) FROM PUBLIC, anon, authenticated;